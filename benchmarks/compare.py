@@ -0,0 +1,53 @@
+# compare.py
+# Compares two result files of run_benchmarks.py, e.g. from the last release and the current tree.
+# Benchmarks are matched by name and roster size and compared by their median; the exit status is 1
+# if any benchmark got slower than the threshold allows, so the script can gate a CI job.
+#
+# Usage: python benchmarks/compare.py baseline.json results.json [--threshold 1.25]
+
+import argparse
+import json
+import sys
+
+DEFAULT_THRESHOLD = 1.25  # New median / old median above this counts as a regression
+
+def load_results(file_path):
+    """
+    Reads a result file.
+    :return: Dict (name, size) -> result dict
+    """
+    with open(file_path, encoding='utf-8') as file:
+        report = json.load(file)
+    return {(result['name'], result['size']): result for result in report['results']}
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares the medians of benchmarks present in both result sets.
+    :param old: Baseline results, see load_results
+    :param new: New results, see load_results
+    :param threshold: Ratio new/old above which a benchmark counts as regressed
+    :return: List of (name, size, old median, new median, ratio, regressed), sorted by name and size
+    """
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        old_median, new_median = old[key]['median'], new[key]['median']
+        ratio = new_median / old_median if old_median > 0 else float('inf')
+        rows.append((key[0], key[1], old_median, new_median, ratio, ratio > threshold))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('baseline', help='result file to compare against')
+    parser.add_argument('results', help='new result file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='ratio of medians that counts as a regression (default %(default)s)')
+    args = parser.parse_args()
+    old, new = load_results(args.baseline), load_results(args.results)
+    rows = compare(old, new, args.threshold)
+    print(f"{'benchmark':<32} {'size':>8} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for name, size, old_median, new_median, ratio, regressed in rows:
+        print(f"{name:<32} {size:>8} {old_median * 1000:10.2f} {new_median * 1000:10.2f} {ratio:7.2f}"
+              + ('  REGRESSION' if regressed else ''))
+    for key in sorted(old.keys() - new.keys()):
+        print(f'missing in {args.results}: {key[0]} ({key[1]})')
+    sys.exit(1 if any(row[-1] for row in rows) else 0)
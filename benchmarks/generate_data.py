@@ -0,0 +1,69 @@
+# generate_data.py
+# Synthetic event rosters for benchmarks: German-style names, travel groups of realistic size,
+# ages, genders, some notes and unique ticket codes. The same seed always gives the same data.
+#
+# Usage: python benchmarks/generate_data.py 50000 data_50k.csv [--seed 1]
+
+import argparse
+import csv
+import random
+
+HEADER = ['Name', 'Vorname', 'Reisegruppe', 'Alter', 'Geschlecht', 'Anwesend', 'Evakuiert', 'Notiz', 'Ticket']
+
+LAST_NAMES = ['Müller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Meyer', 'Wagner', 'Becker', 'Schulz',
+              'Hoffmann', 'Schäfer', 'Koch', 'Bauer', 'Richter', 'Klein', 'Wolf', 'Schröder', 'Neumann',
+              'Schwarz', 'Zimmermann', 'Braun', 'Krüger', 'Hofmann', 'Hartmann', 'Lange', 'Schmitt',
+              'Werner', 'Schmitz', 'Krause', 'Meier', 'Lehmann', 'Schmid', 'Schulze', 'Maier', 'Köhler',
+              'Herrmann', 'König', 'Walter', 'Mayer', 'Huber', 'Kaiser', 'Fuchs', 'Peters', 'Lang',
+              'Scholz', 'Möller', 'Weiß', 'Jung', 'Hahn', 'Keller', 'Vogel', 'Friedrich', 'Günther']
+FIRST_NAMES = {
+    'Weiblich': ['Anna', 'Julia', 'Lena', 'Marie', 'Sophie', 'Laura', 'Lea', 'Hannah', 'Sarah', 'Lisa',
+                 'Katharina', 'Johanna', 'Clara', 'Emma', 'Mia', 'Charlotte', 'Paula', 'Jana', 'Ursula', 'Gisela'],
+    'Männlich': ['Max', 'Paul', 'Jonas', 'Lukas', 'Felix', 'Leon', 'Tim', 'Jan', 'Niklas', 'David',
+                 'Simon', 'Tobias', 'Moritz', 'Jakob', 'Elias', 'Ben', 'Florian', 'Stefan', 'Andreas', 'Jürgen'],
+}
+TOWNS = ['Berlin', 'Hamburg', 'München', 'Köln', 'Dresden', 'Leipzig', 'Nürnberg', 'Hannover', 'Bremen',
+         'Erfurt', 'Kassel', 'Göttingen', 'Münster', 'Freiburg', 'Würzburg', 'Rostock']
+NOTES = ['Vegetarisch', 'Rollstuhl', 'Allergie: Nüsse', 'Kommt später', 'Reist früher ab', 'Gruppenleitung']
+NOTE_SHARE = 0.05  # Share of individuals with a note
+GROUP_SIZES = (8, 60)  # Smallest and largest travel group
+
+def generate_rows(count, seed=1):
+    """
+    Generates import rows (see backend.individual_from_row) for count individuals.
+    :param count: Number of individuals
+    :param seed: Random seed, the same seed gives the same rows
+    :return: List of rows, each a list of strings
+    """
+    rng = random.Random(seed)
+    rows = []
+    group_number = 0
+    while len(rows) < count:
+        group_number += 1
+        group = f"{rng.choice(TOWNS)} {group_number}"
+        for _ in range(min(rng.randint(*GROUP_SIZES), count - len(rows))):
+            gender = rng.choice(('Weiblich', 'Männlich'))
+            note = rng.choice(NOTES) if rng.random() < NOTE_SHARE else ''
+            rows.append([rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES[gender]), group,
+                         str(rng.randint(12, 85)), gender, 'no', 'no', note, f"B{len(rows):08d}"])
+    return rows
+
+def write_csv(file_path, count, seed=1):
+    """
+    Writes a generated roster to a CSV file with header, in the format the import expects.
+    :param file_path: Path of the CSV file to write
+    :param count: Number of individuals
+    :param seed: Random seed
+    """
+    with open(file_path, mode='w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        writer.writerows(generate_rows(count, seed))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic roster CSV file')
+    parser.add_argument('count', type=int, help='number of individuals')
+    parser.add_argument('file', help='CSV file to write')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    write_csv(args.file, args.count, args.seed)
@@ -0,0 +1,339 @@
+# load_test.py
+# Simulates many desks working against one api_server at once, to size how many desks a server
+# carries. Each simulated desk is a thread with its own NetworkDB client and follows the app's
+# pattern: the initial table load, the 1 s delta poll (reload_from_db), bursts of presence toggles
+# (one apply_batch per click, with log entry and row version, like AsyncDB sends them) and the
+# occasional note edit. Per desk count the harness reports p50/p95/p99 latency and error rate
+# per request kind, version conflicts, and the server's write lock contention (scraped from
+# /metrics: time writers queued for the write lock and "database is locked" failures).
+#
+# Usage: python benchmarks/load_test.py --desks 10,20,40 --duration 30 [--output load.json]
+# By default a server with a scratch database is started on a free port; --url targets a
+# running server instead (its data is changed!).
+
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'src')
+
+POLL_INTERVAL = 1.0  # Seconds between delta polls, as POLL_INTERVAL_MS in main_frame_class
+BURST_INTERVAL = 5.0  # Mean seconds between toggle bursts of one desk
+BURST_CLICKS = (1, 8)  # Clicks per burst
+CLICK_GAP = 0.3  # Seconds between clicks within a burst
+NOTE_INTERVAL = 30.0  # Mean seconds between note edits of one desk
+LOG_PAGE_SIZE = 200
+SERVER_START_TIMEOUT = 15
+METRIC_LINE = re.compile(r'^(\w+)(\{[^}]*\})? (\S+)$')
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value below which the given fraction of the sorted values lie (nearest rank).
+    """
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+class Recorder:
+    """
+    Collects request latencies and errors of all desks, per request kind. Thread-safe.
+    """
+    def __init__(self):
+        self.latencies = {}  # kind -> list of seconds
+        self.errors = {}  # kind -> count
+        self.error_samples = []  # First error messages, for the report
+        self.conflicts = 0
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds, error=None):
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(seconds)
+            if error is not None:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(f'{kind}: {error}')
+
+    def add_conflicts(self, count):
+        with self._lock:
+            self.conflicts += count
+
+    def summary(self, duration):
+        """
+        Returns {kind: {count, rate, errors, error_rate, p50, p95, p99, max}} with times in seconds.
+        """
+        result = {}
+        with self._lock:
+            for kind, values in sorted(self.latencies.items()):
+                values = sorted(values)
+                errors = self.errors.get(kind, 0)
+                result[kind] = {'count': len(values), 'rate': len(values) / duration, 'errors': errors,
+                                'error_rate': errors / len(values), 'p50': percentile(values, 0.5),
+                                'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99),
+                                'max': values[-1]}
+        return result
+
+class Desk(threading.Thread):
+    """
+    One simulated desk: polls, toggles presence in bursts and edits notes until stop is set.
+    """
+    def __init__(self, number, base_url, recorder, stop, seed):
+        super().__init__(name=f'desk-{number}', daemon=True)
+        self.base_url = base_url
+        self.recorder = recorder
+        self.stop = stop
+        self.rng = random.Random(seed)
+
+    def timed(self, kind, function, *args, **kwargs):
+        # Runs one request; failures are recorded and reported as None
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            self.recorder.record(kind, time.perf_counter() - start, error=e)
+            return None
+        self.recorder.record(kind, time.perf_counter() - start)
+        return result
+
+    def run(self):
+        from db import NetworkDB
+        from async_db import fetch_all, fetch_changes
+        self.db = NetworkDB(self.base_url)
+        loaded = self.timed('initial_load', fetch_all, self.db)
+        if loaded is None:
+            return
+        self.revision, guests, _ = loaded
+        self.individuals = {ind.id: ind for ind in guests}
+        self.groups = {}
+        for ind in guests:
+            self.groups.setdefault(ind.reisegruppe, []).append(ind)
+        self.log_last_id = None
+        self.fetch_changes = fetch_changes
+        now = time.monotonic()
+        # Desks do not start in lockstep
+        next_poll = now + self.rng.uniform(0, POLL_INTERVAL)
+        next_burst = now + self.rng.expovariate(1 / BURST_INTERVAL)
+        next_note = now + self.rng.expovariate(1 / NOTE_INTERVAL)
+        while not self.stop.is_set():
+            now = time.monotonic()
+            if now >= next_poll:
+                self.poll()
+                next_poll = max(next_poll + POLL_INTERVAL, time.monotonic())
+            elif now >= next_burst:
+                self.toggle_burst()
+                next_burst = time.monotonic() + self.rng.expovariate(1 / BURST_INTERVAL)
+            elif now >= next_note:
+                self.edit_note()
+                next_note = time.monotonic() + self.rng.expovariate(1 / NOTE_INTERVAL)
+            else:
+                self.stop.wait(min(next_poll, next_burst, next_note) - now)
+
+    def poll(self):
+        change = self.timed('poll', self.fetch_changes, self.db, self.revision, self.log_last_id, LOG_PAGE_SIZE + 1)
+        if not change:
+            return
+        self.revision = change['revision']
+        for ind in change['guest']['individuals']:
+            self.individuals[ind.id] = ind
+        if change['log']:
+            self.log_last_id = change['log'][-1][0]
+
+    def write(self, kind, operations):
+        result = self.timed(kind, self.db.apply_batch, operations)
+        if result is None:
+            return
+        versions, conflicts = result
+        for individual_id, version in versions.items():
+            self.individuals[individual_id].version = version
+        for current in conflicts:
+            self.individuals[current.id] = current
+        self.recorder.add_conflicts(len(conflicts))
+
+    def toggle_burst(self):
+        # Clicks through part of one group, like a desk checking in a group at the counter
+        members = self.groups[self.rng.choice(list(self.groups))]
+        for number in range(self.rng.randint(*BURST_CLICKS)):
+            if number and self.stop.wait(CLICK_GAP):
+                return
+            ind = self.individuals[self.rng.choice(members).id]
+            checked = not ind.anwesend
+            ind.anwesend = checked
+            self.write('toggle', [
+                {'op': 'add_log_entry', 'fullname': f"Gast {'arrived' if checked else 'left'}",
+                 'reisegruppe': f'{ind.vorname} {ind.name}', 'status': ind.reisegruppe},
+                {'op': 'update_status', 'id': ind.id, 'version': ind.version,
+                 'anwesend': checked, 'evakuiert': None if checked else False},
+            ])
+
+    def edit_note(self):
+        ind = self.individuals[self.rng.choice(list(self.individuals))]
+        ind.notiz = f'Notiz {self.rng.randint(1, 10 ** 6)}'
+        self.write('note', [{'op': 'update_note', 'id': ind.id, 'version': ind.version, 'notiz': ind.notiz}])
+
+def parse_metrics(text):
+    """
+    Parses Prometheus text output into {(name, labels): value}.
+    """
+    values = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            values[(match.group(1), match.group(2) or '')] = float(match.group(3))
+    return values
+
+def lock_contention(before, after):
+    """
+    Summarizes the server's write lock metrics between two scrapes.
+    :return: Dict with the number of writes, mean wait, p50/p95/p99 (upper bucket bounds) and busy errors
+    """
+    name = 'checkin_db_write_lock_wait_seconds'
+    buckets = []
+    for (metric, labels), value in after.items():
+        if metric == f'{name}_bucket':
+            bound = float(re.search(r'le="([^"]+)"', labels).group(1).replace('+Inf', 'inf'))
+            buckets.append((bound, value - before.get((metric, labels), 0)))
+    buckets.sort()
+    count = after.get((f'{name}_count', ''), 0) - before.get((f'{name}_count', ''), 0)
+    total = after.get((f'{name}_sum', ''), 0) - before.get((f'{name}_sum', ''), 0)
+
+    def quantile(fraction):
+        for bound, cumulative in buckets:
+            if count and cumulative >= fraction * count:
+                return bound
+        return None
+
+    busy_key = ('checkin_db_sqlite_busy_total', '')
+    return {'writes': int(count), 'mean_wait': total / count if count else 0.0,
+            'p50_wait': quantile(0.5), 'p95_wait': quantile(0.95), 'p99_wait': quantile(0.99),
+            'sqlite_busy': int(after.get(busy_key, 0) - before.get(busy_key, 0))}
+
+def scrape(session, base_url):
+    return parse_metrics(session.get(f'{base_url}/metrics', timeout=10).text)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(workdir, workers, name='server', port=None, extra_args=()):
+    """
+    Starts api_server with a scratch database and waits until it answers.
+    :param name: Database file name (without .db) in workdir
+    :param port: Port to listen on (default: a free one)
+    :param extra_args: Further api_server command line arguments
+    :return: (process, base URL)
+    """
+    import requests
+    port = port or free_port()
+    env = dict(os.environ, CHECKIN_DB_PATH=os.path.join(workdir, f'{name}.db'))
+    process = subprocess.Popen([sys.executable, '-m', 'utils.api_server', '--host', '127.0.0.1', '--port', str(port),
+                                '--workers', str(workers), *extra_args], cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'{base_url}/revision', timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('api_server did not start')
+
+def seed_roster(base_url, size):
+    from db import NetworkDB
+    from backend import individual_from_row
+    from generate_data import generate_rows
+    client = NetworkDB(base_url)
+    client.clear_all()
+    individuals = [individual_from_row(row) for row in generate_rows(size)]
+    client.import_individuals('guest', (individuals[start:start + 5000] for start in range(0, size, 5000)))
+
+def run_load(base_url, desks, duration, seed):
+    """
+    Runs desks simulated desks for duration seconds.
+    :return: Report dict for this desk count
+    """
+    import requests
+    session = requests.Session()
+    before = scrape(session, base_url)
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [Desk(number, base_url, recorder, stop, seed * 1000 + number) for number in range(desks)]
+    for thread in threads:
+        thread.start()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(30)
+    after = scrape(session, base_url)
+    requests_summary = recorder.summary(duration)
+    total = sum(kind['count'] for kind in requests_summary.values())
+    errors = sum(kind['errors'] for kind in requests_summary.values())
+    return {'desks': desks, 'duration': duration, 'requests': requests_summary,
+            'error_rate': errors / total if total else 0.0, 'conflicts': recorder.conflicts,
+            'lock': lock_contention(before, after), 'error_samples': recorder.error_samples}
+
+def _ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.1f}'
+
+def print_report(report):
+    print(f"\n{report['desks']} desks, {report['duration']:.0f} s: error rate {report['error_rate']:.2%}, "
+          f"{report['conflicts']} version conflicts")
+    print(f"  {'kind':<13}{'count':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}")
+    for kind, stats in report['requests'].items():
+        print(f"  {kind:<13}{stats['count']:>7}{stats['rate']:>8.1f}{_ms(stats['p50']):>9}{_ms(stats['p95']):>9}"
+              f"{_ms(stats['p99']):>9}{_ms(stats['max']):>9}{stats['errors']:>8}")
+    lock = report['lock']
+    print(f"  write lock: {lock['writes']} writes, mean wait {_ms(lock['mean_wait'])} ms, p95 <= {_ms(lock['p95_wait'])} ms, "
+          f"p99 <= {_ms(lock['p99_wait'])} ms, {lock['sqlite_busy']} 'database is locked'")
+    for sample in report['error_samples']:
+        print(f'  error: {sample}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent-desk load test for api_server')
+    parser.add_argument('--desks', default='20', help='comma-separated desk counts, run one after another')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per desk count')
+    parser.add_argument('--roster', type=int, default=2000, help='guests seeded into the scratch database')
+    parser.add_argument('--workers', type=int, default=64, help='request threads of the started server')
+    parser.add_argument('--url', help='use a running server instead of starting one (its data is replaced!)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='JSON file for the reports')
+    args = parser.parse_args()
+    sys.path[:0] = [SRC_DIR, BENCHMARK_DIR]
+    with tempfile.TemporaryDirectory() as workdir:
+        # Importing db opens a local database; keep it away from src/quatiersliste.db
+        os.environ['CHECKIN_DB_PATH'] = os.path.join(workdir, 'client.db')
+        process = None
+        base_url = args.url
+        if base_url is None:
+            process, base_url = start_server(workdir, args.workers)
+        try:
+            seed_roster(base_url, args.roster)
+            reports = []
+            for desks in (int(count) for count in args.desks.split(',')):
+                report = run_load(base_url, desks, args.duration, args.seed)
+                print_report(report)
+                reports.append(report)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(30)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'meta': {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                                'roster': args.roster, 'workers': args.workers, 'url': args.url},
+                       'runs': reports}, file, indent=2)
+
+if __name__ == '__main__':
+    main()
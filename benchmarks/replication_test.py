@@ -0,0 +1,163 @@
+# replication_test.py
+# Runs several api_server processes on this machine as replicating sites (each with its own
+# scratch database, every site pulling from all others) and checks that they converge: a roster
+# imported at the first site must appear everywhere, and concurrent status toggles, note edits and
+# log entries at all sites, including conflicting writes to the same individuals, must end up
+# identical on every site. A status conflict between two sites (one checks a person out while the
+# other evacuates them) must end with the later status on both, never a mix of the two.
+# Reports how long convergence took.
+#
+# Usage: python benchmarks/replication_test.py [--sites 3] [--roster 1000] [--writes 200]
+# Exits with status 1 if the sites do not converge within --timeout seconds.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from load_test import SRC_DIR, BENCHMARK_DIR, free_port, start_server
+
+CHECK_INTERVAL = 0.25  # Seconds between convergence checks
+CONFLICT_SHARE = 0.2  # Share of writes that go to a small set of individuals edited at every site
+
+def site_state(client):
+    """
+    Returns what must be equal on all sites: the individuals by ticket and the log entries.
+    """
+    individuals = {ind.ticket: (ind.name, ind.vorname, bool(ind.anwesend), bool(ind.evakuiert), ind.notiz)
+                   for ind in client.load_individuals('guest')}
+    log = sorted(tuple(entry[1:]) for entry in client.load_log())
+    return individuals, log
+
+def wait_for_convergence(clients, timeout, expected_individuals=None):
+    """
+    Polls all sites until their states are equal.
+    :param expected_individuals: Optionally also wait until every site has this many individuals
+    :return: Seconds until convergence, or None after the timeout
+    """
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        states = [site_state(client) for client in clients]
+        if all(state == states[0] for state in states) and (
+                expected_individuals is None or len(states[0][0]) == expected_individuals):
+            return time.monotonic() - start
+        time.sleep(CHECK_INTERVAL)
+    return None
+
+def write_at_site(client, site, writes, conflict_tickets, seed):
+    # Random toggles and notes at one site; ids differ between sites, tickets do not
+    rng = random.Random(seed)
+    individuals = client.load_individuals('guest')
+    by_ticket = {ind.ticket: ind for ind in individuals}
+    for number in range(writes):
+        if rng.random() < CONFLICT_SHARE:
+            ind = by_ticket[rng.choice(conflict_tickets)]
+        else:
+            ind = rng.choice(individuals)
+        if rng.random() < 0.8:
+            present = rng.random() < 0.5
+            client.update_status(ind.id, anwesend=present)
+            client.add_log_entry(f'{ind.vorname} {ind.name}', ind.reisegruppe, f'{site}: {"arrived" if present else "left"}')
+        else:
+            client.patch_individual(ind.id, {'notiz': f'{site} note {number}'})
+
+def status_conflict(clients, ticket, timeout):
+    """
+    Checks a present person out at the first site and evacuates them right after at the second
+    one, before the sites exchanged the change.
+    :return: Seconds until convergence, or None after the timeout
+    :raises AssertionError: If the sites settle on another status than the later write's
+    """
+    first, second = clients[:2]
+    _, person = first.find_by_ticket(ticket)
+    first.update_status(person.id, anwesend=True, evakuiert=False)
+    if wait_for_convergence(clients, timeout) is None:
+        return None
+    first.update_status(person.id, anwesend=False, evakuiert=False)
+    _, person = second.find_by_ticket(ticket)
+    second.update_status(person.id, evakuiert=True)
+    _, person = second.find_by_ticket(ticket)
+    expected = (bool(person.anwesend), bool(person.evakuiert))
+    seconds = wait_for_convergence(clients, timeout)
+    if seconds is not None:
+        for client in clients:
+            _, person = client.find_by_ticket(ticket)
+            status = (bool(person.anwesend), bool(person.evakuiert))
+            assert status == expected, f'Status {status} after the conflict, expected {expected}'
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser(description='Convergence test for replicating api_servers')
+    parser.add_argument('--sites', type=int, default=3, help='number of server processes')
+    parser.add_argument('--roster', type=int, default=1000, help='guests imported at the first site')
+    parser.add_argument('--writes', type=int, default=200, help='writes per site, made concurrently')
+    parser.add_argument('--interval', type=float, default=0.5, help='replication interval of the servers')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds to wait for convergence')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    sys.path[:0] = [SRC_DIR, BENCHMARK_DIR]
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['CHECKIN_DB_PATH'] = os.path.join(workdir, 'client.db')
+        from db import NetworkDB
+        from backend import individual_from_row
+        from generate_data import generate_rows
+        ports = [free_port() for _ in range(args.sites)]
+        urls = [f'http://127.0.0.1:{port}' for port in ports]
+        processes = []
+        try:
+            for number, port in enumerate(ports):
+                peers = [arg for url in urls if url != urls[number] for arg in ('--peer', url)]
+                process, _ = start_server(workdir, 16, name=f'site{number}', port=port,
+                                          extra_args=['--node-id', f'site-{number}',
+                                                      '--replication-interval', str(args.interval), *peers])
+                processes.append(process)
+            clients = [NetworkDB(url) for url in urls]
+            clients[0].add_individuals('guest', [individual_from_row(row) for row in generate_rows(args.roster, args.seed)])
+            seconds = wait_for_convergence(clients, args.timeout, expected_individuals=args.roster)
+            if seconds is None:
+                print(f'Roster import did not reach all sites within {args.timeout} s')
+                sys.exit(1)
+            print(f'Roster of {args.roster} replicated to {args.sites} sites in {seconds:.2f} s')
+
+            tickets = sorted(ind.ticket for ind in clients[0].load_individuals('guest'))
+            conflict_tickets = random.Random(args.seed).sample(tickets, min(10, len(tickets)))
+            threads = [threading.Thread(target=write_at_site, args=(client, f'site-{number}', args.writes,
+                                                                    conflict_tickets, args.seed + number))
+                       for number, client in enumerate(clients)]
+            start = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            written = time.monotonic() - start
+            seconds = wait_for_convergence(clients, args.timeout)
+            if seconds is None:
+                print(f'Sites did not converge within {args.timeout} s after the writes')
+                sys.exit(1)
+            individuals, log = site_state(clients[0])
+            print(f'{args.writes} writes per site ({len(conflict_tickets)} individuals edited everywhere) made in '
+                  f'{written:.2f} s, converged {seconds:.2f} s later: '
+                  f'{sum(state[2] for state in individuals.values())} present, {len(log)} log entries on every site')
+
+            if args.sites >= 2:
+                try:
+                    seconds = status_conflict(clients, conflict_tickets[0], args.timeout)
+                except AssertionError as error:
+                    print(error)
+                    sys.exit(1)
+                if seconds is None:
+                    print(f'Sites did not converge within {args.timeout} s after the status conflict')
+                    sys.exit(1)
+                print(f'Status conflict (checked out at one site, evacuated at another) resolved to the later '
+                      f'status on every site in {seconds:.2f} s')
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(30)
+
+if __name__ == '__main__':
+    main()
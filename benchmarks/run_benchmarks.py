@@ -0,0 +1,254 @@
+# run_benchmarks.py
+# Times the hot paths of the app at event scale: CSV loading, the SQLite layer, the manager's
+# search, the REST endpoints (Flask test client, no network), desk snapshots and filling the GUI
+# table under offscreen Qt. Each roster size runs in its own process against a scratch database, so sizes do
+# not influence each other and the real quatiersliste.db is never touched.
+# Results are written as JSON; compare two result files with benchmarks/compare.py.
+#
+# Usage: python benchmarks/run_benchmarks.py --sizes 1000,10000,200000 --output results.json
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'src')
+DEFAULT_SIZES = [1000, 10000, 50000]
+DEFAULT_REPEAT = 5
+GROUPS = ['csv', 'db', 'backend', 'api', 'snapshot', 'gui']
+SEARCH_QUERIES = ['Müller', 'mueller anna', 'Schmdit', 'Berlin 3', 'rollstuhl', 'ju']
+LOG_PAGE_SIZE = 200
+BATCH_SIZE = 100
+
+def measure(results, name, size, function, setup=None, repeat=DEFAULT_REPEAT):
+    """
+    Times function repeat times and appends the statistics to results.
+    :param results: List the result dict is appended to
+    :param name: Benchmark name, e.g. 'db.load_individuals'
+    :param size: Roster size the benchmark ran with
+    :param function: Called with the return value of setup (if any); only this call is timed
+    :param setup: Optional untimed callable run before every repetition
+    :param repeat: Number of repetitions
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else None
+        start = time.perf_counter()
+        function() if setup is None else function(args)
+        times.append(time.perf_counter() - start)
+    results.append({'name': name, 'size': size, 'repeat': repeat, 'min': min(times),
+                    'median': statistics.median(times), 'max': max(times)})
+
+def bench_csv(results, size, repeat, workdir):
+    from generate_data import write_csv
+    from utils.csv_loader import load_data
+    file_path = os.path.join(workdir, f'roster_{size}.csv')
+    write_csv(file_path, size)
+    measure(results, 'csv_loader.load_data', size, lambda: load_data(file_path), repeat=repeat)
+
+def bench_db(results, size, repeat, rows):
+    import db
+    from backend import individual_from_row
+
+    def fresh():
+        db.clear_all()
+        return [individual_from_row(row) for row in rows]
+
+    measure(results, 'db.save_individuals.insert', size, lambda inds: db.save_individuals('guest', inds),
+            setup=fresh, repeat=repeat)
+    measure(results, 'db.save_individuals.update', size, lambda inds: db.save_individuals('guest', inds),
+            setup=lambda: db.load_individuals('guest'), repeat=repeat)
+    measure(results, 'db.load_individuals', size, lambda: db.load_individuals('guest'), repeat=repeat)
+    # A log about as long as the roster (one arrival per individual)
+    db.apply_batch([{'op': 'add_log_entry', 'fullname': f'{row[1]} {row[0]}', 'reisegruppe': row[2],
+                     'status': 'Gast arrived'} for row in rows])
+    measure(results, 'db.load_log.page', size, lambda: db.load_log(limit=LOG_PAGE_SIZE), repeat=repeat)
+    measure(results, 'db.load_log.all', size, lambda: db.load_log(), repeat=repeat)
+    # Status events: everybody arrives, every tenth leaves again
+    ids = [ind.id for ind in db.load_individuals('guest')]
+    db.set_status_bulk(ids, anwesend=True)
+    db.set_status_bulk(ids[::10], anwesend=False)
+    measure(results, 'db.load_events.individual', size, lambda: db.load_events(individual_id=ids[0]), repeat=repeat)
+    measure(results, 'db.load_events.window', size,
+            lambda: db.load_events(start=int(time.time() * 1000) - 3600000), repeat=repeat)
+    # Occupancy timeline: reading all events, then a series once it is up to date
+    import timeline
+    measure(results, 'db.timeline.build', size, lambda: timeline.OccupancyTimeline(db).refresh(), repeat=repeat)
+    built = timeline.OccupancyTimeline(db)
+    measure(results, 'db.timeline.series', size, lambda: built.series(), repeat=repeat)
+
+def bench_backend(results, size, repeat, rows):
+    from backend import CheckInOutManager, individual_from_row
+    individuals = [individual_from_row(row) for row in rows]
+    for number, individual in enumerate(individuals, 1):
+        individual.id = number
+    measure(results, 'backend.CheckInOutManager', size, lambda: CheckInOutManager(list(individuals), 'guest'),
+            repeat=repeat)
+    # The first search pays for building the index
+    measure(results, 'backend.search.first', size, lambda manager: manager.search(SEARCH_QUERIES[0]),
+            setup=lambda: CheckInOutManager(list(individuals), 'guest'), repeat=repeat)
+    manager = CheckInOutManager(list(individuals), 'guest')
+    manager.search('')
+    measure(results, 'backend.search', size, lambda: [manager.search(query) for query in SEARCH_QUERIES],
+            repeat=repeat)
+
+def bench_api(results, size, repeat):
+    import db
+    from utils.api_server import app
+    client = app.test_client()
+    ids = [ind.id for ind in db.load_individuals('guest')]
+
+    def move_revision():
+        # Any write invalidates the response cache
+        db.add_log_entry('Benchmark', '', 'cache miss')
+
+    measure(results, 'api.get_individuals.uncached', size, lambda _: client.get('/individuals/guest').get_data(),
+            setup=move_revision, repeat=repeat)
+    measure(results, 'api.get_individuals.cached', size, lambda: client.get('/individuals/guest').get_data(),
+            repeat=repeat)
+    measure(results, 'api.get_individuals.gzip', size,
+            lambda _: client.get('/individuals/guest', headers={'Accept-Encoding': 'gzip'}).get_data(),
+            setup=move_revision, repeat=repeat)
+    measure(results, 'api.patch', size,
+            lambda: client.patch(f'/individuals/{ids[0]}', json={'anwesend': True}).get_data(), repeat=repeat)
+    measure(results, 'api.get_changes', size,
+            lambda revision: client.get('/individuals/guest/changes', query_string={'since': revision}).get_data(),
+            setup=lambda: db.get_revision() - 1, repeat=repeat)
+    operations = [{'op': 'update_status', 'id': individual_id, 'anwesend': True} for individual_id in ids[:BATCH_SIZE]]
+    measure(results, f'api.batch_{BATCH_SIZE}', size,
+            lambda: client.post('/batch', json={'operations': operations}).get_data(), repeat=repeat)
+    measure(results, 'api.get_stats', size, lambda _: client.get('/stats').get_data(), setup=move_revision,
+            repeat=repeat)
+    # After a write: the new events are added to the timeline and the series recomputed
+    measure(results, 'api.get_stats_timeline', size, lambda _: client.get('/stats/timeline').get_data(),
+            setup=move_revision, repeat=repeat)
+    measure(results, 'api.get_log', size, lambda _: client.get('/log', query_string={'limit': LOG_PAGE_SIZE}).get_data(),
+            setup=move_revision, repeat=repeat)
+
+def bench_snapshot(results, size, repeat, workdir):
+    import db
+    import snapshot
+    file_path = os.path.join(workdir, 'snapshot.bin')
+    tables = {'guest': snapshot.capture(db.load_individuals('guest')), 'team': []}
+    measure(results, 'snapshot.write', size, lambda: snapshot.write_snapshot(file_path, 'benchmark', 1, None, tables),
+            repeat=repeat)
+    measure(results, 'snapshot.read', size, lambda: snapshot.read_snapshot(file_path), repeat=repeat)
+
+def bench_gui(results, size, repeat):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import db
+    from PyQt6 import QtWidgets
+    from main_frame_class import MainFrame
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    start = time.perf_counter()
+    window = MainFrame()
+    startup = time.perf_counter() - start
+    results.append({'name': 'gui.MainFrame', 'size': size, 'repeat': 1, 'min': startup, 'median': startup, 'max': startup})
+    measure(results, 'gui.populate_table', size,
+            lambda individuals: window.populate_table(window.ui.guest_table, individuals),
+            setup=lambda: db.load_individuals('guest'), repeat=repeat)
+    window.close()
+    app.processEvents()
+    # Closing saved a snapshot, so this start skips loading the tables from the database
+    start = time.perf_counter()
+    window = MainFrame()
+    startup = time.perf_counter() - start
+    results.append({'name': 'gui.MainFrame.snapshot', 'size': size, 'repeat': 1, 'min': startup, 'median': startup,
+                    'max': startup})
+    window.close()
+    app.processEvents()
+
+def run_size(size, repeat, groups):
+    """
+    Runs the selected benchmark groups for one roster size in this process.
+    The caller must have pointed CHECKIN_DB_PATH at a scratch database before db is imported.
+    :return: List of result dicts
+    """
+    sys.path[:0] = [SRC_DIR, BENCHMARK_DIR]
+    from generate_data import generate_rows
+    rows = generate_rows(size)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'csv' in groups:
+            bench_csv(results, size, repeat, workdir)
+        if 'db' in groups or 'api' in groups or 'snapshot' in groups or 'gui' in groups:
+            bench_db(results, size, repeat, rows)
+        if 'backend' in groups:
+            bench_backend(results, size, repeat, rows)
+        if 'api' in groups:
+            bench_api(results, size, repeat)
+        if 'snapshot' in groups:
+            bench_snapshot(results, size, repeat, workdir)
+        if 'gui' in groups:
+            bench_gui(results, size, repeat)
+    if 'db' not in groups:
+        # The db benchmarks only ran to fill the database
+        results = [result for result in results if not result['name'].startswith('db.')]
+    return results
+
+def run_isolated(size, repeat, groups):
+    # One child process per size with its own scratch database
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, CHECKIN_DB_PATH=os.path.join(workdir, 'benchmark.db'), QT_QPA_PLATFORM='offscreen')
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(size),
+                                 '--repeat', str(repeat), '--groups', ','.join(groups)],
+                                env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark backend, db, API and GUI at event scale')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated roster sizes (1000 to 200000)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='repetitions per benchmark')
+    parser.add_argument('--groups', default=','.join(GROUPS), help=f'comma-separated subset of {",".join(GROUPS)}')
+    parser.add_argument('--output', help='JSON file for the results (default: print only)')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    groups = [group for group in args.groups.split(',') if group]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f'unknown groups: {", ".join(sorted(unknown))}')
+    if args.worker is not None:
+        # Anything printed while benchmarking goes to stderr, stdout only carries the results
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        json.dump(run_size(args.worker, args.repeat, groups), stdout)
+        return
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        print(f'Roster size {size}...', file=sys.stderr, flush=True)
+        for result in run_isolated(size, args.repeat, groups):
+            results.append(result)
+            print(f"  {result['name']:<32} median {result['median'] * 1000:10.2f} ms   min {result['min'] * 1000:10.2f} ms",
+                  file=sys.stderr, flush=True)
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f'Results written to {args.output}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+# async_db.py
+# Asynchronous access to a db backend (db module or NetworkDB) for the main window.
+# All calls run in order on one background thread, so a slow or unreachable server never blocks
+# the GUI thread. Results are handed back through a Qt signal, i.e. on the GUI thread.
+# Writes are fire-and-forget: the window applies them to its models right away (optimistically)
+# and queues them here. Writes queued while a request is in flight are coalesced into one
+# apply_batch call. Writes that failed for a passing reason (server unreachable or overloaded,
+# database locked) are retried until they reach the database; any other error drops them, and
+# the window reloads the rows it had changed optimistically.
+# Writes carry the row version the window knew; writes that lost against another desk come back
+# as conflicts with the current row.
+
+import sqlite3
+import threading
+from collections import Counter, deque
+import requests
+from PyQt6 import QtCore
+
+RETRY_MIN_SECONDS = 1
+RETRY_MAX_SECONDS = 30
+
+def coalesce(operations):
+    """
+    Merges batch operations on the same individual, later values winning.
+    Log entries and bulk status changes are kept as they are; a later single change after a bulk
+    change of the same individual is not merged into one before it.
+    :param operations: List of apply_batch operation dicts, oldest first
+    :return: New list of operations
+    """
+    merged = []
+    by_target = {}
+    for operation in operations:
+        op = operation['op']
+        if op not in ('update_status', 'update_note'):
+            merged.append(dict(operation))
+            for individual_id in operation.get('ids', ()):
+                by_target.pop(('update_status', individual_id), None)
+            continue
+        key = (op, operation['id'])
+        target = by_target.get(key)
+        if target is None:
+            by_target[key] = target = dict(operation)
+            merged.append(target)
+        else:
+            # Fields left out (None) keep the value of the earlier operation; the merged write is
+            # based on the version the first one expected
+            target.update({field: value for field, value in operation.items()
+                           if value is not None and field != 'version'})
+    return merged
+
+def _is_transient(error):
+    # True for errors after which sending the same batch again can succeed
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        return 'locked' in str(error)
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is not None and status >= 500
+
+def _operation_ids(operation):
+    # Ids of the individuals a batch operation writes
+    if 'id' in operation:
+        return [operation['id']]
+    return operation.get('ids', [])
+
+def fetch_changes(db, since_rev, log_after, log_limit):
+    """
+    Collects everything that changed after revision since_rev, shaped like a change event of
+    NetworkDB.subscribe_changes.
+    :return: Change dict, or None if the revision did not move
+    """
+    revision = db.get_revision()
+    if revision == since_rev:
+        return None
+    change = {'revision': revision}
+    for table_type in ('guest', 'team'):
+        _, changed, deleted_ids = db.load_changes(table_type, since_rev)
+        change[table_type] = {'individuals': changed, 'deleted': deleted_ids}
+    change['log'] = db.load_log(after_id=log_after or 0, limit=log_limit)
+    return change
+
+def fetch_all(db):
+    """
+    Loads both tables completely.
+    :return: (revision, guest individuals, team individuals)
+    """
+    revision = db.get_revision()
+    return revision, db.load_individuals('guest'), db.load_individuals('team')
+
+def fetch_since_snapshot(db, node_id, since_rev, log_after, log_limit):
+    """
+    Brings a desk started from a snapshot up to date: only the changes since the snapshot, unless
+    the database is not the one the snapshot was taken from (or was restored to an older state).
+    :param node_id: Node id of the database the snapshot was taken from
+    :return: (node id of the database, change dict or None, fetch_all result or None)
+    """
+    current_node_id = db.get_node_id()
+    if current_node_id != node_id or db.get_revision() < since_rev:
+        return current_node_id, None, fetch_all(db)
+    return current_node_id, fetch_changes(db, since_rev, log_after, log_limit), None
+
+class AsyncDB(QtCore.QObject):
+    """
+    Runs database calls on a background thread.
+    :param db: db module or NetworkDB instance
+    """
+    failed = QtCore.pyqtSignal(str)  # Error message of a failed call or of a write that will be retried
+    written = QtCore.pyqtSignal(object)  # {individual id: new row version} of a batch that reached the database
+    conflicts = QtCore.pyqtSignal(object)  # Current rows (Individuals) of writes rejected for a stale version
+    dropped = QtCore.pyqtSignal(object)  # Ids of individuals whose writes failed for good and were not written
+    _done = QtCore.pyqtSignal(object, object)  # (callback, result), delivered on the GUI thread
+    _written = QtCore.pyqtSignal(object, object)  # (ids with queued writes, new versions)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self._tasks = deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._pending_ids = Counter()  # Only touched on the GUI thread
+        self._versions = {}  # individual id -> version after this desk's last write, worker thread only
+        self._done.connect(self._deliver)
+        self._written.connect(self._forget_written)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='async-db', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """
+        Stops the worker after the queued writes went out (waiting at most timeout seconds).
+        Queued reads are dropped.
+        """
+        with self._condition:
+            self._stopping = True
+            self._tasks = deque(task for task in self._tasks if task[0] == 'write')
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def write(self, operation):
+        """
+        Queues a write, see db.apply_batch for the operation format.
+        :param operation: Operation dict
+        """
+        for individual_id in _operation_ids(operation):
+            self._pending_ids[individual_id] += 1
+        self._put(('write', operation))
+
+    def call(self, function, *args, callback=None, errback=None, **kwargs):
+        """
+        Queues function(*args, **kwargs) to run on the worker thread, after all earlier calls
+        and writes. The function must only use the database, not any Qt object.
+        :param callback: Called on the GUI thread with the result
+        :param errback: Called on the GUI thread with the error message if the call failed
+        """
+        self._put(('call', function, args, kwargs, callback, errback))
+
+    def has_pending_write(self, individual_id):
+        """
+        Returns True while a queued write for the individual has not reached the database yet.
+        Incoming deltas for such an individual are older than the local state and should be skipped.
+        """
+        return self._pending_ids[individual_id] > 0
+
+    def has_pending_writes(self):
+        """
+        Returns True while any queued write for an individual has not reached the database yet.
+        """
+        return bool(self._pending_ids)
+
+    def _put(self, task):
+        with self._condition:
+            self._tasks.append(task)
+            self._condition.notify()
+
+    def _deliver(self, callback, result):
+        callback(result)
+
+    def _forget_written(self, ids, versions):
+        for individual_id in ids:
+            self._pending_ids[individual_id] -= 1
+            if self._pending_ids[individual_id] <= 0:
+                del self._pending_ids[individual_id]
+        self.written.emit(versions)
+
+    def _next_task(self):
+        # Returns the next task; when it is a write, ALL queued writes are merged into one
+        # ('batch', operations) task. Reads queued in between then run after the batch, which
+        # only means they see newer data.
+        with self._condition:
+            while not self._tasks and not self._stopping:
+                self._condition.wait()
+            if not self._tasks:
+                return None
+            if self._tasks[0][0] != 'write':
+                return self._tasks.popleft()
+            operations = [task[1] for task in self._tasks if task[0] == 'write']
+            self._tasks = deque(task for task in self._tasks if task[0] != 'write')
+            return ('batch', operations)
+
+    def _run(self):
+        try:
+            while True:
+                task = self._next_task()
+                if task is None:
+                    return
+                if task[0] == 'batch':
+                    self._send_batch(task[1])
+                else:
+                    self._run_call(*task[1:])
+        finally:
+            self.db.release_connection()
+
+    def _send_batch(self, operations):
+        ids = [individual_id for operation in operations for individual_id in _operation_ids(operation)]
+        batch = coalesce(operations)
+        for operation in batch:
+            # A write queued before the result of this desk's previous write came back carries
+            # the version from before it; that is not a conflict, so send the newer version
+            known = self._versions.get(operation.get('id'))
+            if operation.get('version') is not None and known is not None and operation['version'] < known:
+                operation['version'] = known
+        versions, conflicts = {}, []
+        delay = RETRY_MIN_SECONDS
+        while True:
+            try:
+                versions, conflicts = self.db.apply_batch(batch)
+                break
+            except Exception as e:
+                if not _is_transient(e):
+                    # Rejected or broken, sending it again would not help; the window shows
+                    # these writes already and has to take them back
+                    self.failed.emit(f"Änderung abgelehnt: {e}")
+                    self._written.emit(ids, {})
+                    self.dropped.emit(ids)
+                    return
+                self.failed.emit(f"Server nicht erreichbar, Änderungen werden erneut gesendet: {e}")
+                with self._condition:
+                    if self._stopping:
+                        return
+                    self._condition.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+        self._versions.update(versions)
+        if conflicts:
+            self.conflicts.emit(conflicts)
+        self._written.emit(ids, versions)
+
+    def _run_call(self, function, args, kwargs, callback, errback):
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            if errback is not None:
+                self._done.emit(errback, str(e))
+            else:
+                self.failed.emit(str(e))
+            return
+        if callback is not None:
+            self._done.emit(callback, result)
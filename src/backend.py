@@ -1,28 +1,287 @@
 import csv
-import uuid  # Import for generating unique IDs
+import itertools
+import sys
 from utils.csv_loader import load_data, save_csv  # Import the updated CSV functions
+from search_index import SearchIndex
+
+# Temporary ids for individuals not yet stored; negative so they never collide with database row ids
+_temporary_ids = itertools.count(-1, -1)
+
+def _to_age(alter):
+    """
+    Converts an age to int where possible ('24' -> 24); other values are kept as they are.
+    """
+    if isinstance(alter, int):
+        return alter
+    try:
+        return int(alter)
+    except (TypeError, ValueError):
+        return alter
 
 class Individual:
     """
     Represents an individual with attributes such as name, group, age, gender, and status.
+    Uses __slots__ (no per-instance __dict__) and interns the group and gender strings, which
+    repeat across thousands of individuals, to keep large rosters small in memory.
     """
+    __slots__ = ('id', 'name', 'vorname', 'reisegruppe', 'alter', 'geschlecht', 'anwesend', 'evakuiert', 'notiz', 'version', 'ticket')
+
     def __init__(self, name, vorname, reisegruppe, alter, geschlecht):
-        self.id = str(uuid.uuid4())  # Generate a unique ID for the individual
+        self.id = next(_temporary_ids)  # Replaced by the persistent row id once stored in the database
         self.name = name  # Last name of the individual
         self.vorname = vorname  # First name of the individual
-        self.reisegruppe = reisegruppe  # Group the individual belongs to
-        self.alter = alter  # Age of the individual
-        self.geschlecht = geschlecht  # Gender of the individual
+        self.reisegruppe = sys.intern(reisegruppe) if isinstance(reisegruppe, str) else reisegruppe  # Group the individual belongs to
+        self.alter = _to_age(alter)  # Age of the individual
+        self.geschlecht = sys.intern(geschlecht) if isinstance(geschlecht, str) else geschlecht  # Gender of the individual
         self.anwesend = False  # Presence status (default: False)
         self.evakuiert = False  # Evacuation status (default: False)
         self.notiz = ""  # Personal notes (default: empty string)
+        self.version = 0  # Row version in the database, sent with writes to detect concurrent changes
+        self.ticket = None  # Ticket code printed on the badge; assigned by the database if not imported
+
+def normalize_ticket(code):
+    """
+    Normalizes a ticket code as typed or scanned: surrounding whitespace removed, uppercase.
+    :param code: Ticket code
+    :return: Normalized code, or None for an empty code
+    """
+    code = str(code).strip().upper() if code is not None else ''
+    return code or None
+
+def individual_from_row(row):
+    """
+    Builds an Individual from an import row: Name, Vorname, Reisegruppe, Alter, Geschlecht
+    and optionally Anwesend ('yes'/'no'), Evakuiert ('yes'/'no'), Notiz and Ticket.
+    :param row: List of column values
+    :return: The Individual, or None if the row is invalid (too short, no name, non-numeric age)
+    """
+    if len(row) < 5:
+        return None
+    name, vorname, reisegruppe, alter, geschlecht = (str(value).strip() for value in row[:5])
+    if not name and not vorname:
+        return None
+    try:
+        alter = int(alter) if alter else 0
+    except ValueError:
+        return None
+    individual = Individual(name, vorname, reisegruppe, alter, geschlecht)
+    individual.anwesend = row[5].strip().lower() == 'yes' if len(row) > 5 else False
+    individual.evakuiert = row[6].strip().lower() == 'yes' if len(row) > 6 else False
+    individual.notiz = row[7] if len(row) > 7 else ''
+    individual.ticket = normalize_ticket(row[8]) if len(row) > 8 else None
+    return individual
+
+class StatusAggregates:
+    """
+    Running totals of individuals, present and evacuated, overall, per reisegruppe and per table_type.
+    Each status change updates the totals in O(1) instead of re-summing all individuals.
+    """
+    def __init__(self):
+        self.total = self._empty()
+        self.by_group = {}  # reisegruppe -> counts
+        self.by_table = {}  # table_type -> counts
+
+    @staticmethod
+    def _empty():
+        return {'gesamt': 0, 'anwesend': 0, 'evakuiert': 0}
+
+    def add_counts(self, table_type, reisegruppe, gesamt=0, anwesend=0, evakuiert=0):
+        """
+        Adds (or with negative values removes) counts for a table_type and group.
+        :param table_type: 'guest' or 'team'
+        :param reisegruppe: Name of the group
+        :param gesamt: Change of the number of individuals
+        :param anwesend: Change of the number of present individuals
+        :param evakuiert: Change of the number of evacuated individuals
+        """
+        for counts in (self.total,
+                       self.by_group.setdefault(reisegruppe, self._empty()),
+                       self.by_table.setdefault(table_type, self._empty())):
+            counts['gesamt'] += gesamt
+            counts['anwesend'] += anwesend
+            counts['evakuiert'] += evakuiert
+        if self.by_group[reisegruppe]['gesamt'] == 0:
+            del self.by_group[reisegruppe]
+
+    def add_individual(self, table_type, individual, sign=1):
+        """
+        Counts an individual in (sign=1) or out (sign=-1) of the totals.
+        """
+        self.add_counts(table_type, individual.reisegruppe, sign,
+                        sign * int(bool(individual.anwesend)), sign * int(bool(individual.evakuiert)))
+
+    def to_dict(self):
+        """
+        Returns the aggregates as plain dicts, e.g. for JSON serialization.
+        """
+        return {
+            'total': dict(self.total),
+            'by_group': {group: dict(counts) for group, counts in self.by_group.items()},
+            'by_table': {table_type: dict(counts) for table_type, counts in self.by_table.items()}
+        }
 
 class CheckInOutManager:
     """
     Manages a list of individuals and provides methods for updating their status and notes.
+    Besides the list, the manager keeps indexes by id, by reisegruppe and by status, so lookups
+    and per-group listings do not scan the whole population. Status changes must therefore go
+    through the manager (set_presence_by_id, set_evacuated_by_id, ...) to keep the indexes in sync.
     """
-    def __init__(self):
+    def __init__(self, individuals=None, table_type=None, aggregates=None):
         self.individuals = []  # List to store Individual objects
+        self.table_type = table_type  # 'guest' or 'team', used for the aggregates
+        self.aggregates = aggregates if aggregates is not None else StatusAggregates()  # May be shared between managers
+        self._by_id = {}  # id -> Individual
+        self._positions = {}  # id -> index in self.individuals
+        self._by_group = {}  # reisegruppe -> {id: Individual}
+        self._by_ticket = {}  # ticket code -> id, for scanning
+        self._present_ids = set()  # ids of individuals marked as present
+        self._evacuated_ids = set()  # ids of individuals marked as evacuated
+        self.search_index = SearchIndex()  # Word/trigram index used by search()
+        if individuals is not None:
+            self.set_individuals(individuals)
+
+    def _index(self, individual, count=True):
+        self._by_id[individual.id] = individual
+        self._by_group.setdefault(individual.reisegruppe, {})[individual.id] = individual
+        if individual.ticket:
+            self._by_ticket[individual.ticket] = individual.id
+        if individual.anwesend:
+            self._present_ids.add(individual.id)
+        if individual.evakuiert:
+            self._evacuated_ids.add(individual.id)
+        if count:
+            self.aggregates.add_individual(self.table_type, individual)
+        self.search_index.add(individual)
+
+    def _unindex(self, individual):
+        self._by_id.pop(individual.id, None)
+        group = self._by_group.get(individual.reisegruppe)
+        if group is not None:
+            group.pop(individual.id, None)
+            if not group:
+                del self._by_group[individual.reisegruppe]
+        if individual.ticket and self._by_ticket.get(individual.ticket) == individual.id:
+            del self._by_ticket[individual.ticket]
+        self._present_ids.discard(individual.id)
+        self._evacuated_ids.discard(individual.id)
+        self.aggregates.add_individual(self.table_type, individual, sign=-1)
+        self.search_index.remove(individual.id)
+
+    def set_individuals(self, individuals):
+        """
+        Replaces all individuals and rebuilds the indexes.
+        :param individuals: List of Individual objects (kept by reference)
+        """
+        for individual in self.individuals:
+            self.aggregates.add_individual(self.table_type, individual, sign=-1)
+        self.individuals = individuals
+        self._by_id = {}
+        self._by_group = {}
+        self._by_ticket = {}
+        self._present_ids = set()
+        self._evacuated_ids = set()
+        self.search_index = SearchIndex()
+        # Counted per group first and added to the aggregates once per group, not per individual
+        counts = {}  # reisegruppe -> [gesamt, anwesend, evakuiert]
+        for individual in individuals:
+            self._index(individual, count=False)
+            group_counts = counts.get(individual.reisegruppe)
+            if group_counts is None:
+                group_counts = counts[individual.reisegruppe] = [0, 0, 0]
+            group_counts[0] += 1
+            if individual.anwesend:
+                group_counts[1] += 1
+            if individual.evakuiert:
+                group_counts[2] += 1
+        for reisegruppe, (gesamt, anwesend, evakuiert) in counts.items():
+            self.aggregates.add_counts(self.table_type, reisegruppe, gesamt, anwesend, evakuiert)
+        self._positions = {individual.id: position for position, individual in enumerate(individuals)}
+
+    def add_individual(self, individual):
+        """
+        Adds an individual to the list and the indexes.
+        :param individual: Individual to add
+        """
+        self._positions[individual.id] = len(self.individuals)
+        self.individuals.append(individual)
+        self._index(individual)
+
+    def replace_individual(self, individual):
+        """
+        Replaces the individual with the same id (e.g. a fresher copy from the database).
+        :param individual: New version of the individual
+        :return: True if an individual was replaced, False if the id is unknown
+        """
+        old = self._by_id.get(individual.id)
+        if old is None:
+            return False
+        self.individuals[self._positions[individual.id]] = individual
+        self._unindex(old)
+        self._index(individual)
+        return True
+
+    def remove_by_ids(self, individual_ids):
+        """
+        Removes individuals by their unique IDs.
+        :param individual_ids: Iterable of ids to remove
+        :return: Number of removed individuals
+        """
+        removed = [self._by_id[ind_id] for ind_id in set(individual_ids) if ind_id in self._by_id]
+        if removed:
+            for individual in removed:
+                self._unindex(individual)
+            self.individuals[:] = [ind for ind in self.individuals if ind.id in self._by_id]
+            self._positions = {individual.id: position for position, individual in enumerate(self.individuals)}
+        return len(removed)
+
+    def get_by_id(self, individual_id):
+        """
+        Returns the individual with the given ID, or None.
+        :param individual_id: Unique ID of the individual
+        """
+        return self._by_id.get(individual_id)
+
+    def get_by_ticket(self, code):
+        """
+        Returns the individual with the given ticket code, or None.
+        :param code: Ticket code as scanned (normalized with normalize_ticket)
+        """
+        individual_id = self._by_ticket.get(normalize_ticket(code))
+        return None if individual_id is None else self._by_id.get(individual_id)
+
+    def get_position(self, individual_id):
+        """
+        Returns the index of an individual in the list, or None.
+        :param individual_id: Unique ID of the individual
+        """
+        return self._positions.get(individual_id)
+
+    def get_group(self, reisegruppe):
+        """
+        Returns all individuals of a group.
+        :param reisegruppe: Name of the group
+        :return: List of individuals in that group
+        """
+        return list(self._by_group.get(reisegruppe, {}).values())
+
+    def get_groups(self):
+        """
+        Returns the names of all groups.
+        """
+        return list(self._by_group)
+
+    def get_present(self):
+        """
+        Returns all individuals marked as present.
+        """
+        return [self._by_id[ind_id] for ind_id in self._present_ids]
+
+    def get_evacuated(self):
+        """
+        Returns all individuals marked as evacuated.
+        """
+        return [self._by_id[ind_id] for ind_id in self._evacuated_ids]
 
     def load_data(self, filepath):
         """
@@ -34,7 +293,7 @@ class CheckInOutManager:
             print(f"Failed to load data from {filepath}. Please check the file format.")
             return
 
-        self.individuals = []  # Clear existing data
+        individuals = []
         for row in data:
             if len(row) >= 5:  # Ensure the row has enough columns
                 individual = Individual(
@@ -44,7 +303,80 @@ class CheckInOutManager:
                     alter=row[3],
                     geschlecht=row[4]
                 )
-                self.individuals.append(individual)
+                individuals.append(individual)
+        self.set_individuals(individuals)  # Replaces existing data
+
+    def set_presence_by_id(self, individual_id, anwesend):
+        """
+        Sets the presence status of an individual by their unique ID.
+        :param individual_id: Unique ID of the individual
+        :param anwesend: New presence status
+        :return: The updated individual, or None if the id is unknown
+        """
+        individual = self._by_id.get(individual_id)
+        if individual is None:
+            return None
+        if bool(individual.anwesend) != bool(anwesend):
+            self.aggregates.add_counts(self.table_type, individual.reisegruppe, anwesend=1 if anwesend else -1)
+        individual.anwesend = anwesend
+        if anwesend:
+            self._present_ids.add(individual_id)
+        else:
+            self._present_ids.discard(individual_id)
+        return individual
+
+    def set_evacuated_by_id(self, individual_id, evakuiert):
+        """
+        Sets the evacuation status of an individual by their unique ID.
+        :param individual_id: Unique ID of the individual
+        :param evakuiert: New evacuation status
+        :return: The updated individual, or None if the id is unknown
+        """
+        individual = self._by_id.get(individual_id)
+        if individual is None:
+            return None
+        if bool(individual.evakuiert) != bool(evakuiert):
+            self.aggregates.add_counts(self.table_type, individual.reisegruppe, evakuiert=1 if evakuiert else -1)
+        individual.evakuiert = evakuiert
+        if evakuiert:
+            self._evacuated_ids.add(individual_id)
+        else:
+            self._evacuated_ids.discard(individual_id)
+        return individual
+
+    def set_status_by_ids(self, individual_ids, anwesend=None, evakuiert=None):
+        """
+        Sets the presence and/or evacuation status of several individuals at once (e.g. a selection).
+        The rules of single clicks apply: leaving clears the evacuation status, and only present
+        individuals can be evacuated.
+        :param individual_ids: Iterable of ids
+        :param anwesend: New presence status, or None to leave it unchanged
+        :param evakuiert: New evacuation status, or None to leave it unchanged
+        :return: List of the individuals whose status actually changed
+        """
+        changed = []
+        for individual_id in individual_ids:
+            individual = self._by_id.get(individual_id)
+            if individual is None:
+                continue
+            before = (bool(individual.anwesend), bool(individual.evakuiert))
+            if anwesend is not None:
+                self.set_presence_by_id(individual_id, anwesend)
+                if not anwesend:
+                    self.set_evacuated_by_id(individual_id, False)
+            if evakuiert is not None and individual.anwesend:
+                self.set_evacuated_by_id(individual_id, evakuiert)
+            if (bool(individual.anwesend), bool(individual.evakuiert)) != before:
+                changed.append(individual)
+        return changed
+
+    def set_group_status(self, reisegruppe, anwesend=None, evakuiert=None):
+        """
+        Sets the presence and/or evacuation status of a whole group, see set_status_by_ids.
+        :param reisegruppe: Name of the group
+        :return: List of the individuals whose status actually changed
+        """
+        return self.set_status_by_ids(list(self._by_group.get(reisegruppe, {})), anwesend, evakuiert)
 
     def toggle_presence(self, index):
         """
@@ -52,7 +384,7 @@ class CheckInOutManager:
         :param index: Index of the individual in the list
         """
         if 0 <= index < len(self.individuals):
-            self.individuals[index].anwesend = not self.individuals[index].anwesend
+            self.toggle_presence_by_id(self.individuals[index].id)
 
     def toggle_evacuated(self, index):
         """
@@ -60,41 +392,47 @@ class CheckInOutManager:
         :param index: Index of the individual in the list
         """
         if 0 <= index < len(self.individuals):
-            self.individuals[index].evakuiert = not self.individuals[index].evakuiert
+            self.toggle_evacuated_by_id(self.individuals[index].id)
 
     def toggle_presence_by_id(self, individual_id):
         """
         Toggles the presence status of an individual by their unique ID.
         :param individual_id: Unique ID of the individual
         """
-        for individual in self.individuals:
-            if individual.id == individual_id:
-                individual.anwesend = not individual.anwesend
-                break
+        individual = self._by_id.get(individual_id)
+        if individual is not None:
+            self.set_presence_by_id(individual_id, not individual.anwesend)
 
     def toggle_evacuated_by_id(self, individual_id):
         """
         Toggles the evacuation status of an individual by their unique ID.
         :param individual_id: Unique ID of the individual
         """
-        for individual in self.individuals:
-            if individual.id == individual_id:
-                individual.evakuiert = not individual.evakuiert
-                break
+        individual = self._by_id.get(individual_id)
+        if individual is not None:
+            self.set_evacuated_by_id(individual_id, not individual.evakuiert)
 
     def get_present_count(self):
         """
         Returns the count of individuals marked as present.
         :return: Count of present individuals
         """
-        return sum(1 for individual in self.individuals if individual.anwesend)
+        return len(self._present_ids)
 
     def get_evacuated_count(self):
         """
         Returns the count of individuals marked as evacuated.
         :return: Count of evacuated individuals
         """
-        return sum(1 for individual in self.individuals if individual.evakuiert)
+        return len(self._evacuated_ids)
+
+    def get_group_counts(self, reisegruppe):
+        """
+        Returns the counts of a group across all managers sharing the aggregates.
+        :param reisegruppe: Name of the group
+        :return: Dict with 'gesamt', 'anwesend' and 'evakuiert'
+        """
+        return dict(self.aggregates.by_group.get(reisegruppe, StatusAggregates._empty()))
 
     def update_note(self, index, note):
         """
@@ -103,7 +441,7 @@ class CheckInOutManager:
         :param note: New note to be set
         """
         if 0 <= index < len(self.individuals):
-            self.individuals[index].notiz = note
+            self.update_note_by_id(self.individuals[index].id, note)
 
     def update_note_by_id(self, individual_id, note):
         """
@@ -111,25 +449,24 @@ class CheckInOutManager:
         :param individual_id: Unique ID of the individual
         :param note: New note to be set
         """
-        for individual in self.individuals:
-            if individual.id == individual_id:
-                individual.notiz = note
-                break
+        individual = self._by_id.get(individual_id)
+        if individual is not None:
+            individual.notiz = note
+            self.search_index.add(individual)
 
     def search(self, query, table=None):
         """
         Filters individuals based on a search query and optionally by table.
-        :param query: The search string (case-insensitive)
+        Uses the search index: case-insensitive, umlaut-aware (ä/ae, ß/ss) and tolerant of one typo per word.
+        :param query: The search string
         :param table: Optional table name to filter individuals (e.g., 'guest', 'staff')
-        :return: List of individuals matching the query and table
+        :return: List of individuals matching the query and table, in list order
         """
-        query = query.lower()
-        filtered = [
-            individual for individual in self.individuals
-            if query in individual.name.lower()
-            or query in individual.vorname.lower()
-            or query in individual.reisegruppe.lower()
-        ]
+        ids = self.search_index.search(query)
+        if ids is None:
+            filtered = list(self.individuals)
+        else:
+            filtered = sorted((self._by_id[ind_id] for ind_id in ids), key=lambda ind: self._positions[ind.id])
 
         if table:
             # Example logic for filtering by table (adjust as needed)
@@ -148,4 +485,13 @@ class CheckInOutManager:
         """
         if individuals is None:
             individuals = self.individuals
-        return sorted(individuals, key=lambda x: x.reisegruppe.lower())
\ No newline at end of file
+        return sorted(individuals, key=lambda x: x.reisegruppe.lower())
+
+    def sort_individuals(self, key, reverse=False):
+        """
+        Sorts the individuals list in place and keeps the position index in sync.
+        :param key: Sort key function taking an Individual
+        :param reverse: Sort descending if True
+        """
+        self.individuals.sort(key=key, reverse=reverse)
+        self._positions = {individual.id: position for position, individual in enumerate(self.individuals)}
\ No newline at end of file
@@ -0,0 +1,62 @@
+# change_stream.py
+# Push channel for desks in network mode.
+# Runs NetworkDB.subscribe_changes (Server-Sent Events from api_server's /events) in a background
+# thread and re-emits every change event as a Qt signal, which is delivered on the GUI thread.
+# When the stream drops it reports the disconnect, so the window can fall back to polling, and
+# reconnects with exponential backoff. Errors other than network and parse errors are logged
+# with their traceback before reconnecting, so bugs in handling an event do not go unnoticed.
+
+import logging
+import threading
+import requests
+from PyQt6 import QtCore
+
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+class ChangeStream(QtCore.QObject):
+    """
+    Subscribes to server change events.
+    :param db: NetworkDB instance
+    :param position: Callable returning (revision, last log id) the stream should resume from
+    """
+    change_received = QtCore.pyqtSignal(object)  # change dict, see NetworkDB.subscribe_changes
+    connection_changed = QtCore.pyqtSignal(bool)  # True when the stream is up, False when it dropped
+
+    def __init__(self, db, position, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.position = position
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # A daemon thread, so a stream blocked on the network never keeps the app from exiting
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='change-stream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _opened(self):
+        self._delay = RECONNECT_MIN_SECONDS
+        self.connection_changed.emit(True)
+
+    def _run(self):
+        self._delay = RECONNECT_MIN_SECONDS
+        while not self._stop.is_set():
+            since, log_after = self.position()
+            try:
+                self.db.subscribe_changes(since, log_after, self.change_received.emit, self._stop, on_open=self._opened)
+            except (requests.RequestException, ConnectionError, ValueError):
+                pass  # Dropped or garbled stream, reconnected below
+            except Exception:
+                logger.exception('Change stream failed, reconnecting')
+            if self._stop.is_set():
+                break
+            self.connection_changed.emit(False)
+            self._stop.wait(self._delay)
+            self._delay = min(self._delay * 2, RECONNECT_MAX_SECONDS)
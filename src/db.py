@@ -4,22 +4,145 @@
 # Functions include initializing the database, saving/loading individuals, logging events, and clearing all data.
 
 import sqlite3
+import contextlib
 import os
+import secrets
 import datetime
+import gzip
+import json
+import threading
+import time
 import requests
+import hlc
+import metrics
 
 # Path to the SQLite database file (quatiersliste.db in the same directory as this script)
-DB_PATH = os.path.join(os.path.dirname(__file__), 'quatiersliste.db')
+# CHECKIN_DB_PATH points it elsewhere, e.g. to a scratch database for benchmarks
+DB_PATH = os.environ.get('CHECKIN_DB_PATH') or os.path.join(os.path.dirname(__file__), 'quatiersliste.db')
 
-# Helper function to get a new database connection
+# Raised by writes that carry a version the row no longer has, i.e. somebody else changed it first
+# current: the row as it is now (backend.Individual), so the caller can show the winning state
+class VersionConflict(Exception):
+    def __init__(self, current):
+        super().__init__(f'Individual {current.id} was changed concurrently (now version {current.version})')
+        self.current = current
+
+# Every public call of both backends is timed, labelled with the backend and the function name
+# (once: public calls built on other public calls use their untimed implementation)
+# A VersionConflict is the answer to a stale write, not a failure, and is not counted as an error
+DB_CALL_SECONDS = metrics.REGISTRY.histogram('checkin_db_call_seconds', 'Duration of db backend calls',
+                                             ('backend', 'call'))
+DB_CALL_ERRORS = metrics.REGISTRY.counter('checkin_db_call_errors_total', 'db backend calls that raised',
+                                          ('backend', 'call'))
+_timed_sqlite = metrics.timed_calls(DB_CALL_SECONDS, DB_CALL_ERRORS, expected=VersionConflict, backend='sqlite')
+_timed_network = metrics.timed_calls(DB_CALL_SECONDS, DB_CALL_ERRORS, expected=VersionConflict, backend='network')
+
+# How long a connection waits for a lock held by another connection before failing
+BUSY_TIMEOUT_MS = 5000
+
+# Hands out one tuned connection per thread and keeps it for reuse
+# - The desk's GUI thread keeps its connection for the lifetime of the app
+# - Short-lived threads (e.g. Flask request threads) call release() when done, which parks
+#   the connection in a small idle pool for the next thread instead of closing it
+# Connections run in WAL mode, so API readers and writers no longer block each other
+class ConnectionManager:
+    def __init__(self, path, max_idle=8):
+        self.path = path
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # check_same_thread is off because a parked connection may be picked up by another
+        # thread; a connection is still only ever used by the one thread that holds it
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               cached_statements=256, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA synchronous=NORMAL')  # Safe with WAL, avoids an fsync per commit
+        conn.execute('PRAGMA cache_size=-16000')  # About 16 MB page cache per connection
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def release(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        self.release()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+_connections = ConnectionManager(DB_PATH)
+
+# Helper function to get the calling thread's database connection
+# The connection is reused across calls; `with get_connection() as conn` commits or rolls back
+# the transaction but leaves the connection open
+# Statements are written as constant SQL strings so sqlite3's statement cache can reuse them
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    return _connections.get()
+
+# Give the calling thread's connection back for reuse by other threads
+# Call this at the end of short-lived threads such as Flask requests
+def release_connection():
+    _connections.release()
+
+# All writes of this process go through one lock before they reach SQLite: one writer at a time,
+# while readers keep running concurrently thanks to WAL. Request threads of the API server then
+# queue up in order instead of competing for SQLite's write lock and failing after its busy
+# timeout. Writers in other processes are still coordinated by SQLite itself.
+_write_lock = threading.Lock()
+
+# Lock contention: time writers queue for the write lock, and writes SQLite still refused because
+# another process held its lock longer than the busy timeout
+WRITE_LOCK_WAIT_SECONDS = metrics.REGISTRY.histogram('checkin_db_write_lock_wait_seconds',
+                                                     'Time writes waited for the process-wide write lock')
+SQLITE_BUSY_ERRORS = metrics.REGISTRY.counter('checkin_db_sqlite_busy_total',
+                                              'Writes that failed with "database is locked"')
+
+# Like `with get_connection() as conn`, but holding the process-wide write lock
+@contextlib.contextmanager
+def _write_transaction():
+    start = time.perf_counter()
+    with _write_lock:
+        WRITE_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start)
+        try:
+            with get_connection() as conn:
+                yield conn
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e):
+                SQLITE_BUSY_ERRORS.inc()
+            raise
 
 # Initialize the database: create tables if they do not exist
 # - individuals: stores all person data for both tables (guests and team)
 # - log: stores all status change events with timestamp
+# - events: structured presence/evacuation changes per individual (see load_events)
+@_timed_sqlite
 def init_db():
-    with get_connection() as conn:
+    with _write_transaction() as conn:
         c = conn.cursor()
         c.execute('''CREATE TABLE IF NOT EXISTS individuals (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -31,7 +154,10 @@ def init_db():
             geschlecht TEXT,           -- Gender
             anwesend INTEGER,          -- 1 if present, 0 if not
             evakuiert INTEGER,         -- 1 if evacuated, 0 if not
-            notiz TEXT                 -- Notes
+            notiz TEXT,                -- Notes
+            rev INTEGER DEFAULT 0,     -- Revision of the last change to this row
+            version INTEGER DEFAULT 0, -- Incremented on every change to this row (optimistic concurrency)
+            ticket TEXT                -- Ticket code on the badge, unique
         )''')
         c.execute('''CREATE TABLE IF NOT EXISTS log (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -40,123 +166,1072 @@ def init_db():
             reisegruppe TEXT,          -- Group
             status TEXT                -- Status string (e.g. 'Gäste arrived')
         )''')
+        # Structured status events, written by the database itself with every status change
+        c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='events'")
+        new_events_table = c.fetchone() is None
+        c.execute('''CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,       -- When the change was made, milliseconds since 1970 (UTC)
+            individual_id INTEGER,     -- id of the individuals row (kept after the row is deleted)
+            table_type TEXT,           -- 'guest' or 'team'
+            reisegruppe TEXT,          -- Group of the individual at that time
+            event_type TEXT            -- One of EVENT_TYPES
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,      -- Setting name (e.g. 'revision')
+            value INTEGER              -- Setting value
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS deleted_individuals (
+            id INTEGER PRIMARY KEY,    -- id of the deleted individuals row
+            table_type TEXT,           -- 'guest' or 'team'
+            rev INTEGER                -- Revision in which the row was deleted
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,      -- Setting name (e.g. 'node_id')
+            value TEXT                 -- Setting value
+        )''')
+        # Replication (see replication.py): every replicated write, local or received from a peer
+        c.execute('''CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, -- Local order; peers pull by it
+            hlc TEXT UNIQUE,           -- Hybrid logical clock timestamp, includes the origin node
+            origin TEXT,               -- Node the change was made on
+            kind TEXT,                 -- 'insert', 'field' or 'log'
+            ticket TEXT,               -- Individual (insert, field)
+            table_type TEXT,           -- 'guest' or 'team' (insert)
+            field TEXT,                -- status ([anwesend, evakuiert]) or notiz (field)
+            value TEXT                 -- JSON: new field value, row (insert) or log entry (log)
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS field_clocks (
+            ticket TEXT,               -- Individual
+            field TEXT,                -- status or notiz
+            hlc TEXT,                  -- Timestamp of the change the field currently shows
+            PRIMARY KEY (ticket, field)
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS replication_peers (
+            peer TEXT PRIMARY KEY,     -- Base URL of the peer server
+            node_id TEXT,              -- The peer's node id, a new id restarts from the beginning
+            last_seq INTEGER           -- Last seq of the peer's changes applied here
+        )''')
+        # Databases created before revisions were tracked lack the rev column
+        columns = [row[1] for row in c.execute('PRAGMA table_info(individuals)')]
+        if 'rev' not in columns:
+            c.execute('ALTER TABLE individuals ADD COLUMN rev INTEGER DEFAULT 0')
+        if 'version' not in columns:
+            c.execute('ALTER TABLE individuals ADD COLUMN version INTEGER DEFAULT 0')
+        if 'ticket' not in columns:
+            c.execute('ALTER TABLE individuals ADD COLUMN ticket TEXT')
+        # Rows stored before tickets existed get a code, so every individual can be scanned
+        c.execute('SELECT id FROM individuals WHERE ticket IS NULL')
+        c.executemany('UPDATE individuals SET ticket=? WHERE id=?', [(_new_ticket(), row[0]) for row in c.fetchall()])
+        c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_individuals_ticket ON individuals (ticket)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_individuals_rev ON individuals (table_type, rev)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_deleted_rev ON deleted_individuals (table_type, rev)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_events_individual ON events (individual_id, ts)')
+        # Databases from before status events: individuals already present or evacuated get a baseline
+        # event stamped with the migration time, so their later departures are not counted from zero
+        if new_events_table:
+            c.execute('SELECT MIN(id), MAX(id) FROM individuals')
+            first_id, last_id = c.fetchone()
+            if first_id is not None:
+                _record_inserted_events(c, first_id, last_id)
+        c.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+        c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('node_id', ?)", (secrets.token_hex(4),))
+        conn.commit()
+
+# Increment the global revision counter inside the caller's transaction
+# Every write (individuals or log) bumps the revision, so clients can cheaply
+# detect whether anything changed since their last poll
+# Returns the new revision number
+def _bump_revision(c):
+    c.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+    c.execute("SELECT value FROM meta WHERE key = 'revision'")
+    return c.fetchone()[0]
+
+# Return the current global revision number
+@_timed_sqlite
+def get_revision():
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT value FROM meta WHERE key = 'revision'")
+        row = c.fetchone()
+        return row[0] if row else 0
+
+# Robust conversion for anwesend and evakuiert (stored as 0/1, but older rows may hold text)
+def _to_bool(val):
+    if isinstance(val, bool):
+        return val
+    if isinstance(val, int):
+        return val == 1
+    if isinstance(val, str):
+        return val.strip().lower() in ("1", "true", "yes")
+    return False
+
+# Generate a random ticket code for an individual imported without one
+# 10 characters from an alphabet without look-alikes (0/O, 1/I) give 50 bits, so codes do not collide
+# in practice and cannot be guessed from another badge
+_TICKET_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+_TICKET_LENGTH = 10
+
+def _new_ticket():
+    return ''.join(secrets.choice(_TICKET_ALPHABET) for _ in range(_TICKET_LENGTH))
+
+# Convert an individuals row (id, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, version, ticket)
+# into a backend.Individual carrying the persistent database id, row version and ticket code
+def _row_to_individual(row):
+    from backend import Individual
+    ind_id, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, version, ticket = row
+    ind = Individual(name, vorname, reisegruppe, age, geschlecht)
+    ind.id = ind_id
+    ind.anwesend = _to_bool(anwesend)
+    ind.evakuiert = _to_bool(evakuiert)
+    ind.notiz = notiz
+    ind.version = version or 0
+    ind.ticket = ticket
+    return ind
+
+# Insert new individuals for a given table_type in one transaction using executemany
+# Each individual's id is set to its new persistent row id
+# skip_taken: leave out individuals whose ticket code is already taken instead of raising
+# sqlite3.IntegrityError; their id stays None
+# Returns the individuals that were inserted
+@_timed_sqlite
+def add_individuals(table_type, individuals, skip_taken=False):
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        # Take the write lock up front so the AUTOINCREMENT ids handed out below are consecutive
+        c.execute('BEGIN IMMEDIATE')
+        rev = _bump_revision(c)
+        inserted = _insert_individuals(c, table_type, individuals, rev, skip_taken)
         conn.commit()
+        return inserted
+
+# Insert rows with executemany and assign the resulting ids (caller holds the write lock)
+# Individuals without a ticket code get a generated one; a code that is already taken raises
+# sqlite3.IntegrityError, or with skip_taken leaves the individual out (also a code repeated in the list)
+# Returns the individuals that were inserted
+def _insert_individuals(c, table_type, individuals, rev, skip_taken=False):
+    if skip_taken:
+        individuals = _without_taken_tickets(c, individuals)
+    if not individuals:
+        return individuals
+    for ind in individuals:
+        if not ind.ticket:
+            ind.ticket = _new_ticket()
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name='individuals'")
+    row = c.fetchone()
+    first_id = (row[0] if row else 0) + 1
+    c.executemany('''INSERT INTO individuals (table_type, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, rev, ticket)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  [(table_type, ind.name, ind.vorname, ind.reisegruppe, ind.alter, ind.geschlecht,
+                    int(ind.anwesend), int(ind.evakuiert), ind.notiz, rev, ind.ticket) for ind in individuals])
+    for offset, ind in enumerate(individuals):
+        ind.id = first_id + offset
+    _record_inserts(c, first_id, len(individuals))
+    _record_inserted_events(c, first_id, first_id + len(individuals) - 1)
+    return individuals
 
-# Save all individuals for a given table_type ('guest' or 'team')
-# Overwrites all previous entries for that table_type
+def _without_taken_tickets(c, individuals):
+    # The individuals whose ticket code is neither in the database nor on an earlier individual of the list
+    codes = [ind.ticket for ind in individuals if ind.ticket]
+    taken = set()
+    for start in range(0, len(codes), _ID_CHUNK_SIZE):
+        chunk = codes[start:start + _ID_CHUNK_SIZE]
+        c.execute(f'SELECT ticket FROM individuals WHERE ticket IN ({", ".join("?" * len(chunk))})', chunk)
+        taken.update(row[0] for row in c.fetchall())
+    kept = []
+    for ind in individuals:
+        if ind.ticket:
+            if ind.ticket in taken:
+                continue
+            taken.add(ind.ticket)
+        kept.append(ind)
+    return kept
+
+# Bulk import: insert chunks of new individuals for a table_type inside ONE transaction
+# chunks: iterable of lists of backend.Individual (e.g. a generator streaming a CSV file)
+# is_cancelled: optional callable checked between chunks; if it returns True everything is rolled back
+# Individuals whose ticket code is already taken (in the database or earlier in the import) are not
+# imported and are removed from their chunk, so the caller can count them
+# Returns True if the import was committed, False if it was cancelled
+@_timed_sqlite
+def import_individuals(table_type, chunks, is_cancelled=None):
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        rev = _bump_revision(c)
+        for chunk in chunks:
+            if is_cancelled is not None and is_cancelled():
+                conn.rollback()
+                return False
+            chunk[:] = _insert_individuals(c, table_type, chunk, rev, skip_taken=True)
+        conn.commit()
+        return True
+
+# Save all individuals for a given table_type ('guest' or 'team') in one transaction
+# Rows are matched by their persistent id: known ids are updated in place, new individuals
+# are inserted and rows missing from the list are deleted, so ids stay stable across saves
 # Each individual is an instance of backend.Individual
+@_timed_sqlite
 def save_individuals(table_type, individuals):
-    with get_connection() as conn:
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        rev = _bump_revision(c)
+        c.execute('SELECT id, anwesend, evakuiert FROM individuals WHERE table_type=?', (table_type,))
+        existing = {row[0]: row[1:] for row in c.fetchall()}
+        to_update = [ind for ind in individuals if ind.id in existing]
+        to_insert = [ind for ind in individuals if ind.id not in existing]
+        kept_ids = {ind.id for ind in to_update}
+        removed_ids = [(ind_id,) for ind_id in existing.keys() - kept_ids]
+        # Remember removed entries as deleted so delta pollers can drop them
+        c.executemany('INSERT OR REPLACE INTO deleted_individuals (id, table_type, rev) VALUES (?, ?, ?)',
+                      [(ind_id, table_type, rev) for (ind_id,) in removed_ids])
+        _record_events(c, [(ind_id, EVENT_REMOVED) for (ind_id,) in removed_ids])
+        c.executemany('DELETE FROM individuals WHERE id=?', removed_ids)
+        c.executemany('''UPDATE individuals SET name=?, vorname=?, reisegruppe=?, age=?, geschlecht=?, anwesend=?, evakuiert=?, notiz=?, rev=?,
+                         ticket=COALESCE(?, ticket), version=version+1 WHERE id=?''',
+                      [(ind.name, ind.vorname, ind.reisegruppe, ind.alter, ind.geschlecht,
+                        int(ind.anwesend), int(ind.evakuiert), ind.notiz, rev, ind.ticket, ind.id) for ind in to_update])
+        _record_events(c, [(ind.id, event_type) for ind in to_update
+                           for event_type in _status_events(*existing[ind.id], ind.anwesend, ind.evakuiert)])
+        _insert_individuals(c, table_type, to_insert, rev)
+        conn.commit()
+
+# Update the presence and/or evacuation status of a single individual by its persistent id
+# Fields passed as None are left unchanged
+# version: if given, the row is only changed while it still has this version, otherwise
+# VersionConflict is raised; without it the write always wins
+# Returns the row's new version (None if nothing was written)
+@_timed_sqlite
+def update_status(individual_id, anwesend=None, evakuiert=None, version=None):
+    return _patch(individual_id, {'anwesend': anwesend, 'evakuiert': evakuiert}, version)
+
+# Update the personal note of a single individual by its persistent id (version as for update_status)
+@_timed_sqlite
+def update_note(individual_id, note, version=None):
+    return _patch(individual_id, {'notiz': note}, version)
+
+# Change single fields (anwesend, evakuiert, notiz) of one individual in one UPDATE
+# fields: dict of field name -> new value, None values are left unchanged
+# version: expected row version, see update_status; a stale version raises VersionConflict
+# Returns the row's new version (None if nothing was written or the row no longer exists)
+@_timed_sqlite
+def patch_individual(individual_id, fields, version=None):
+    return _patch(individual_id, fields, version)
+
+def _patch(individual_id, fields, version):
+    if all(value is None for value in fields.values()):
+        return None
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        new_version = _patch_individual(c, _bump_revision(c), individual_id, fields, version)
+        if new_version is None:
+            current = _load_individual(c, individual_id)
+            if current is not None and version is not None:
+                # Leaving the with block rolls back the revision bump
+                raise VersionConflict(current)
+        conn.commit()
+        return new_version
+
+# Fields of an individual that can be written one by one
+_PATCHABLE_FIELDS = ('anwesend', 'evakuiert', 'notiz')
+
+def _patch_individual(c, rev, individual_id, fields, version):
+    values = {}
+    for field, value in fields.items():
+        if field not in _PATCHABLE_FIELDS:
+            raise ValueError(f'Field cannot be patched: {field!r}')
+        if value is not None:
+            values[field] = value if field == 'notiz' else int(value)
+    if not values:
+        return None
+    old_status = None
+    if 'anwesend' in values or 'evakuiert' in values:
+        c.execute('SELECT anwesend, evakuiert FROM individuals WHERE id=?', (individual_id,))
+        old_status = c.fetchone()
+    assignments = ', '.join(f'{field}=?' for field in values)
+    if version is None:
+        c.execute(f'UPDATE individuals SET {assignments}, rev=?, version=version+1 WHERE id=?',
+                  (*values.values(), rev, individual_id))
+    else:
+        c.execute(f'UPDATE individuals SET {assignments}, rev=?, version=version+1 WHERE id=? AND version=?',
+                  (*values.values(), rev, individual_id, version))
+    if c.rowcount == 0:
+        return None
+    c.execute('SELECT version, ticket, anwesend, evakuiert FROM individuals WHERE id=?', (individual_id,))
+    new_version, ticket, new_anwesend, new_evakuiert = c.fetchone()
+    changes = []
+    if 'notiz' in values:
+        changes.append(('field', ticket, None, 'notiz', values['notiz']))
+    if old_status is not None:
+        changes.append(('field', ticket, None, 'status', [new_anwesend, new_evakuiert]))
+        old_anwesend, old_evakuiert = old_status
+        _record_events(c, [(individual_id, event_type) for event_type in _status_events(
+            old_anwesend, old_evakuiert, new_anwesend, new_evakuiert)])
+    _record_changes(c, changes)
+    return new_version
+
+def _load_individual(c, individual_id):
+    c.execute('SELECT id, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, version, ticket FROM individuals WHERE id=?',
+              (individual_id,))
+    row = c.fetchone()
+    return _row_to_individual(row) if row else None
+
+# Set presence and/or evacuation of many individuals in ONE transaction (group or selection check-in)
+# Same rules as single changes: leaving (anwesend=False) also clears the evacuation status and only
+# present individuals are evacuated; rows are written without a version check
+# log_entry: optional (fullname, reisegruppe, status), written as ONE log record for the whole action
+# Returns {individual id: new version} for the affected rows
+@_timed_sqlite
+def set_status_bulk(individual_ids, anwesend=None, evakuiert=None, log_entry=None):
+    with _write_transaction() as conn:
         c = conn.cursor()
-        # Remove old entries for this table_type
-        c.execute('DELETE FROM individuals WHERE table_type=?', (table_type,))
-        # Insert all current individuals
-        for ind in individuals:
-            c.execute('''INSERT INTO individuals (table_type, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (table_type, ind.name, ind.vorname, ind.reisegruppe, ind.alter, ind.geschlecht, int(ind.anwesend), int(ind.evakuiert), ind.notiz))
+        rev = _bump_revision(c)
+        versions = _set_status_bulk(c, rev, individual_ids, anwesend, evakuiert)
+        if log_entry is not None:
+            _add_log_entry(c, *log_entry)
         conn.commit()
+        return versions
+
+# Like set_status_bulk for all individuals of one reisegruppe of a table_type
+@_timed_sqlite
+def set_group_status(table_type, reisegruppe, anwesend=None, evakuiert=None, log_entry=None):
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        rev = _bump_revision(c)
+        c.execute('SELECT id FROM individuals WHERE table_type=? AND reisegruppe=?', (table_type, reisegruppe))
+        versions = _set_status_bulk(c, rev, [row[0] for row in c.fetchall()], anwesend, evakuiert)
+        if log_entry is not None:
+            _add_log_entry(c, *log_entry)
+        conn.commit()
+        return versions
+
+# SQLite limits the number of ? parameters per statement, id lists are queried in chunks
+_ID_CHUNK_SIZE = 500
+
+def _set_status_bulk(c, rev, individual_ids, anwesend, evakuiert):
+    individual_ids = list(individual_ids)
+    if anwesend is not None and not anwesend:
+        evakuiert = False
+    values = {}
+    if anwesend is not None:
+        values['anwesend'] = int(anwesend)
+    if evakuiert is not None:
+        values['evakuiert'] = int(evakuiert)
+    if not values or not individual_ids:
+        return {}
+    assignments = ', '.join(f'{field}=?' for field in values)
+    # The status before the change, for the events of the rows that are written
+    old_status = {}
+    for start in range(0, len(individual_ids), _ID_CHUNK_SIZE):
+        chunk = individual_ids[start:start + _ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        c.execute(f'SELECT id, anwesend, evakuiert FROM individuals WHERE id IN ({placeholders})', chunk)
+        old_status.update((row[0], row[1:]) for row in c.fetchall())
+    # Evacuating without checking in at the same time only applies to present individuals
+    condition = ' AND anwesend=1' if evakuiert and anwesend is None else ''
+    c.executemany(f'UPDATE individuals SET {assignments}, rev=?, version=version+1 WHERE id=?{condition}',
+                  [(*values.values(), rev, individual_id) for individual_id in individual_ids])
+    versions = {}
+    changes = []
+    events = []
+    for start in range(0, len(individual_ids), _ID_CHUNK_SIZE):
+        chunk = individual_ids[start:start + _ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        # Only the rows this UPDATE wrote: with the same condition, as a row written by an earlier
+        # operation of the same batch also carries this rev
+        c.execute(f'''SELECT id, version, ticket, anwesend, evakuiert FROM individuals
+                      WHERE rev=? AND id IN ({placeholders}){condition}''', (rev, *chunk))
+        for individual_id, version, ticket, new_anwesend, new_evakuiert in c.fetchall():
+            versions[individual_id] = version
+            changes.append(('field', ticket, None, 'status', [new_anwesend, new_evakuiert]))
+            old_anwesend, old_evakuiert = old_status[individual_id]
+            events.extend((individual_id, event_type) for event_type in _status_events(
+                old_anwesend, old_evakuiert, new_anwesend, new_evakuiert))
+    _record_changes(c, changes)
+    _record_events(c, events)
+    return versions
+
+# Apply several writes in ONE transaction with a single revision bump
+# Used for operations that belong together, e.g. a status change and its log entry, and by the
+# API server's /batch endpoint so a desk needs one round trip for them
+# operations: list of dicts, one per write, applied in order:
+# - {'op': 'update_status', 'id': N, 'anwesend': bool or None, 'evakuiert': bool or None, 'version': N or None}
+# - {'op': 'update_note', 'id': N, 'notiz': str, 'version': N or None}
+# - {'op': 'update_status_bulk', 'ids': [N, ...], 'anwesend': bool or None, 'evakuiert': bool or None}
+# - {'op': 'add_log_entry', 'fullname': str, 'reisegruppe': str, 'status': str}
+# A write whose version is stale is skipped, the others are still applied
+# Writes to the same individual within one batch were made on the same view of it: a later write
+# carrying the version from before the batch is checked against that, and then applied on top of
+# the earlier write of the batch (which bumped the row's version); if the earlier write was
+# skipped as stale, so is the later one
+# Returns (new version per written individual id, current rows of the skipped individuals)
+# Raises ValueError for an unknown op; nothing is written in that case
+@_timed_sqlite
+def apply_batch(operations):
+    versions = {}
+    conflicts = {}
+    base_versions = {}  # individual id -> version before the first write of this batch to it
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        rev = _bump_revision(c)
+        for operation in operations:
+            op = operation.get('op')
+            if op == 'update_status':
+                fields = {'anwesend': operation.get('anwesend'), 'evakuiert': operation.get('evakuiert')}
+            elif op == 'update_note':
+                fields = {'notiz': operation['notiz']}
+            elif op == 'add_log_entry':
+                _add_log_entry(c, operation['fullname'], operation['reisegruppe'], operation['status'])
+                continue
+            elif op == 'update_status_bulk':
+                written = _set_status_bulk(c, rev, operation['ids'], operation.get('anwesend'), operation.get('evakuiert'))
+                for individual_id, new_version in written.items():
+                    base_versions.setdefault(individual_id, new_version - 1)
+                versions.update(written)
+                continue
+            else:
+                raise ValueError(f'Unknown batch operation: {op!r}')
+            if all(value is None for value in fields.values()):
+                continue
+            individual_id = operation['id']
+            version = operation.get('version')
+            if version is not None and individual_id in versions and version == base_versions[individual_id]:
+                version = versions[individual_id]
+            new_version = _patch_individual(c, rev, individual_id, fields, version)
+            if new_version is not None:
+                base_versions.setdefault(individual_id, new_version - 1 if version is None else version)
+                versions[individual_id] = new_version
+            elif version is not None:
+                current = _load_individual(c, individual_id)
+                if current is not None:
+                    conflicts[individual_id] = current
+        conn.commit()
+    return versions, list(conflicts.values())
 
 # Load all individuals for a given table_type ('guest' or 'team')
 # Returns a list of backend.Individual objects
+@_timed_sqlite
 def load_individuals(table_type):
     with get_connection() as conn:
         c = conn.cursor()
-        c.execute('SELECT name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz FROM individuals WHERE table_type=?', (table_type,))
-        rows = c.fetchall()
-        from backend import Individual
-        individuals = []
-        for row in rows:
-            ind = Individual(row[0], row[1], row[2], row[3], row[4])
-            # Robust conversion for anwesend and evakuiert
-            def to_bool(val):
-                if isinstance(val, bool):
-                    return val
-                if isinstance(val, int):
-                    return val == 1
-                if isinstance(val, str):
-                    return val.strip().lower() in ("1", "true", "yes")
-                return False
-            ind.anwesend = to_bool(row[5])
-            ind.evakuiert = to_bool(row[6])
-            ind.notiz = row[7]
-            individuals.append(ind)
-        return individuals
+        c.execute('SELECT id, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, version, ticket FROM individuals WHERE table_type=? ORDER BY id', (table_type,))
+        return [_row_to_individual(row) for row in c.fetchall()]
+
+# Look up an individual by ticket code (uses the unique ticket index)
+# Returns (table_type, backend.Individual), or None for an unknown code
+@_timed_sqlite
+def find_by_ticket(code):
+    from backend import normalize_ticket
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('''SELECT table_type, id, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, version, ticket
+                     FROM individuals WHERE ticket=?''', (normalize_ticket(code),))
+        row = c.fetchone()
+        return (row[0], _row_to_individual(row[1:])) if row else None
+
+# Load only the individuals of a table_type that changed after revision since_rev
+# Returns (revision, changed individuals, ids of deleted individuals)
+# The revision is read first, so a concurrent write is reported again on the next poll rather than lost
+@_timed_sqlite
+def load_changes(table_type, since_rev):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT value FROM meta WHERE key = 'revision'")
+        revision = c.fetchone()[0]
+        c.execute('SELECT id, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, version, ticket FROM individuals WHERE table_type=? AND rev>?',
+                  (table_type, since_rev))
+        changed = [_row_to_individual(row) for row in c.fetchall()]
+        c.execute('SELECT id FROM deleted_individuals WHERE table_type=? AND rev>?', (table_type, since_rev))
+        deleted_ids = [row[0] for row in c.fetchall()]
+        return revision, changed, deleted_ids
 
 # Add a new log entry for a status change
 # fullname: string (e.g. 'Gäste arrived'), reisegruppe: group, status: status string
 # Timestamp is generated automatically
+@_timed_sqlite
 def add_log_entry(fullname, reisegruppe, status):
-    with get_connection() as conn:
+    with _write_transaction() as conn:
         c = conn.cursor()
-        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
-        c.execute('INSERT INTO log (timestamp, fullname, reisegruppe, status) VALUES (?, ?, ?, ?)',
-                  (now, fullname, reisegruppe, status))
+        _bump_revision(c)
+        _add_log_entry(c, fullname, reisegruppe, status)
         conn.commit()
 
-# Load all log entries, ordered by insertion (oldest first)
-# Returns a list of (timestamp, fullname, reisegruppe, status) tuples
-def load_log():
+def _add_log_entry(c, fullname, reisegruppe, status):
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+    c.execute('INSERT INTO log (timestamp, fullname, reisegruppe, status) VALUES (?, ?, ?, ?)',
+              (now, fullname, reisegruppe, status))
+    _record_changes(c, [('log', None, None, None, [now, fullname, reisegruppe, status])])
+
+# Load log entries, ordered by insertion (oldest first)
+# - after_id: only entries newer than this id (tailing), the oldest `limit` of them
+# - before_id: only entries older than this id (paging back), the newest `limit` of them
+# - neither: the newest `limit` entries, or the whole log if no limit is given
+# Returns a list of (id, timestamp, fullname, reisegruppe, status) tuples
+@_timed_sqlite
+def load_log(after_id=None, before_id=None, limit=None):
     with get_connection() as conn:
         c = conn.cursor()
-        c.execute('SELECT timestamp, fullname, reisegruppe, status FROM log ORDER BY id ASC')
-        return c.fetchall()
+        limit = -1 if limit is None else limit  # SQLite treats a negative LIMIT as unlimited
+        if after_id is not None:
+            c.execute('SELECT id, timestamp, fullname, reisegruppe, status FROM log WHERE id>? ORDER BY id ASC LIMIT ?',
+                      (after_id, limit))
+            return c.fetchall()
+        if before_id is not None:
+            c.execute('SELECT id, timestamp, fullname, reisegruppe, status FROM log WHERE id<? ORDER BY id DESC LIMIT ?',
+                      (before_id, limit))
+        else:
+            c.execute('SELECT id, timestamp, fullname, reisegruppe, status FROM log ORDER BY id DESC LIMIT ?', (limit,))
+        return c.fetchall()[::-1]
 
-# Clear all data from both tables (individuals and log)
-def clear_all():
+# Count individuals, present and evacuated per table_type and reisegruppe with one GROUP BY query
+# Returns a backend.StatusAggregates with overall, per-group and per-table_type totals
+@_timed_sqlite
+def load_stats():
+    from backend import StatusAggregates
+    aggregates = StatusAggregates()
     with get_connection() as conn:
         c = conn.cursor()
+        c.execute('''SELECT table_type, reisegruppe, COUNT(*), SUM(anwesend), SUM(evakuiert)
+                     FROM individuals GROUP BY table_type, reisegruppe''')
+        for table_type, reisegruppe, gesamt, anwesend, evakuiert in c.fetchall():
+            aggregates.add_counts(table_type, reisegruppe, gesamt, anwesend or 0, evakuiert or 0)
+    return aggregates
+
+# Clear all data: individuals, the log and the status events
+@_timed_sqlite
+def clear_all():
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        rev = _bump_revision(c)
+        c.execute('INSERT OR REPLACE INTO deleted_individuals (id, table_type, rev) SELECT id, table_type, ? FROM individuals', (rev,))
         c.execute('DELETE FROM individuals')
         c.execute('DELETE FROM log')
+        c.execute('DELETE FROM events')
         conn.commit()
 
+# --- Status events ---
+# Every change of presence or evacuation is recorded in the events table, one row per individual
+# and transition, in the same transaction as the change itself. Unlike the free-text log they are
+# written by the database rather than the desk, carry the individual's id and a millisecond
+# timestamp, and are indexed by time and by individual: a person's history and all events of a
+# time window are index range scans
+
+EVENT_ARRIVED = 'arrived'
+EVENT_LEFT = 'left'
+EVENT_EVACUATED = 'evacuated'
+EVENT_EVACUATION_CLEARED = 'evacuation_cleared'
+EVENT_REMOVED = 'removed'  # The individual was deleted from the list (counts as no longer on site)
+EVENT_TYPES = (EVENT_ARRIVED, EVENT_LEFT, EVENT_EVACUATED, EVENT_EVACUATION_CLEARED, EVENT_REMOVED)
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+# Event types for a status change from (old_anwesend, old_evakuiert) to (new_anwesend, new_evakuiert)
+def _status_events(old_anwesend, old_evakuiert, new_anwesend, new_evakuiert):
+    events = []
+    if bool(new_anwesend) and not old_anwesend:
+        events.append(EVENT_ARRIVED)
+    if bool(new_evakuiert) != bool(old_evakuiert):
+        events.append(EVENT_EVACUATED if new_evakuiert else EVENT_EVACUATION_CLEARED)
+    if not new_anwesend and bool(old_anwesend):
+        events.append(EVENT_LEFT)
+    return events
+
+# Record events inside the caller's write transaction, before a removed row is deleted
+# events: list of (individual id, event type); table_type and reisegruppe are taken from the row
+# ts: time in epoch milliseconds, now unless given (e.g. the time of a change made on a peer)
+def _record_events(c, events, ts=None):
+    if not events:
+        return
+    ts = _now_ms() if ts is None else ts
+    c.executemany('''INSERT INTO events (ts, individual_id, table_type, reisegruppe, event_type)
+                     SELECT ?, id, table_type, reisegruppe, ? FROM individuals WHERE id=?''',
+                  [(ts, event_type, individual_id) for individual_id, event_type in events])
+
+# Record the events of rows inserted with ids first_id to last_id that are already present or evacuated
+def _record_inserted_events(c, first_id, last_id, ts=None):
+    ts = _now_ms() if ts is None else ts
+    for flag, event_type in (('anwesend', EVENT_ARRIVED), ('evakuiert', EVENT_EVACUATED)):
+        c.execute(f'''INSERT INTO events (ts, individual_id, table_type, reisegruppe, event_type)
+                      SELECT ?, id, table_type, reisegruppe, ? FROM individuals WHERE id BETWEEN ? AND ? AND {flag}=1''',
+                  (ts, event_type, first_id, last_id))
+
+# Load status events, ordered by time (oldest first)
+# - individual_id: only the events of this individual (also those from before it was removed)
+# - start, end: only events with start <= ts < end, in epoch milliseconds; either may be None
+# - table_type: only events of 'guest' or 'team'
+# - limit: only the newest `limit` matching events
+# - after_id: instead ordered by id, only events recorded after this id and the oldest `limit` of
+#   them (reading new events incrementally; events received from peers may have older times)
+# Returns a list of (id, ts, individual_id, table_type, reisegruppe, event_type) tuples
+@_timed_sqlite
+def load_events(individual_id=None, start=None, end=None, table_type=None, limit=None, after_id=None):
+    conditions = []
+    params = []
+    for condition, value in (('individual_id=?', individual_id), ('ts>=?', start), ('ts<?', end),
+                             ('table_type=?', table_type), ('id>?', after_id)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    limit = -1 if limit is None else limit
+    with get_connection() as conn:
+        c = conn.cursor()
+        if after_id is not None:
+            c.execute(f'SELECT id, ts, individual_id, table_type, reisegruppe, event_type FROM events {where} ORDER BY id LIMIT ?',
+                      (*params, limit))
+            return c.fetchall()
+        c.execute(f'''SELECT id, ts, individual_id, table_type, reisegruppe, event_type FROM events {where}
+                      ORDER BY ts DESC, id DESC LIMIT ?''', (*params, limit))
+        return c.fetchall()[::-1]
+
+# Presence and evacuation over time, overall, per reisegruppe and per table_type (see timeline.py)
+# start, end: first and last point in epoch milliseconds (default: first event up to now)
+# step: milliseconds between points, a multiple of a minute (default: chosen from the range)
+# Returns a dict with 'times' and the series under 'total', 'by_group' and 'by_table'
+@_timed_sqlite
+def load_timeline(start=None, end=None, step=None):
+    import timeline
+    return timeline.shared().series(start, end, step)
+
+# --- Replication between servers (see replication.py) ---
+# Replicated writes (new individuals, status and note changes, log entries) are recorded in the
+# changes table, stamped with a hybrid logical clock timestamp (hlc.py). Peers pull them in order of
+# seq and apply them with last-writer-wins per field: a field only takes a change newer than the one
+# it shows, so every server ends up with the same values whatever order changes arrive in.
+# Individuals are matched across servers by ticket code. Overwrites of existing rows
+# (save_individuals) and clear_all are not replicated, they stay local administration
+
+_node_id = None  # Cached node id of this database
+
+def _local_node_id(c):
+    global _node_id
+    if _node_id is None:
+        c.execute("SELECT value FROM settings WHERE key='node_id'")
+        _node_id = c.fetchone()[0]
+    return _node_id
+
+# Return the node id of this database (random unless set with set_node_id)
+def get_node_id():
+    with get_connection() as conn:
+        return _local_node_id(conn.cursor())
+
+# Give this database a readable node id, e.g. the venue; applies to changes made from now on
+def set_node_id(node_id):
+    global _node_id
+    with _write_transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('node_id', ?)", (node_id,))
+        conn.commit()
+    _node_id = node_id
+
+# Record local changes inside the caller's write transaction
+# entries: list of (kind, ticket, table_type, field, value), see the changes table
+# The timestamps continue from the newest change seen, local or from a peer, as the clock requires
+def _record_changes(c, entries):
+    if not entries:
+        return
+    node_id = _local_node_id(c)
+    c.execute('SELECT MAX(hlc) FROM changes')
+    stamps = hlc.next_timestamps(c.fetchone()[0], node_id, len(entries))
+    c.executemany('INSERT INTO changes (hlc, origin, kind, ticket, table_type, field, value) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                  [(stamp, node_id, kind, ticket, table_type, field, json.dumps(value))
+                   for stamp, (kind, ticket, table_type, field, value) in zip(stamps, entries)])
+    # Local changes are the newest this node knows of, so they always take the field
+    c.executemany('INSERT OR REPLACE INTO field_clocks (ticket, field, hlc) VALUES (?, ?, ?)',
+                  [(ticket, field, stamp) for stamp, (kind, ticket, _, field, _) in zip(stamps, entries)
+                   if kind == 'field'])
+
+# Record 'insert' changes for the count individuals just inserted from id first_id on
+# Done in SQL, as building the JSON rows in Python would triple the time of large imports;
+# the timestamps are the ones hlc.next_timestamps would give, consecutive counters from the first
+def _record_inserts(c, first_id, count):
+    node_id = _local_node_id(c)
+    c.execute('SELECT MAX(hlc) FROM changes')
+    wall, counter, _ = hlc.parse_timestamp(hlc.next_timestamps(c.fetchone()[0], node_id)[0])
+    c.execute(f'''INSERT INTO changes (hlc, origin, kind, ticket, table_type, field, value)
+                  SELECT printf('%0{hlc.WALL_DIGITS}d.%0{hlc.COUNTER_DIGITS}d.%s', ?, ? + id - ?, ?), ?, 'insert', ticket, table_type, NULL,
+                         json_object('name', name, 'vorname', vorname, 'reisegruppe', reisegruppe, 'alter', age,
+                                     'geschlecht', geschlecht, 'anwesend', anwesend, 'evakuiert', evakuiert, 'notiz', notiz)
+                  FROM individuals WHERE id BETWEEN ? AND ? ORDER BY id''',
+              (wall, counter, first_id, node_id, node_id, first_id, first_id + count - 1))
+
+# Load up to limit changes after seq after_seq, for a peer pulling them
+# exclude_origin: leave out changes made on that node (the peer's own changes coming back)
+# Returns (last seq looked at, list of change dicts); the peer continues after the returned seq
+@_timed_sqlite
+def load_replication_changes(after_seq, limit, exclude_origin=None):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT seq, hlc, origin, kind, ticket, table_type, field, value FROM changes WHERE seq>? ORDER BY seq LIMIT ?',
+                  (after_seq, limit))
+        rows = c.fetchall()
+    changes = [{'hlc': stamp, 'origin': origin, 'kind': kind, 'ticket': ticket, 'table_type': table_type,
+                'field': field, 'value': json.loads(value)}
+               for _, stamp, origin, kind, ticket, table_type, field, value in rows if origin != exclude_origin]
+    return (rows[-1][0] if rows else after_seq), changes
+
+# Apply changes pulled from a peer in ONE transaction and remember how far they went
+# Changes applied before (e.g. received through another peer) are recognised by their timestamp
+# Returns the number of changes that were new here
+@_timed_sqlite
+def apply_replication_changes(peer, peer_node_id, changes, last_seq):
+    applied = 0
+    with _write_transaction() as conn:
+        c = conn.cursor()
+        rev = None
+        for change in changes:
+            c.execute('INSERT OR IGNORE INTO changes (hlc, origin, kind, ticket, table_type, field, value) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      (change['hlc'], change['origin'], change['kind'], change['ticket'], change['table_type'],
+                       change['field'], json.dumps(change['value'])))
+            if c.rowcount == 0:
+                continue
+            if rev is None:
+                rev = _bump_revision(c)
+            _apply_change(c, rev, change)
+            applied += 1
+        c.execute('INSERT OR REPLACE INTO replication_peers (peer, node_id, last_seq) VALUES (?, ?, ?)',
+                  (peer, peer_node_id, last_seq))
+        conn.commit()
+    return applied
+
+# Fields replicated with their own clock; anwesend and evakuiert replicate together as 'status',
+# so the winning change sets both and a person can never end up with a mix of two sites' changes
+# (e.g. evacuated but not present)
+_REPLICATED_FIELDS = ('status', 'notiz')
+
+def _apply_change(c, rev, change):
+    kind, ticket, value = change['kind'], change['ticket'], change['value']
+    if kind == 'field':
+        field = change['field']
+        if field not in _REPLICATED_FIELDS:
+            return
+        c.execute('SELECT hlc FROM field_clocks WHERE ticket=? AND field=?', (ticket, field))
+        row = c.fetchone()
+        if row is not None and row[0] >= change['hlc']:
+            return  # The field already shows a newer change
+        if field == 'notiz':
+            c.execute('UPDATE individuals SET notiz=?, rev=?, version=version+1 WHERE ticket=?', (value, rev, ticket))
+        else:
+            new_anwesend, new_evakuiert = (int(flag) for flag in value)
+            c.execute('SELECT id, anwesend, evakuiert FROM individuals WHERE ticket=?', (ticket,))
+            old = c.fetchone()
+            c.execute('UPDATE individuals SET anwesend=?, evakuiert=?, rev=?, version=version+1 WHERE ticket=?',
+                      (new_anwesend, new_evakuiert, rev, ticket))
+            if old is not None:
+                # The event gets the time the change was made on its origin node
+                individual_id, old_anwesend, old_evakuiert = old
+                _record_events(c, [(individual_id, event_type) for event_type in _status_events(
+                    old_anwesend, old_evakuiert, new_anwesend, new_evakuiert)],
+                    hlc.parse_timestamp(change['hlc'])[0])
+        c.execute('INSERT OR REPLACE INTO field_clocks (ticket, field, hlc) VALUES (?, ?, ?)',
+                  (ticket, field, change['hlc']))
+    elif kind == 'insert':
+        c.execute('SELECT 1 FROM individuals WHERE ticket=?', (ticket,))
+        if c.fetchone() is None:
+            c.execute('INSERT INTO individuals (table_type, name, vorname, reisegruppe, age, geschlecht, anwesend, evakuiert, notiz, rev, ticket) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                      (change['table_type'], value['name'], value['vorname'], value['reisegruppe'], value['alter'],
+                       value['geschlecht'], int(value['anwesend']), int(value['evakuiert']), value['notiz'], rev, ticket))
+            _record_inserted_events(c, c.lastrowid, c.lastrowid, hlc.parse_timestamp(change['hlc'])[0])
+    elif kind == 'log':
+        c.execute('INSERT INTO log (timestamp, fullname, reisegruppe, status) VALUES (?, ?, ?, ?)', tuple(value))
+
+# Return (node id, last seq) of what was applied from a peer, or (None, 0) for a new peer
+@_timed_sqlite
+def get_replication_cursor(peer):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT node_id, last_seq FROM replication_peers WHERE peer=?', (peer,))
+        row = c.fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+# Return this node's id, its newest change seq and how far each peer has been pulled
+@_timed_sqlite
+def load_replication_status():
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT MAX(seq) FROM changes')
+        last_seq = c.fetchone()[0] or 0
+        c.execute('SELECT peer, node_id, last_seq FROM replication_peers ORDER BY peer')
+        peers = [{'peer': peer, 'node_id': node_id, 'last_seq': seq} for peer, node_id, seq in c.fetchall()]
+        return {'node_id': _local_node_id(c), 'last_seq': last_seq, 'peers': peers}
+
 # --- Networked DB backend for local testing ---
+# Request bodies at least this large are sent gzip-compressed
+GZIP_MIN_BYTES = 1024
+# (connect, read) timeout in seconds for regular requests
+REQUEST_TIMEOUT = (5, 30)
+# GET responses remembered with their ETag for conditional requests
+ETAG_CACHE_ENTRIES = 64
+
+# All requests go through one requests.Session, so TCP connections to the API server are kept
+# alive and reused instead of being opened per call; responses are gzip-decoded transparently
+# The session is shared by the GUI thread, the change stream and import workers, hence a pool
+# with room for each of them
 class NetworkDB:
     def __init__(self, base_url='http://127.0.0.1:5000'):
         self.base_url = base_url
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._etag_cache = {}  # (path, params) -> (etag, decoded JSON)
 
+    def _request(self, method, path, payload=None, headers=None, **kwargs):
+        # Send one request and raise for HTTP errors; a JSON payload is gzipped when large
+        headers = dict(headers or {})
+        data = None
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+            if len(data) >= GZIP_MIN_BYTES:
+                data = gzip.compress(data, compresslevel=5)
+                headers['Content-Encoding'] = 'gzip'
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        resp = self.session.request(method, f'{self.base_url}{path}', data=data, headers=headers, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    def _get_json(self, path, params=None):
+        # Conditional GET: the last answer per path and query is kept with its ETag, so asking
+        # for an unchanged resource again costs a 304 without body
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self._etag_cache.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        resp = self._request('GET', path, params=params, headers=headers)
+        if resp.status_code == 304 and cached:
+            return cached[1]
+        data = resp.json()
+        etag = resp.headers.get('ETag')
+        if etag:
+            if len(self._etag_cache) >= ETAG_CACHE_ENTRIES:
+                self._etag_cache.clear()
+            self._etag_cache[key] = (etag, data)
+        return data
+
+    def _to_dict(self, ind):
+        return {
+            'id': ind.id,
+            'name': ind.name,
+            'vorname': ind.vorname,
+            'reisegruppe': ind.reisegruppe,
+            'alter': ind.alter,
+            'geschlecht': ind.geschlecht,
+            'anwesend': ind.anwesend,
+            'evakuiert': ind.evakuiert,
+            'notiz': ind.notiz,
+            'version': ind.version,
+            'ticket': ind.ticket
+        }
+
+    @_timed_network
     def save_individuals(self, table_type, individuals):
-        data = [
-            {
-                'name': ind.name,
-                'vorname': ind.vorname,
-                'reisegruppe': ind.reisegruppe,
-                'alter': ind.alter,
-                'geschlecht': ind.geschlecht,
-                'anwesend': ind.anwesend,
-                'evakuiert': ind.evakuiert,
-                'notiz': ind.notiz
-            } for ind in individuals
-        ]
-        requests.post(f'{self.base_url}/individuals/{table_type}', json=data)
+        data = [self._to_dict(ind) for ind in individuals]
+        resp = self._request('POST', f'/individuals/{table_type}', data)
+        # The server answers with the row ids and ticket codes, in the order they were sent
+        result = resp.json()
+        for ind, new_id, ticket in zip(individuals, result['ids'], result['tickets']):
+            ind.id = new_id
+            ind.ticket = ticket
 
-    def load_individuals(self, table_type):
+    @_timed_network
+    def add_individuals(self, table_type, individuals, skip_taken=False):
+        return self._add(table_type, individuals, skip_taken)
+
+    def _add(self, table_type, individuals, skip_taken=False):
+        # Individuals left out for a taken ticket code come back with id None
+        data = [self._to_dict(ind) for ind in individuals]
+        params = {'skip_taken': 1} if skip_taken else None
+        resp = self._request('POST', f'/individuals/{table_type}/add', data, params=params)
+        result = resp.json()
+        for ind, new_id, ticket in zip(individuals, result['ids'], result['tickets']):
+            ind.id = new_id
+            ind.ticket = ticket
+        return [ind for ind in individuals if ind.id is not None]
+
+    @_timed_network
+    def import_individuals(self, table_type, chunks, is_cancelled=None):
+        # Each chunk is one request; a cancelled import keeps the chunks that were already sent
+        for chunk in chunks:
+            if is_cancelled is not None and is_cancelled():
+                return False
+            chunk[:] = self._add(table_type, chunk, skip_taken=True)
+        return True
+
+    def release_connection(self):
+        # Nothing to release, kept for interface parity with the SQLite module
+        pass
+
+    @_timed_network
+    def update_status(self, individual_id, anwesend=None, evakuiert=None, version=None):
+        return self._patch(individual_id, {'anwesend': anwesend, 'evakuiert': evakuiert}, version)
+
+    @_timed_network
+    def update_note(self, individual_id, note, version=None):
+        return self._patch(individual_id, {'notiz': note}, version)
+
+    @_timed_network
+    def patch_individual(self, individual_id, fields, version=None):
+        return self._patch(individual_id, fields, version)
+
+    def _patch(self, individual_id, fields, version):
+        # PATCH only the given fields; with a version the server answers 409 plus the current
+        # row if somebody else changed it first, which is raised as VersionConflict
+        data = {field: value for field, value in fields.items() if value is not None}
+        if not data:
+            return None
+        if version is not None:
+            data['version'] = version
+        try:
+            resp = self._request('PATCH', f'/individuals/{individual_id}', data)
+        except requests.HTTPError as e:
+            if e.response.status_code == 409:
+                raise VersionConflict(self._to_individual(e.response.json())) from e
+            if e.response.status_code == 404:
+                return None  # No such individual, as with the local backend
+            raise
+        return resp.json()['version']
+
+    @_timed_network
+    def set_status_bulk(self, individual_ids, anwesend=None, evakuiert=None, log_entry=None):
+        return self._post_status_bulk({'ids': list(individual_ids)}, anwesend, evakuiert, log_entry)
+
+    @_timed_network
+    def set_group_status(self, table_type, reisegruppe, anwesend=None, evakuiert=None, log_entry=None):
+        return self._post_status_bulk({'table_type': table_type, 'reisegruppe': reisegruppe}, anwesend, evakuiert, log_entry)
+
+    def _post_status_bulk(self, data, anwesend, evakuiert, log_entry):
+        # One POST /status/bulk for a whole group or selection, returns {id: new version}
+        data.update({'anwesend': anwesend, 'evakuiert': evakuiert})
+        if log_entry is not None:
+            data['log'] = dict(zip(('fullname', 'reisegruppe', 'status'), log_entry))
+        resp = self._request('POST', '/status/bulk', data)
+        return {d['id']: d['version'] for d in resp.json()['versions']}
+
+    @_timed_network
+    def apply_batch(self, operations):
+        # All operations in one POST /batch, applied by the server in one transaction
+        # Returns (new version per individual id, current rows of individuals with stale versions)
+        data = self._request('POST', '/batch', {'operations': operations}).json()
+        versions = {d['id']: d['version'] for d in data['versions']}
+        return versions, [self._to_individual(d) for d in data['conflicts']]
+
+    def _to_individual(self, d):
         from backend import Individual
-        resp = requests.get(f'{self.base_url}/individuals/{table_type}')
-        resp.raise_for_status()
-        individuals = []
-        for d in resp.json():
-            ind = Individual(d['name'], d['vorname'], d['reisegruppe'], d['alter'], d['geschlecht'])
-            ind.anwesend = d['anwesend']
-            ind.evakuiert = d['evakuiert']
-            ind.notiz = d['notiz']
-            individuals.append(ind)
-        return individuals
+        ind = Individual(d['name'], d['vorname'], d['reisegruppe'], d['alter'], d['geschlecht'])
+        ind.id = d['id']
+        ind.anwesend = d['anwesend']
+        ind.evakuiert = d['evakuiert']
+        ind.notiz = d['notiz']
+        ind.version = d.get('version', 0)
+        ind.ticket = d.get('ticket')
+        return ind
+
+    @_timed_network
+    def load_individuals(self, table_type):
+        return [self._to_individual(d) for d in self._get_json(f'/individuals/{table_type}')]
+
+    @_timed_network
+    def find_by_ticket(self, code):
+        from backend import normalize_ticket
+        try:
+            data = self._request('GET', f'/tickets/{normalize_ticket(code)}').json()
+        except requests.HTTPError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+        return data['table_type'], self._to_individual(data['individual'])
 
+    @_timed_network
+    def get_revision(self):
+        resp = self._request('GET', '/revision')
+        return resp.json()['revision']
+
+    @_timed_network
+    def get_node_id(self):
+        resp = self._request('GET', '/revision')
+        return resp.json()['node_id']
+
+    @_timed_network
+    def load_changes(self, table_type, since_rev):
+        resp = self._request('GET', f'/individuals/{table_type}/changes', params={'since': since_rev})
+        data = resp.json()
+        return data['revision'], [self._to_individual(d) for d in data['individuals']], data['deleted']
+
+    @_timed_network
     def add_log_entry(self, fullname, reisegruppe, status):
-        requests.post(f'{self.base_url}/log', json={
+        self._request('POST', '/log', {
             'fullname': fullname,
             'reisegruppe': reisegruppe,
             'status': status
         })
 
-    def load_log(self):
-        resp = requests.get(f'{self.base_url}/log')
-        resp.raise_for_status()
-        return [ (d['timestamp'], d['fullname'], d['reisegruppe'], d['status']) for d in resp.json() ]
+    @_timed_network
+    def load_log(self, after_id=None, before_id=None, limit=None):
+        params = {'after_id': after_id, 'before_id': before_id, 'limit': limit}
+        data = self._get_json('/log', params={k: v for k, v in params.items() if v is not None})
+        return [ (d['id'], d['timestamp'], d['fullname'], d['reisegruppe'], d['status']) for d in data ]
+
+    @_timed_network
+    def load_events(self, individual_id=None, start=None, end=None, table_type=None, limit=None, after_id=None):
+        params = {'individual_id': individual_id, 'start': start, 'end': end, 'table_type': table_type,
+                  'limit': limit, 'after_id': after_id}
+        data = self._get_json('/status/events', params={k: v for k, v in params.items() if v is not None})
+        return [(d['id'], d['ts'], d['individual_id'], d['table_type'], d['reisegruppe'], d['event_type']) for d in data]
+
+    @_timed_network
+    def load_timeline(self, start=None, end=None, step=None):
+        # Computed and cached by the server, see timeline.py
+        params = {'start': start, 'end': end, 'step': step}
+        return self._get_json('/stats/timeline', params={k: v for k, v in params.items() if v is not None})
+
+    def subscribe_changes(self, since_rev, log_after, on_change, stop_event=None, on_open=None):
+        # Consume the server's /events stream (Server-Sent Events) and call on_change(data) for
+        # each change event until stop_event is set; data is shaped like
+        # {'revision': R, 'guest': {'individuals': [...], 'deleted': [...]}, 'team': {...}, 'log': [...]}
+        # with Individual objects and (id, timestamp, fullname, reisegruppe, status) log tuples
+        # on_open() is called once the stream is established
+        # Returns normally only when stopped; network errors and dropped streams raise
+        params = {'since': since_rev, 'log_after': log_after or 0}
+        # The server sends a keepalive at least every 15 s, a longer silence means the stream is dead
+        with self._request('GET', '/events', params=params, stream=True) as resp:
+            if on_open is not None:
+                on_open()
+            event, data_lines = None, []
+            for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+                if stop_event is not None and stop_event.is_set():
+                    return
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                elif line.startswith('data:'):
+                    data_lines.append(line[len('data:'):].strip())
+                elif not line:
+                    # A blank line ends an event; comment lines (': keepalive') carry no data
+                    if event == 'change' and data_lines:
+                        on_change(self._parse_change_event(json.loads('\n'.join(data_lines))))
+                    event, data_lines = None, []
+        raise ConnectionError('Event stream closed by server')
+
+    def _parse_change_event(self, data):
+        change = {'revision': data['revision']}
+        for table_type in ('guest', 'team'):
+            change[table_type] = {
+                'individuals': [self._to_individual(d) for d in data[table_type]['individuals']],
+                'deleted': data[table_type]['deleted']
+            }
+        change['log'] = [(d['id'], d['timestamp'], d['fullname'], d['reisegruppe'], d['status']) for d in data['log']]
+        return change
+
+    @_timed_network
+    def load_stats(self):
+        # Returns the aggregates as served by /stats (total, by_group, by_table dicts)
+        return self._get_json('/stats')
 
+    @_timed_network
     def clear_all(self):
-        requests.post(f'{self.base_url}/clear')
+        self._request('POST', '/clear')
 
 # Ensure database tables exist on import
 init_db()
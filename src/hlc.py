@@ -0,0 +1,46 @@
+# hlc.py
+# Hybrid logical clock timestamps for replication between servers (see replication.py).
+# A timestamp combines the wall clock in milliseconds, a counter for events within the same
+# millisecond (or while the wall clock lags behind a timestamp received from another node) and
+# the id of the node that made it. They are formatted so that plain string comparison orders them,
+# which makes them usable as SQLite keys, and two nodes never produce the same timestamp.
+
+import time
+
+WALL_DIGITS = 13  # Milliseconds since 1970, enough until the year 2286
+COUNTER_DIGITS = 8
+
+def format_timestamp(wall_ms, counter, node_id):
+    """
+    Formats the parts of a timestamp, e.g. '1760785920123.00000002.halle-a'.
+    """
+    return f'{wall_ms:0{WALL_DIGITS}d}.{counter:0{COUNTER_DIGITS}d}.{node_id}'
+
+def parse_timestamp(timestamp):
+    """
+    Splits a timestamp into (wall_ms, counter, node_id).
+    """
+    wall, counter, node_id = timestamp.split('.', 2)
+    return int(wall), int(counter), node_id
+
+def next_timestamps(last, node_id, count=1, wall_ms=None):
+    """
+    Returns count new timestamps for local events, each greater than last and than each other.
+    :param last: Greatest timestamp seen so far (local or received from a peer), or None
+    :param node_id: Id of this node
+    :param count: Number of timestamps
+    :param wall_ms: Current wall clock in milliseconds (defaults to time.time())
+    :return: List of timestamps in ascending order
+    """
+    if wall_ms is None:
+        wall_ms = int(time.time() * 1000)
+    if last is None:
+        wall, counter = wall_ms, 0
+    else:
+        last_wall, last_counter, _ = parse_timestamp(last)
+        if wall_ms > last_wall:
+            wall, counter = wall_ms, 0
+        else:
+            # The wall clock has not moved past the last event (or lags behind a peer's clock)
+            wall, counter = last_wall, last_counter + 1
+    return [format_timestamp(wall, counter + offset, node_id) for offset in range(count)]
@@ -0,0 +1,74 @@
+# import_worker.py
+# Background CSV import for the main window.
+# The file is streamed in chunks, each row is validated, and the chunks are written through the
+# db backend's import_individuals (one transaction for SQLite). Invalid rows and rows whose ticket
+# code is already taken are skipped and counted. The worker runs in a QThread and
+# reports progress through signals, so the window stays responsive and the import can be cancelled.
+
+import threading
+from PyQt6 import QtCore
+from backend import individual_from_row
+from utils.csv_loader import count_csv_rows, iter_csv_chunks
+
+CHUNK_SIZE = 5000  # Rows parsed and written per chunk
+
+class ImportWorker(QtCore.QObject):
+    """
+    Imports a CSV file into one table. Move it to a QThread and connect the thread's
+    started signal to run().
+    """
+    progress = QtCore.pyqtSignal(int, int)  # (rows processed, total rows)
+    finished = QtCore.pyqtSignal(object, int)  # (imported individuals, skipped rows)
+    cancelled = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, db, table_type, file_path, chunk_size=CHUNK_SIZE):
+        super().__init__()
+        self.db = db
+        self.table_type = table_type
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """
+        Requests cancellation; safe to call from any thread.
+        """
+        self._cancel.set()
+
+    def run(self):
+        imported = []
+        skipped = 0
+        try:
+            total = count_csv_rows(self.file_path)
+            processed = 0
+
+            def chunks():
+                nonlocal processed, skipped
+                for rows in iter_csv_chunks(self.file_path, self.chunk_size):
+                    chunk = []
+                    for row in rows:
+                        individual = individual_from_row(row)
+                        if individual is None:
+                            skipped += 1
+                        else:
+                            chunk.append(individual)
+                    valid = len(chunk)
+                    yield chunk
+                    # Reached once the chunk has been written; rows with a taken ticket were removed from it
+                    skipped += valid - len(chunk)
+                    imported.extend(chunk)
+                    processed += len(rows)
+                    self.progress.emit(processed, total)
+
+            committed = self.db.import_individuals(self.table_type, chunks(), self._cancel.is_set)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        finally:
+            # The worker thread is about to end, hand its database connection back
+            self.db.release_connection()
+        if committed:
+            self.finished.emit(imported, skipped)
+        else:
+            self.cancelled.emit()
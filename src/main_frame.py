@@ -25,10 +25,9 @@ class Ui_MainWindow(object):
         self.verticalLayoutLeft = QtWidgets.QVBoxLayout()
         self.verticalLayoutLeft.setObjectName("verticalLayoutLeft")
         # Team table (top, 1/3 height)
-        self.team_table = QtWidgets.QTableWidget(parent=self.centralwidget)
+        self.team_table = QtWidgets.QTableView(parent=self.centralwidget)
         self.team_table.setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Fixed)
         self.team_table.setObjectName("team_table")
-        self.team_table.setColumnCount(8)
         self.verticalLayoutLeft.addWidget(self.team_table)
 
         # Spacer between tables and search
@@ -44,10 +43,9 @@ class Ui_MainWindow(object):
         self.verticalLayoutLeft.addItem(self.spacerItem1)
         
         # Guest table (bottom, 2/3 height)
-        self.guest_table = QtWidgets.QTableWidget(parent=self.centralwidget)
+        self.guest_table = QtWidgets.QTableView(parent=self.centralwidget)
         self.guest_table.setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Expanding)
         self.guest_table.setObjectName("guest_table")
-        self.guest_table.setColumnCount(8)
         self.verticalLayoutLeft.addWidget(self.guest_table)
         
         self.gridLayout.addLayout(self.verticalLayoutLeft, 0, 0, 1, 1)
@@ -87,6 +85,20 @@ class Ui_MainWindow(object):
         self.reloadButton.setObjectName("reloadButton")
         self.reloadButton.setText("Reload")
         self.verticalLayoutRight.addWidget(self.reloadButton)
+        # Scan mode: a toggle button and the input field a keyboard-wedge scanner types into
+        self.scanButton = QtWidgets.QPushButton(parent=self.centralwidget)
+        self.scanButton.setObjectName("scanButton")
+        self.scanButton.setCheckable(True)
+        self.verticalLayoutRight.addWidget(self.scanButton)
+        # Opens the chart of present individuals over time
+        self.timelineButton = QtWidgets.QPushButton(parent=self.centralwidget)
+        self.timelineButton.setObjectName("timelineButton")
+        self.verticalLayoutRight.addWidget(self.timelineButton)
+        self.scanLineEdit = QtWidgets.QLineEdit(parent=self.centralwidget)
+        self.scanLineEdit.setObjectName("scanLineEdit")
+        self.scanLineEdit.setPlaceholderText("Ticket scannen")
+        self.scanLineEdit.setVisible(False)
+        self.verticalLayoutRight.addWidget(self.scanLineEdit)
         # Log label
         self.log_label = QtWidgets.QLabel(parent=self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Fixed)
@@ -137,6 +149,9 @@ class Ui_MainWindow(object):
         self.loadFileButton.setStyleSheet("font-size: 12px;")
         self.addEntryButton.setStyleSheet("font-size: 12px;")
         self.reloadButton.setStyleSheet("font-size: 12px;")
+        self.scanButton.setStyleSheet("font-size: 12px;")
+        self.timelineButton.setStyleSheet("font-size: 12px;")
+        self.scanLineEdit.setStyleSheet("font-size: 20px;")
         self.team_table.setStyleSheet("font-size: 12px;")
         self.guest_table.setStyleSheet("font-size: 12px;")
 
@@ -148,4 +163,6 @@ class Ui_MainWindow(object):
         self.evacuatedCountLabel.setText(_translate("MainWindow", "TextLabel"))
         self.loadFileButton.setText(_translate("MainWindow", "Lade Datei"))
         self.addEntryButton.setText(_translate("MainWindow", "Neuer Eintrag"))
+        self.scanButton.setText(_translate("MainWindow", "Scan-Modus"))
+        self.timelineButton.setText(_translate("MainWindow", "Belegung im Zeitverlauf"))
         self.log_label.setText(_translate("MainWindow", "Verlauf"))
@@ -2,70 +2,249 @@
 # This file contains the MainFrame class, moved from main_frame.py for modularity.
 
 from PyQt6 import QtCore, QtGui, QtWidgets
-from backend import CheckInOutManager, Individual
-import datetime
+from backend import CheckInOutManager, Individual, StatusAggregates, normalize_ticket
+import cProfile
 import os
+import time
+import metrics
+import snapshot
 from main_frame import Ui_MainWindow  # Import the UI class
+from import_worker import ImportWorker
+from timeline_chart import TimelineDialog
+from change_stream import ChangeStream
+from async_db import AsyncDB, fetch_all, fetch_changes, fetch_since_snapshot
+from table_model import IndividualTableModel, SearchFilterProxyModel, StatusButtonDelegate, PRESENT_COLUMN, EVACUATED_COLUMN
+
+LOG_PAGE_SIZE = 200  # Log entries per page (initial view, tail catch-up and scroll-back)
+SEARCH_DELAY_MS = 200  # Search runs once typing pauses for this long
+POLL_INTERVAL_MS = 1000  # Delta poll interval without a push channel
+STREAM_POLL_INTERVAL_MS = 30000  # Safety-net poll interval while server push is connected
+SCAN_REPEAT_MS = 2000  # The same ticket scanned again within this time is ignored (scanner double read)
+SCAN_FEEDBACK_MS = 700  # How long the scan field shows the green/red result
+SNAPSHOT_INTERVAL_MS = 60000  # How often the state is saved for the next cold start (if it changed)
+SNAPSHOT_FILE_NAME = 'desk_snapshot.bin'  # Next to the local database unless CHECKIN_SNAPSHOT is set
+# Desk-side timings; the db calls made by the background worker are timed in db.py
+GUI_SECONDS = metrics.REGISTRY.histogram('checkin_gui_seconds', 'Duration of desk client operations', ('call',))
+_timed_gui = metrics.timed_calls(GUI_SECONDS)
+
+def _timed_round_trip(call, callback):
+    # Wraps an async_db callback so the whole round trip (queue, db call, delivery) is recorded
+    start = time.perf_counter()
+
+    def finished(result):
+        GUI_SECONDS.observe(time.perf_counter() - start, call=call)
+        callback(result)
+    return finished
+
+# Bulk actions in the table context menu: (menu text, anwesend, evakuiert, log status)
+BULK_ACTIONS = [
+    ("anwesend", True, None, "arrived"),
+    ("abwesend", False, None, "left"),
+    ("evakuiert", None, True, "evacuated"),
+    ("nicht evakuiert", None, False, "not evacuated"),
+]
+
+# How the status events (see db.load_events) are shown in a person's history
+EVENT_LABELS = {
+    'arrived': "angekommen",
+    'left': "gegangen",
+    'evacuated': "evakuiert",
+    'evacuation_cleared': "nicht mehr evakuiert",
+    'removed': "aus der Liste entfernt",
+}
 
 class MainFrame(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
+        # Opt-in profiling: CHECKIN_PROFILE=<path prefix> profiles the GUI thread from here until
+        # the window closes, then writes <prefix>.pstats and <prefix>.metrics.txt
+        self.profile_path = os.environ.get('CHECKIN_PROFILE')
+        self.profiler = None
+        if self.profile_path:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
-        self.manager = CheckInOutManager()
         # --- Choose DB backend: local or network ---
         network_mode = os.environ.get('NETWORK_DB', '0') == '1'
+        import db
         if network_mode:
-            from db import NetworkDB
-            self.db = NetworkDB()
+            self.db = db.NetworkDB()
         else:
-            import db
             self.db = db
         # --- Use self.db instead of db below ---
+        # Database calls run on a background thread; only the initial load below blocks
+        self.async_db = AsyncDB(self.db, self)
+        self.async_db.failed.connect(lambda message: self.ui.statusbar.showMessage(message, 10000))
+        self.async_db.written.connect(self.versions_written)
+        self.async_db.conflicts.connect(self.writes_conflicted)
+        self.async_db.dropped.connect(self.writes_dropped)
+        self.async_db.start()
         self.ui.addEntryButton.clicked.connect(self.add_entry)
         self.ui.loadFileButton.clicked.connect(self.load_file)
-        self.ui.searchLineEdit.textChanged.connect(self.search_guest_table)
+        # Debounce the search bar: each keystroke restarts the timer
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.search_tables)
+        self.ui.searchLineEdit.textChanged.connect(lambda _text: self.search_timer.start())
         self.ui.tableSelection.currentIndexChanged.connect(self.update_table_selection)
-        self.ui.reloadButton.clicked.connect(self.reload_from_db)  # Connect reload button
+        self.ui.reloadButton.clicked.connect(self.reload_all)  # Connect reload button
+        # Scan mode: the scanner types the ticket code followed by Enter into scanLineEdit
+        self.ui.scanButton.toggled.connect(self.set_scan_mode)
+        self.ui.scanLineEdit.returnPressed.connect(self.ticket_scanned)
+        self.ui.timelineButton.clicked.connect(self.show_timeline)
+        self.timeline_dialog = None
+        self.last_scan = (None, None)  # (normalized ticket code, QElapsedTimer) of the previous scan
+        self.scan_feedback_timer = QtCore.QTimer(self)
+        self.scan_feedback_timer.setSingleShot(True)
+        self.scan_feedback_timer.setInterval(SCAN_FEEDBACK_MS)
+        self.scan_feedback_timer.timeout.connect(lambda: self.ui.scanLineEdit.setStyleSheet("font-size: 20px;"))
         self.selected_table = self.ui.guest_table  # Default to guest table
-        # Load data from database
-        self.guest_individuals = self.db.load_individuals('guest')
-        self.team_individuals = self.db.load_individuals('team')
+        # Cold start from the snapshot of the last session if there is one: the tables show up
+        # without waiting for the database, which is checked and caught up with in the background
+        # (see reload_from_db). CHECKIN_SNAPSHOT sets the file, an empty value turns snapshots off.
+        self.snapshot_path = os.environ.get('CHECKIN_SNAPSHOT',
+                                            os.path.join(os.path.dirname(db.DB_PATH), SNAPSHOT_FILE_NAME))
+        state = None
+        if self.snapshot_path:
+            with GUI_SECONDS.time(call='read_snapshot'):
+                state = snapshot.read_snapshot(self.snapshot_path)
+        if state is not None:
+            self.revision = state.revision
+            self.node_id = state.node_id
+            self.snapshot_unconfirmed = True  # Until the database turned out to be the same one
+            self.snapshot_position = (state.revision, state.log_last_id)  # Last snapshot written or read
+            guests, team = state.tables['guest'], state.tables['team']
+        else:
+            # Load data from database; the revision is read first so no change is missed
+            self.revision = self.db.get_revision()
+            self.node_id = self.db.get_node_id()
+            self.snapshot_unconfirmed = False
+            self.snapshot_position = None
+            guests, team = self.db.load_individuals('guest'), self.db.load_individuals('team')
+        # Both managers feed the same aggregates, so the counters never re-sum the tables
+        self.aggregates = StatusAggregates()
+        self.guest_manager = CheckInOutManager(guests, 'guest', self.aggregates)
+        self.team_manager = CheckInOutManager(team, 'team', self.aggregates)
+        self.guest_model = IndividualTableModel(self.guest_manager, self)
+        self.team_model = IndividualTableModel(self.team_manager, self)
         # Set up both tables
-        self.setup_table(self.ui.team_table)
-        self.setup_table(self.ui.guest_table)
-        self.populate_table(self.ui.guest_table, self.guest_individuals)
-        self.populate_table(self.ui.team_table, self.team_individuals)
+        self.team_proxy = self.setup_table(self.ui.team_table, self.team_model, 'team')
+        self.guest_proxy = self.setup_table(self.ui.guest_table, self.guest_model, 'guest')
         self.update_counters()
-        self.load_log_to_widget()
+        self.log_first_id = None  # Oldest log entry shown in logScreen
+        self.log_last_id = None  # Newest log entry shown in logScreen
+        self.log_history_complete = False
+        self.log_older_pending = False
+        self.ui.logScreen.verticalScrollBar().valueChanged.connect(self.log_scrolled)
 
         # --- Real-time polling for all modes ---
+        self.poll_pending = False
         self.poll_timer = QtCore.QTimer(self)
-        self.poll_timer.setInterval(1000)  # 1 second interval
+        self.poll_timer.setInterval(POLL_INTERVAL_MS)
         self.poll_timer.timeout.connect(self.reload_from_db)
         self.poll_timer.start()
+        # In network mode the server pushes changes; polling slows down while the stream is up
+        self.change_stream = None
+        self.stream_connected = False
+        if state is not None:
+            # Catch up right away; the log page and the push channel follow in the background
+            self.log_last_id = state.log_last_id
+            self.reload_from_db()
+            self.reset_log_widget()
+        else:
+            self.show_log_page(self.db.load_log(limit=LOG_PAGE_SIZE))
+            self.start_change_stream()
+        self.snapshot_timer = QtCore.QTimer(self)
+        self.snapshot_timer.setInterval(SNAPSHOT_INTERVAL_MS)
+        self.snapshot_timer.timeout.connect(self.save_snapshot)
+        self.snapshot_timer.start()
+
+    def start_change_stream(self):
+        if hasattr(self.db, 'subscribe_changes'):
+            self.change_stream = ChangeStream(self.db, lambda: (self.revision, self.log_last_id), self)
+            self.change_stream.change_received.connect(self.apply_change_event)
+            self.change_stream.connection_changed.connect(self.stream_state_changed)
+            self.change_stream.start()
+
+    def format_log_entry(self, entry):
+        _, ts, fullname, reisegruppe, status = entry
+        return f"[{ts}] {fullname} ({reisegruppe}) {status}"
+
+    def reset_log_widget(self):
+        # Show only the newest page; older entries are paged in when scrolling up
+        self.async_db.call(self.db.load_log, limit=LOG_PAGE_SIZE, callback=self.show_log_page)
+
+    def show_log_page(self, entries):
+        self.ui.logScreen.clear()
+        self.log_first_id = None
+        self.log_last_id = None
+        self.log_history_complete = len(entries) < LOG_PAGE_SIZE
+        for entry in entries:
+            self.ui.logScreen.append(self.format_log_entry(entry))
+        scrollbar = self.ui.logScreen.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+        if entries:
+            self.log_first_id = entries[0][0]
+            self.log_last_id = entries[-1][0]
 
     def load_log_to_widget(self):
-        log_screen = self.ui.logScreen
-        scrollbar = log_screen.verticalScrollBar()
-        # Save previous scroll position and range
+        # Tail the log: only entries newer than the last one shown are fetched
+        if self.log_last_id is None:
+            self.reset_log_widget()
+            return
+        self.async_db.call(self.db.load_log, after_id=self.log_last_id, limit=LOG_PAGE_SIZE + 1,
+                           callback=_timed_round_trip('load_log_to_widget', self.append_log_entries))
+
+    def append_log_entries(self, entries):
+        # Entries are in ascending order; ones already shown (e.g. pushed meanwhile) are skipped
+        if len(entries) > LOG_PAGE_SIZE:
+            # Too far behind to append everything, jump to the newest page instead
+            self.reset_log_widget()
+            return
+        if self.log_last_id is not None:
+            entries = [entry for entry in entries if entry[0] > self.log_last_id]
+        for entry in entries:
+            self.append_log_entry(self.format_log_entry(entry))
+        if entries:
+            if self.log_first_id is None:
+                self.log_first_id = entries[0][0]
+            self.log_last_id = entries[-1][0]
+
+    def log_scrolled(self, value):
+        scrollbar = self.ui.logScreen.verticalScrollBar()
+        if value == scrollbar.minimum() and scrollbar.maximum() > 0:
+            self.load_older_log()
+
+    def load_older_log(self):
+        # Prepend the page of entries just before the oldest one shown
+        if self.log_first_id is None or self.log_history_complete or self.log_older_pending:
+            return
+        self.log_older_pending = True
+        self.async_db.call(self.db.load_log, before_id=self.log_first_id, limit=LOG_PAGE_SIZE,
+                           callback=self.prepend_log_entries, errback=self.older_log_failed)
+
+    def prepend_log_entries(self, entries):
+        self.log_older_pending = False
+        if self.log_first_id is None or (entries and entries[-1][0] >= self.log_first_id):
+            return  # The log view was reset meanwhile
+        self.log_history_complete = len(entries) < LOG_PAGE_SIZE
+        if not entries:
+            return
+        scrollbar = self.ui.logScreen.verticalScrollBar()
         prev_value = scrollbar.value()
         prev_max = scrollbar.maximum()
-        at_bottom = prev_value == prev_max and prev_max > 0
-        log_screen.clear()
-        for ts, fullname, reisegruppe, status in self.db.load_log():
-            log_screen.append(f"[{ts}] {fullname} ({reisegruppe}) {status}")
-        # After appending, restore scroll position
-        if at_bottom:
-            scrollbar.setValue(scrollbar.maximum())
-        else:
-            # Try to keep the same relative position
-            new_max = scrollbar.maximum()
-            if prev_max > 0:
-                rel_pos = prev_value / prev_max
-                scrollbar.setValue(int(rel_pos * new_max))
-            else:
-                scrollbar.setValue(0)
+        cursor = QtGui.QTextCursor(self.ui.logScreen.document())
+        cursor.movePosition(QtGui.QTextCursor.MoveOperation.Start)
+        cursor.insertText("\n".join(self.format_log_entry(entry) for entry in entries) + "\n")
+        self.log_first_id = entries[0][0]
+        # Keep the lines the user was looking at in place
+        scrollbar.setValue(prev_value + scrollbar.maximum() - prev_max)
+
+    def older_log_failed(self, message):
+        self.log_older_pending = False
+        self.ui.statusbar.showMessage(message, 10000)
 
     def append_log_entry(self, entry):
         log_screen = self.ui.logScreen
@@ -76,174 +255,389 @@ class MainFrame(QtWidgets.QMainWindow):
             scrollbar.setValue(scrollbar.maximum())
         # else: keep current position
 
-    def save_all(self):
-        self.db.save_individuals('guest', self.guest_individuals)
-        self.db.save_individuals('team', self.team_individuals)
-
     def update_table_selection(self):
         if self.ui.tableSelection.currentText() == "Gäste":
             self.selected_table = self.ui.guest_table
         else:
             self.selected_table = self.ui.team_table
 
-    def setup_table(self, table):
-        headers = ["Name", "Vorname", "Reisegruppe", "Alter", "Geschlecht", "Anwesend", "Evakuiert", "Notiz"]
-        table.setColumnCount(len(headers))
-        table.setHorizontalHeaderLabels(headers)
+    def selected_model(self):
+        # Returns (table_type, model) of the table chosen in the selection box
+        if self.selected_table == self.ui.guest_table:
+            return 'guest', self.guest_model
+        return 'team', self.team_model
+
+    def setup_table(self, table, model, table_type):
+        # The proxy sorts and filters on top of the model without copying any rows
+        proxy = SearchFilterProxyModel(self)
+        proxy.setSourceModel(model)
+        table.setModel(proxy)
         header = table.horizontalHeader()
         header.setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Stretch)
+        delegate = StatusButtonDelegate(table)
+        table.setItemDelegateForColumn(PRESENT_COLUMN, delegate)
+        table.setItemDelegateForColumn(EVACUATED_COLUMN, delegate)
+        table.setWordWrap(True)
+        # With the indicator set first, enabling sorting sorts once (sortByColumn would sort twice more)
+        header.setSortIndicator(2, QtCore.Qt.SortOrder.AscendingOrder)
         table.setSortingEnabled(True)
-        table.sortItems(2, QtCore.Qt.SortOrder.AscendingOrder)
+        model.presence_toggled.connect(lambda person, checked: self.presence_changed(table_type, person, checked))
+        model.evacuation_toggled.connect(self.evacuation_changed)
+        model.note_edited.connect(self.note_changed)
+        table.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
+        table.customContextMenuRequested.connect(lambda pos: self.show_table_menu(table, model, table_type, pos))
+        return proxy
+
+    def show_table_menu(self, table, model, table_type, pos):
+        # Bulk status actions for the selected rows and for the group of the clicked row
+        proxy = table.model()
+        rows = {proxy.mapToSource(index).row() for index in table.selectionModel().selectedIndexes()}
+        selected_ids = [model.individuals[row].id for row in rows]
+        menu = QtWidgets.QMenu(self)
+        if selected_ids:
+            for text, anwesend, evakuiert, status in BULK_ACTIONS:
+                menu.addAction(f"Auswahl ({len(selected_ids)}) {text}",
+                               lambda checked=False, a=anwesend, e=evakuiert, st=status:
+                               self.set_bulk_status(table_type, model, selected_ids, a, e, st, "Auswahl"))
+        index = table.indexAt(pos)
+        if index.isValid():
+            person = model.individuals[proxy.mapToSource(index).row()]
+            group = person.reisegruppe
+            menu.addSeparator()
+            menu.addAction(f"Verlauf von {person.vorname} {person.name}",
+                           lambda checked=False: self.show_history(person))
+            for text, anwesend, evakuiert, status in BULK_ACTIONS:
+                menu.addAction(f"Gruppe {group} {text}",
+                               lambda checked=False, a=anwesend, e=evakuiert, st=status:
+                               self.set_bulk_status(table_type, model, [ind.id for ind in model.manager.get_group(group)],
+                                                    a, e, st, group))
+        if not menu.isEmpty():
+            menu.exec(table.viewport().mapToGlobal(pos))
+
+    def show_history(self, person):
+        # The person's status events; queued behind the writes still pending, so they are included
+        self.async_db.call(self.db.load_events, individual_id=person.id,
+                           callback=lambda events: self.history_loaded(person, events),
+                           errback=lambda message: self.ui.statusbar.showMessage(message, 10000))
+
+    def history_loaded(self, person, events):
+        lines = [f"{QtCore.QDateTime.fromMSecsSinceEpoch(ts).toString('dd.MM.yyyy HH:mm:ss')}  "
+                 f"{EVENT_LABELS.get(event_type, event_type)}"
+                 for _, ts, _, _, _, event_type in events]
+        QtWidgets.QMessageBox.information(self, f"Verlauf von {person.vorname} {person.name}",
+                                          "\n".join(lines) or "Noch keine Statusänderungen")
+
+    def show_timeline(self):
+        # One window, reused; it reloads the timeline itself while it is open
+        if self.timeline_dialog is None:
+            self.timeline_dialog = TimelineDialog(self.load_timeline, self)
+        else:
+            self.timeline_dialog.refresh()
+        self.timeline_dialog.show()
+        self.timeline_dialog.raise_()
+
+    def load_timeline(self, callback):
+        # Computed by the server in network mode, by this process's timeline otherwise
+        self.async_db.call(self.db.load_timeline, callback=callback,
+                           errback=lambda message: self.ui.statusbar.showMessage(message, 10000))
+
+    def set_bulk_status(self, table_type, model, individual_ids, anwesend, evakuiert, status, scope):
+        # A whole group or selection: one model update, one write and one log record
+        changed = model.set_status_for_ids(individual_ids, anwesend, evakuiert)
+        if not changed:
+            return
+        label = "Gast" if table_type == 'guest' else "Team"
+        self.async_db.write({'op': 'update_status_bulk', 'ids': [ind.id for ind in changed],
+                             'anwesend': anwesend, 'evakuiert': evakuiert})
+        self.async_db.write({'op': 'add_log_entry', 'fullname': f"{len(changed)} Personen",
+                             'reisegruppe': scope, 'status': f"{label} {status}"})
+        if not self.stream_connected:
+            self.load_log_to_widget()
+        self.update_counters()
+
+    def presence_changed(self, table_type, person, checked):
+        label = "Gast" if table_type == 'guest' else "Team"
+        status = "arrived" if checked else "left"
+        # The model already shows the change; log entry and status go out in the background,
+        # together with any other writes queued meanwhile (one round trip in network mode)
+        self.async_db.write({'op': 'add_log_entry', 'fullname': f"{person.vorname} {person.name}",
+                             'reisegruppe': person.reisegruppe, 'status': f"{label} {status}"})
+        # Leaving also clears the evacuation status
+        self.async_db.write({'op': 'update_status', 'id': person.id, 'version': person.version,
+                             'anwesend': checked, 'evakuiert': None if checked else False})
+        if not self.stream_connected:
+            # With server push the new entry arrives with the change event, saving a request
+            self.load_log_to_widget()
+        self.update_counters()
+
+    def evacuation_changed(self, person, checked):
+        self.update_counters()
+        self.async_db.write({'op': 'update_status', 'id': person.id, 'version': person.version, 'evakuiert': checked})
+
+    def note_changed(self, person):
+        # Persist an edited note as a single-row update
+        self.async_db.write({'op': 'update_note', 'id': person.id, 'version': person.version, 'notiz': person.notiz})
+
+    def set_scan_mode(self, enabled):
+        # The scan field keeps the keyboard focus, so every scan lands there
+        self.ui.scanLineEdit.setVisible(enabled)
+        if enabled:
+            self.ui.scanLineEdit.setFocus()
+
+    def ticket_scanned(self):
+        # Toggle the presence of the ticket's holder: a dict lookup, a repaint of one row and a
+        # queued write, so the desk keeps up with a scanner even while the server is slow
+        code = normalize_ticket(self.ui.scanLineEdit.text())
+        self.ui.scanLineEdit.clear()
+        if code is None:
+            return
+        # Compared normalized, so " abc" right after "ABC" is still the same ticket scanned twice
+        last_code, last_time = self.last_scan
+        if code == last_code and not last_time.hasExpired(SCAN_REPEAT_MS):
+            return
+        timer = QtCore.QElapsedTimer()
+        timer.start()
+        self.last_scan = (code, timer)
+        for model in (self.guest_model, self.team_model):
+            person = model.manager.get_by_ticket(code)
+            if person is not None:
+                break
+        else:
+            self.show_scan_result(False, f"Unbekanntes Ticket: {code}")
+            return
+        # Goes through the same path as a click on the status button (log entry, write, counters)
+        model.setData(model.index(model.manager.get_position(person.id), PRESENT_COLUMN), not person.anwesend)
+        status = "anwesend" if person.anwesend else "abwesend"
+        self.show_scan_result(True, f"{person.vorname} {person.name} ({person.reisegruppe}) {status}")
+
+    def show_scan_result(self, ok, message):
+        color = "#c8f7c5" if ok else "#f7c5c5"
+        self.ui.scanLineEdit.setStyleSheet(f"font-size: 20px; background-color: {color};")
+        self.scan_feedback_timer.start()
+        self.ui.statusbar.showMessage(message, 5000)
+
+    def find_individual(self, individual_id):
+        # Returns (model, individual) for an id from either table, or (None, None)
+        for model in (self.guest_model, self.team_model):
+            individual = model.manager.get_by_id(individual_id)
+            if individual is not None:
+                return model, individual
+        return None, None
+
+    def versions_written(self, versions):
+        # Keep row versions current, so this desk's next write is not mistaken for a stale one
+        for individual_id, version in versions.items():
+            _, individual = self.find_individual(individual_id)
+            if individual is not None and individual.version < version:
+                individual.version = version
+
+    def writes_conflicted(self, current_rows):
+        # Another desk changed these individuals first: show their state instead of ours
+        for current in current_rows:
+            model, _ = self.find_individual(current.id)
+            if model is not None:
+                model.apply_changes([current], [])
+        if self.ui.searchLineEdit.text():
+            self.search_tables()
+        self.update_counters()
+        names = ", ".join(f"{ind.vorname} {ind.name}" for ind in current_rows)
+        self.ui.statusbar.showMessage(f"An einem anderen Platz geändert, Änderung verworfen: {names}", 10000)
+
+    def writes_dropped(self, ids):
+        # Writes that never reached the database: reload, so the tables stop showing their values
+        self.reload_all()
 
     def load_file(self):
         file_dialog = QtWidgets.QFileDialog()
         file_path, _ = file_dialog.getOpenFileName(self, "Open CSV File", "", "CSV Files (*.csv);;All Files (*)")
         if file_path:
-            self.selected_table.setSortingEnabled(False)
-            new_individuals = []
-            import csv
-            with open(file_path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                next(reader, None)
-                for row in reader:
-                    if len(row) >= 5:
-                        name, vorname, reisegruppe, alter, geschlecht = row[:5]
-                        anwesend = row[5].strip().lower() == 'yes' if len(row) > 5 else False
-                        evakuiert = row[6].strip().lower() == 'yes' if len(row) > 6 else False
-                        notiz = row[7] if len(row) > 7 else ''
-                        ind = Individual(name, vorname, reisegruppe, int(alter), geschlecht)
-                        ind.anwesend = anwesend
-                        ind.evakuiert = evakuiert
-                        ind.notiz = notiz
-                        new_individuals.append(ind)
-            if self.selected_table == self.ui.guest_table:
-                self.guest_individuals.extend(new_individuals)
-                self.populate_table(self.ui.guest_table, self.guest_individuals)
-            else:
-                self.team_individuals.extend(new_individuals)
-                self.populate_table(self.ui.team_table, self.team_individuals)
-            self.update_counters()
-            self.selected_table.setSortingEnabled(True)
-            self.selected_table.sortItems(2, QtCore.Qt.SortOrder.AscendingOrder)
-            self.save_all()
+            self.start_import(file_path)
+
+    def start_import(self, file_path):
+        # Parse and write the file in a worker thread; the window only shows progress
+        table_type, model = self.selected_model()
+        self.import_model = model
+        self.import_thread = QtCore.QThread(self)
+        self.import_worker = ImportWorker(self.db, table_type, file_path)
+        self.import_worker.moveToThread(self.import_thread)
+        self.import_thread.started.connect(self.import_worker.run)
+        self.import_worker.progress.connect(self.import_progress)
+        self.import_worker.finished.connect(self.import_finished)
+        self.import_worker.cancelled.connect(self.import_cancelled)
+        self.import_worker.failed.connect(self.import_failed)
+        self.import_dialog = QtWidgets.QProgressDialog("Datei wird importiert...", "Abbrechen", 0, 0, self)
+        self.import_dialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        self.import_dialog.setMinimumDuration(0)
+        # The worker thread is busy inside run(), so cancel() must be called directly
+        self.import_dialog.canceled.connect(self.import_worker.cancel, QtCore.Qt.ConnectionType.DirectConnection)
+        self.ui.loadFileButton.setEnabled(False)
+        self.import_thread.start()
+
+    def import_progress(self, done, total):
+        self.import_dialog.setMaximum(total)
+        self.import_dialog.setValue(done)
+
+    def import_finished(self, individuals, skipped):
+        self.end_import()
+        # A poll may already have picked up the committed rows
+        manager = self.import_model.manager
+        self.import_model.append_individuals([ind for ind in individuals if manager.get_by_id(ind.id) is None])
+        self.update_counters()
+        message = f"{len(individuals)} Einträge importiert"
+        if skipped:
+            message += f", {skipped} ungültige oder doppelte Zeilen übersprungen"
+        self.ui.statusbar.showMessage(message, 10000)
+
+    def import_cancelled(self):
+        self.end_import()
+        self.ui.statusbar.showMessage("Import abgebrochen", 10000)
+
+    def import_failed(self, error):
+        self.end_import()
+        QtWidgets.QMessageBox.warning(self, "Import fehlgeschlagen", error)
+
+    def end_import(self):
+        self.import_thread.quit()
+        self.import_thread.wait()
+        self.import_dialog.reset()
+        self.ui.loadFileButton.setEnabled(True)
 
     def add_entry(self):
         new_individual = Individual("New", "Entry", "Group", 0, "Unknown")
-        if self.selected_table == self.ui.guest_table:
-            self.guest_individuals.append(new_individual)
-            self.populate_table(self.ui.guest_table, self.guest_individuals)
-        else:
-            self.team_individuals.append(new_individual)
-            self.populate_table(self.ui.team_table, self.team_individuals)
-        self.update_counters()
-        self.save_all()
+        table_type, model = self.selected_model()
+        # The row is shown once the database handed out its id
+        self.async_db.call(self.db.add_individuals, table_type, [new_individual],
+                           callback=lambda _result: self.entry_added(model, new_individual))
+
+    def entry_added(self, model, individual):
+        # A poll may already have picked up the new row
+        if model.manager.get_by_id(individual.id) is None:
+            model.append_individuals([individual])
+            self.update_counters()
 
+    @_timed_gui
     def populate_table(self, table, individuals):
-        table.setRowCount(len(individuals))
-        for row_idx, individual in enumerate(individuals):
-            items = [
-                QtWidgets.QTableWidgetItem(individual.name),
-                QtWidgets.QTableWidgetItem(individual.vorname),
-                QtWidgets.QTableWidgetItem(individual.reisegruppe),
-                QtWidgets.QTableWidgetItem(str(individual.alter)),
-                QtWidgets.QTableWidgetItem(individual.geschlecht)
-            ]
-            for col in range(5):
-                items[col].setFlags(items[col].flags() & ~QtCore.Qt.ItemFlag.ItemIsEditable)
-                table.setItem(row_idx, col, items[col])
-            present_btn = QtWidgets.QPushButton("Yes" if individual.anwesend else "No")
-            present_btn.setStyleSheet("background-color: lightgreen;" if individual.anwesend else "background-color: lightcoral;")
-            present_btn.setCheckable(True)
-            present_btn.setChecked(individual.anwesend)
-            # Ensure button text matches checked state
-            present_btn.setText("Yes" if individual.anwesend else "No")
-            def present_handler(checked, btn=present_btn, idx=row_idx, table_ref=table):
-                now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
-                if table_ref == self.ui.guest_table:
-                    person = self.guest_individuals[idx]
-                    table_type = "Gast"
-                else:
-                    person = self.team_individuals[idx]
-                    table_type = "Team"
-                # Always update the individual's state to match the button
-                person.anwesend = checked
-                status = "arrived" if checked else "left"
-                log_entry = f"[{now}] [{table_type}] {person.vorname} {person.name} ({person.reisegruppe})  {status}"
-                self.append_log_entry(log_entry)
-                self.db.add_log_entry(f"{table_type} {status}", f"{person.vorname} {person.name}", person.reisegruppe)
-                btn.setText("Yes" if checked else "No")
-                self.save_all()
-                if checked and not table.cellWidget(idx, 6):
-                    evacuated_btn = QtWidgets.QPushButton("Yes" if person.evakuiert else "No")
-                    evacuated_btn.setStyleSheet("background-color: lightgreen;" if person.evakuiert else "background-color: lightcoral;")
-                    evacuated_btn.setCheckable(True)
-                    evacuated_btn.setChecked(person.evakuiert)
-                    evacuated_btn.setText("Yes" if person.evakuiert else "No")
-                    def evacuated_handler(checked, btn=evacuated_btn, idx=idx, table_ref=table):
-                        if table_ref == self.ui.guest_table:
-                            self.guest_individuals[idx].evakuiert = checked
-                        else:
-                            self.team_individuals[idx].evakuiert = checked
-                        btn.setText("Yes" if checked else "No")
-                        self.update_counters()
-                        self.save_all()
-                    evacuated_btn.toggled.connect(evacuated_handler)
-                    table.setCellWidget(idx, 6, evacuated_btn)
-                elif not checked and table.cellWidget(idx, 6):
-                    if table_ref == self.ui.guest_table:
-                        self.guest_individuals[idx].evakuiert = False
-                    else:
-                        self.team_individuals[idx].evakuiert = False
-                    table.removeCellWidget(idx, 6)
-                self.update_counters()
-            present_btn.toggled.connect(present_handler)
-            table.setCellWidget(row_idx, 5, present_btn)
-            # Set up evacuated button if present and anwesend is True
-            if individual.anwesend:
-                evacuated_btn = QtWidgets.QPushButton("Yes" if individual.evakuiert else "No")
-                evacuated_btn.setCheckable(True)
-                evacuated_btn.setChecked(individual.evakuiert)
-                evacuated_btn.setText("Yes" if individual.evakuiert else "No")
-                def evacuated_handler(checked, btn=evacuated_btn, idx=row_idx, table_ref=table):
-                    if table_ref == self.ui.guest_table:
-                        self.guest_individuals[idx].evakuiert = checked
-                    else:
-                        self.team_individuals[idx].evakuiert = checked
-                    btn.setText("Yes" if checked else "No")
-                    self.update_counters()
-                    self.save_all()
-                evacuated_btn.toggled.connect(evacuated_handler)
-                table.setCellWidget(row_idx, 6, evacuated_btn)
-            else:
-                # Always remove the evacuated button if not anwesend
-                if table.cellWidget(row_idx, 6):
-                    table.removeCellWidget(row_idx, 6)
-            notiz_item = QtWidgets.QTableWidgetItem(individual.notiz)
-            notiz_item.setTextAlignment(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter)
-            table.setItem(row_idx, 7, notiz_item)
-        table.setWordWrap(True)
-        table.resizeRowsToContents()
+        # Only hands the list to the model; the view renders the visible rows on demand
+        table.model().sourceModel().set_individuals(individuals)
 
     def update_counters(self):
-        present_count = sum(1 for ind in self.guest_individuals if ind.anwesend) + sum(1 for ind in self.team_individuals if ind.anwesend)
-        evacuated_count = sum(1 for ind in self.guest_individuals if ind.evakuiert) + sum(1 for ind in self.team_individuals if ind.evakuiert)
+        present_count = self.aggregates.total['anwesend']
+        evacuated_count = self.aggregates.total['evakuiert']
         self.ui.presentCountLabel.setText(f"Anwesend: {present_count}")
         self.ui.evacuatedCountLabel.setText(f"Evakuiert: {evacuated_count}")
 
-    def search_guest_table(self, text):
-        for row in range(self.ui.guest_table.rowCount()):
-            match = False
-            for col in range(self.ui.guest_table.columnCount()):
-                item = self.ui.guest_table.item(row, col)
-                if item and text.lower() in item.text().lower():
-                    match = True
-                    break
-            self.ui.guest_table.setRowHidden(row, not match)
+    def search_tables(self):
+        # Filter both tables through the managers' search indexes
+        text = self.ui.searchLineEdit.text()
+        self.guest_proxy.set_matching_ids(self.guest_manager.search_index.search(text))
+        self.team_proxy.set_matching_ids(self.team_manager.search_index.search(text))
 
     def reload_from_db(self):
-        self.guest_individuals = self.db.load_individuals('guest')
-        self.team_individuals = self.db.load_individuals('team')
-        self.populate_table(self.ui.guest_table, self.guest_individuals)
-        self.populate_table(self.ui.team_table, self.team_individuals)
+        # Delta sync in the background: a quiet poll only costs one revision lookup
+        if self.poll_pending:
+            return  # The previous poll has not come back yet (slow server)
+        self.poll_pending = True
+        if self.snapshot_unconfirmed:
+            # Started from a snapshot: deltas only apply if it came from this database
+            self.async_db.call(fetch_since_snapshot, self.db, self.node_id, self.revision, self.log_last_id,
+                               LOG_PAGE_SIZE + 1, callback=_timed_round_trip('snapshot_catch_up', self.snapshot_checked),
+                               errback=self.poll_failed)
+            return
+        self.async_db.call(fetch_changes, self.db, self.revision, self.log_last_id, LOG_PAGE_SIZE + 1,
+                           callback=_timed_round_trip('poll', self.poll_finished), errback=self.poll_failed)
+
+    def snapshot_checked(self, result):
+        self.poll_pending = False
+        self.snapshot_unconfirmed = False
+        node_id, change, everything = result
+        if everything is not None:
+            # Another database (or an older state of it): the snapshot is of no use
+            self.node_id = node_id
+            self.show_all(everything)
+            self.ui.statusbar.showMessage("Gespeicherter Stand passt nicht zur Datenbank, Tabellen neu geladen", 10000)
+        elif change is not None:
+            self.apply_change_event(change)
+        self.start_change_stream()
+
+    def poll_finished(self, change):
+        self.poll_pending = False
+        if change is not None:
+            self.apply_change_event(change)
+
+    def poll_failed(self, message):
+        self.poll_pending = False
+        self.ui.statusbar.showMessage(message, 10000)
+
+    @_timed_gui
+    def apply_change_event(self, change):
+        # Merges a delta from a poll or pushed by the server
+        if change['revision'] < self.revision:
+            return  # Already picked up by a newer poll or event
+        # Rows with local writes still queued keep their optimistic state
+        pending = self.async_db.has_pending_write
+        for table_type, model in (('guest', self.guest_model), ('team', self.team_model)):
+            delta = change[table_type]
+            model.apply_changes([ind for ind in delta['individuals'] if not pending(ind.id)], delta['deleted'])
+        self.revision = change['revision']
+        if self.ui.searchLineEdit.text():
+            # Changed or new rows must be matched against the active search
+            self.search_tables()
+        self.update_counters()
+        self.append_log_entries(change['log'])
+
+    def stream_state_changed(self, connected):
+        # While connected the poll is only a safety net; without the stream it takes over again
+        self.stream_connected = connected
+        self.poll_timer.setInterval(STREAM_POLL_INTERVAL_MS if connected else POLL_INTERVAL_MS)
+
+    def save_snapshot(self, wait=False):
+        # Saves the tables for the next cold start, if they changed since the last snapshot. Only
+        # a state the database has too: checked against it and without local writes still queued
+        position = (self.revision, self.log_last_id)
+        if (not self.snapshot_path or self.snapshot_unconfirmed or self.async_db.has_pending_writes()
+                or position == self.snapshot_position):
+            return
+        self.snapshot_position = position
+        # Captured here, where the individuals change; encoding and writing happen on the worker
+        tables = {'guest': snapshot.capture(self.guest_manager.individuals),
+                  'team': snapshot.capture(self.team_manager.individuals)}
+        args = (self.snapshot_path, self.node_id, self.revision, self.log_last_id, tables)
+        if wait:
+            try:
+                snapshot.write_snapshot(*args)
+            except (OSError, ValueError):
+                pass  # The previous snapshot stays; it is older, but catching up works from it as well
+        else:
+            self.async_db.call(snapshot.write_snapshot, *args)
+
+    def closeEvent(self, event):
+        if self.change_stream is not None:
+            self.change_stream.stop()
+        self.snapshot_timer.stop()
+        # Give queued writes a chance to reach the database
+        self.async_db.stop()
+        # Deliver the results of the last writes (versions, conflicts) before the final snapshot
+        QtCore.QCoreApplication.processEvents()
+        self.save_snapshot(wait=True)
+        if self.profiler is not None:
+            self.write_profile()
+        super().closeEvent(event)
+
+    def write_profile(self):
+        # Inspect with python -m pstats <prefix>.pstats; the metrics file shows db and round-trip timings
+        self.profiler.disable()
+        self.profiler.dump_stats(f"{self.profile_path}.pstats")
+        with open(f"{self.profile_path}.metrics.txt", 'w', encoding='utf-8') as file:
+            file.write(metrics.REGISTRY.render())
+        self.profiler = None
+
+    def reload_all(self):
+        self.async_db.call(fetch_all, self.db, callback=self.show_all)
+
+    def show_all(self, result):
+        self.revision, guests, team = result
+        self.populate_table(self.ui.guest_table, guests)
+        self.populate_table(self.ui.team_table, team)
+        self.search_tables()
         self.update_counters()
-        self.load_log_to_widget()
+        self.reset_log_widget()
@@ -0,0 +1,175 @@
+# metrics.py
+# In-process instrumentation: counters and latency histograms, rendered in the Prometheus text
+# format. The API server exposes its registry at /metrics; the desk client can dump its own on exit
+# (see MainFrame, CHECKIN_PROFILE). Recording is a lock, a bisect and two additions, cheap enough
+# to stay on for every database call and request.
+
+import bisect
+import contextlib
+import functools
+import threading
+import time
+
+# Upper bounds in seconds: sub-millisecond SQLite reads up to multi-second table loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """
+    Monotonic counter with labels.
+    :param name: Metric name, e.g. 'checkin_db_errors_total'
+    :param documentation: Help text
+    :param labelnames: Names of the labels every observation carries
+    """
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        """
+        Returns the current values as a list of (name, label string, value).
+        """
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+class Histogram:
+    """
+    Latency histogram with labels and cumulative buckets, as Prometheus expects them.
+    :param name: Metric name, e.g. 'checkin_db_call_seconds'
+    :param documentation: Help text
+    :param labelnames: Names of the labels every observation carries
+    :param buckets: Ascending bucket upper bounds in seconds
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts (non-cumulative, +Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += seconds
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """
+        Context manager observing the duration of its block, also when the block raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        """
+        Returns the current values as a list of (name, label string, value), with cumulative
+        _bucket series and _sum and _count per label set.
+        """
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        samples = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_number(bound))])
+                samples.append((f'{self.name}_bucket', labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+class Registry:
+    """
+    The metrics of one process. Metrics are created once (usually at import) and looked up by name.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        Renders all metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_format_number(value)}' for name, labels, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+def timed_calls(histogram, errors=None, expected=(), **labels):
+    """
+    Decorator factory timing every call of the decorated function into histogram, labelled with
+    the given labels plus call=<function name>. Calls that raise are also counted in errors.
+    :param histogram: Histogram with (at least) the label names in labels plus 'call'
+    :param errors: Optional Counter with the same label names
+    :param expected: Exception types that are an outcome of the call rather than an error, not counted in errors
+    """
+    def decorator(function):
+        call_labels = dict(labels, call=function.__name__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if errors is not None and not isinstance(e, expected):
+                    errors.inc(**call_labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, **call_labels)
+        return wrapper
+    return decorator
@@ -0,0 +1,102 @@
+# replication.py
+# Replication between API servers of different venues, each with its own database.
+# A Replicator thread in every server pulls the changes of its peers (GET /replication/changes) in
+# batches, starting after the last change it applied from that peer, and applies them locally
+# (db.apply_replication_changes). Changes carry hybrid logical clock timestamps (hlc.py); each
+# field keeps the newest change, so all servers converge no matter in which order they pull.
+# Changes are forwarded too: a server also serves what it received from its peers, so a chain
+# A <- B <- C reaches A with C's changes, and duplicates are recognised by their timestamp.
+
+import logging
+import sqlite3
+import threading
+import requests
+import db
+
+DEFAULT_INTERVAL_SECONDS = 1.0  # Pause between pull rounds once all peers are caught up
+DEFAULT_BATCH_SIZE = 500  # Changes per request
+REQUEST_TIMEOUT_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+class Replicator:
+    """
+    Background thread pulling changes from peer servers.
+    :param peers: Base URLs of the peer servers, e.g. ['http://10.0.0.2:5000']
+    :param interval: Seconds between pull rounds while there is nothing new
+    :param batch_size: Changes per request; a full batch is followed by the next one right away
+    :param on_applied: Optional callable run after changes were applied (e.g. to wake up event streams)
+    """
+    def __init__(self, peers, interval=DEFAULT_INTERVAL_SECONDS, batch_size=DEFAULT_BATCH_SIZE, on_applied=None):
+        self.peers = [peer.rstrip('/') for peer in peers]
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_applied = on_applied
+        self.session = requests.Session()
+        self._failing = set()  # Peers whose last pull failed, so an outage is logged once
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='replicator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.pull_all()
+            self._stop.wait(self.interval)
+        db.release_connection()
+
+    def pull_all(self):
+        """
+        Pulls from every peer until it is caught up; unreachable peers, and changes the database
+        could not take (e.g. while locked by an import), are retried next round.
+        :return: Number of changes applied
+        """
+        applied = 0
+        for peer in self.peers:
+            try:
+                applied += self.pull(peer)
+            except (requests.RequestException, ValueError, sqlite3.Error) as error:
+                if peer not in self._failing:
+                    self._failing.add(peer)
+                    logger.warning('Replication from %s failed, retrying: %s', peer, error)
+                continue
+            if peer in self._failing:
+                self._failing.discard(peer)
+                logger.warning('Replication from %s resumed', peer)
+        return applied
+
+    def pull(self, peer):
+        """
+        Pulls and applies the new changes of one peer, batch by batch.
+        :return: Number of changes applied
+        """
+        node_id, last_seq = db.get_replication_cursor(peer)
+        applied = 0
+        while not self._stop.is_set():
+            response = self.session.get(f'{peer}/replication/changes', timeout=REQUEST_TIMEOUT_SECONDS,
+                                        params={'after': last_seq, 'limit': self.batch_size,
+                                                'exclude_origin': db.get_node_id()})
+            response.raise_for_status()
+            data = response.json()
+            if data['node_id'] != node_id and node_id is not None:
+                # The peer has a new database, its sequence numbers start over
+                logger.info('Peer %s changed its node id to %s, pulling from the start', peer, data['node_id'])
+                node_id, last_seq = data['node_id'], 0
+                continue
+            node_id = data['node_id']
+            if data['last_seq'] == last_seq:
+                break
+            count = db.apply_replication_changes(peer, node_id, data['changes'], data['last_seq'])
+            last_seq = data['last_seq']
+            if count and self.on_applied is not None:
+                self.on_applied()
+            applied += count
+        return applied
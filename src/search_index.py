@@ -0,0 +1,157 @@
+# search_index.py
+# In-memory search index for individuals, used by CheckInOutManager.search and the table search bar.
+# Text is normalized German-aware (ä -> ae, ß -> ss, accents dropped), split into words and indexed
+# by word and by trigram. Queries work on the vocabulary of distinct words instead of every
+# individual, and tolerate one typo per search word.
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# German umlauts and ß are spelled out, so "Müller", "Mueller" and "MÜLLER" normalize alike
+_REPLACEMENTS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+# Words shorter than this must match exactly (as substring); longer ones may contain one typo
+MIN_FUZZY_LENGTH = 4
+
+def normalize(text):
+    """
+    Normalizes text for searching: lowercase, umlauts spelled out, accents and punctuation removed.
+    :param text: Any value, converted with str()
+    :return: Normalized string with words separated by single spaces
+    """
+    text = str(text).lower().translate(_REPLACEMENTS)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(' ', text).strip()
+
+@lru_cache(maxsize=65536)
+def _words(text):
+    # Names, groups and genders repeat a lot across a roster, so the split words are cached
+    return tuple(normalize(text).split())
+
+def _trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+def _within_one_edit(a, b):
+    """
+    Returns True if a and b differ by at most one insertion, deletion or substitution.
+    """
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+class SearchIndex:
+    """
+    Word and trigram index over the searchable fields of individuals.
+    Additions are queued and indexed on the next search, so bulk loads and imports do not pay
+    for indexing until somebody actually searches.
+    """
+    FIELDS = ('name', 'vorname', 'reisegruppe', 'alter', 'geschlecht', 'notiz')
+
+    def __init__(self):
+        self._words_by_id = {}  # individual id -> set of words
+        self._ids_by_word = {}  # word -> set of individual ids
+        self._words_by_trigram = {}  # trigram -> set of words
+        self._pending = {}  # individual id -> Individual waiting to be indexed
+
+    def add(self, individual):
+        """
+        Queues an individual for indexing (replacing a previous entry with the same id).
+        :param individual: Individual to index
+        """
+        self._pending[individual.id] = individual
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        for individual in pending.values():
+            self._add_now(individual)
+
+    def _add_now(self, individual):
+        self._remove_now(individual.id)
+        words = set()
+        for field in self.FIELDS:
+            words.update(_words(str(getattr(individual, field))))
+        self._words_by_id[individual.id] = words
+        for word in words:
+            ids = self._ids_by_word.get(word)
+            if ids is None:
+                ids = self._ids_by_word[word] = set()
+                for gram in _trigrams(word):
+                    self._words_by_trigram.setdefault(gram, set()).add(word)
+            ids.add(individual.id)
+
+    def remove(self, individual_id):
+        """
+        Removes an individual from the index.
+        :param individual_id: Id of the individual
+        """
+        self._pending.pop(individual_id, None)
+        self._remove_now(individual_id)
+
+    def _remove_now(self, individual_id):
+        words = self._words_by_id.pop(individual_id, None)
+        if not words:
+            return
+        for word in words:
+            ids = self._ids_by_word[word]
+            ids.discard(individual_id)
+            if not ids:
+                del self._ids_by_word[word]
+                for gram in _trigrams(word):
+                    grams = self._words_by_trigram[gram]
+                    grams.discard(word)
+                    if not grams:
+                        del self._words_by_trigram[gram]
+
+    def _matching_words(self, term, fuzzy):
+        grams = _trigrams(term)
+        if not grams:
+            # Too short for trigrams, the vocabulary is small enough to scan
+            return [word for word in self._ids_by_word if term in word]
+        # Words containing the term contain all of its trigrams
+        candidates = set.intersection(*(self._words_by_trigram.get(gram, set()) for gram in grams))
+        matches = [word for word in candidates if term in word]
+        if fuzzy and len(term) >= MIN_FUZZY_LENGTH:
+            # One edit changes at most three trigrams, so a word with a typo usually still shares one
+            near = set()
+            for gram in grams:
+                near |= self._words_by_trigram.get(gram, set())
+            for word in near - candidates:
+                # Compare against the word and its prefixes, so typos also match while typing
+                if any(_within_one_edit(term, word[:length])
+                       for length in (len(term) - 1, len(term), len(term) + 1) if length <= len(word)):
+                    matches.append(word)
+        return matches
+
+    def search(self, query, fuzzy=True):
+        """
+        Returns the ids of individuals matching every word of the query.
+        A query word matches an indexed word containing it, or (if fuzzy) one typo away from it.
+        :param query: Search string
+        :param fuzzy: Whether to tolerate one typo per query word
+        :return: Set of matching ids, or None for an empty query (no filtering)
+        """
+        terms = normalize(query).split()
+        if not terms:
+            return None
+        self._flush()
+        result = None
+        for term in terms:
+            ids = set()
+            for word in self._matching_words(term, fuzzy):
+                ids |= self._ids_by_word[word]
+            result = ids if result is None else result & ids
+            if not result:
+                break
+        return result
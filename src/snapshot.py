@@ -0,0 +1,217 @@
+# snapshot.py
+# Compact binary snapshots of a desk's state for a fast cold start.
+# A snapshot holds both tables column by column (NumPy arrays for numbers and flags, one UTF-8 blob
+# per text column) plus the revision and log high-water mark they correspond to. Reading maps the
+# file and turns the columns into Individuals without any database or network round trip; the
+# desk then catches up with only the changes made since that revision (see MainFrame).
+#
+# File layout: MAGIC, a 4-byte header length, a JSON header describing the arrays, then the raw
+# arrays, each starting at a multiple of ALIGNMENT so they can be used straight from the mapping.
+
+import gc
+import json
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+from backend import Individual
+
+MAGIC = b'CHECKIN-SNAPSHOT'
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+TABLE_TYPES = ('guest', 'team')
+TEXT_COLUMNS = ('name', 'vorname', 'notiz', 'ticket')
+# Few distinct values repeated across the roster: stored once each plus a code per row, and
+# read back as one shared string object per value (what backend.Individual interns them for)
+CATEGORY_COLUMNS = ('reisegruppe', 'geschlecht')
+SEPARATOR = '\0'  # Joins the values of a text column; a value containing it cannot be stored
+_AGE_INT, _AGE_NONE, _AGE_TEXT = 0, 1, 2
+_PRESENT, _EVACUATED = 1, 2
+
+class Snapshot:
+    """
+    State read from a snapshot file.
+    :param node_id: Node id of the database the state came from
+    :param revision: Database revision the tables correspond to
+    :param log_last_id: Newest log entry the desk had seen, or None
+    :param tables: Dict table_type -> list of Individuals
+    """
+    def __init__(self, node_id, revision, log_last_id, tables):
+        self.node_id = node_id
+        self.revision = revision
+        self.log_last_id = log_last_id
+        self.tables = tables
+
+def capture(individuals):
+    """
+    Copies the fields of individuals into plain tuples, so the snapshot can be encoded and
+    written on another thread while the window keeps changing the Individuals.
+    :return: List of (id, version, anwesend, evakuiert, alter, name, vorname, notiz, ticket, reisegruppe, geschlecht)
+    """
+    return [(ind.id, ind.version, ind.anwesend, ind.evakuiert, ind.alter, ind.name, ind.vorname,
+             ind.notiz, ind.ticket, ind.reisegruppe, ind.geschlecht) for ind in individuals]
+
+def _aligned(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+def _encode_text(values):
+    # -> (UTF-8 blob, None mask or None if no value is None)
+    none_mask = None
+    if any(value is None for value in values):
+        none_mask = np.fromiter((value is None for value in values), dtype=np.uint8, count=len(values))
+        values = ['' if value is None else value for value in values]
+    joined = SEPARATOR.join(values)
+    if joined.count(SEPARATOR) != max(len(values) - 1, 0):
+        raise ValueError('Text value contains a NUL character')
+    return np.frombuffer(joined.encode('utf-8'), dtype=np.uint8), none_mask
+
+def _encode_table(rows):
+    # -> dict of column name -> array
+    columns = list(zip(*rows)) if rows else [()] * 11
+    ids, versions, present, evacuated, ages = columns[:5]
+    arrays = {
+        'id': np.array(ids, dtype=np.int64),
+        'version': np.array(versions, dtype=np.int64),
+        'flags': (np.array(present, dtype=np.uint8) * _PRESENT) | (np.array(evacuated, dtype=np.uint8) * _EVACUATED),
+    }
+    # Ages are ints, None, or text that was not a number (see backend._to_age)
+    kinds = np.array([_AGE_INT if type(age) is int else _AGE_NONE if age is None else _AGE_TEXT for age in ages],
+                     dtype=np.uint8)
+    arrays['age'] = np.array([age if type(age) is int else 0 for age in ages], dtype=np.int64)
+    if kinds.any():
+        arrays['age_kind'] = kinds
+        texts = [str(age) for age in ages if age is not None and type(age) is not int]
+        if texts:
+            arrays['age_text'], _ = _encode_text(texts)
+    for name, values in zip(TEXT_COLUMNS, columns[5:9]):
+        arrays[name], none_mask = _encode_text(list(values))
+        if none_mask is not None:
+            arrays[f'{name}_none'] = none_mask
+    for name, values in zip(CATEGORY_COLUMNS, columns[9:]):
+        categories = {}
+        arrays[f'{name}_code'] = np.array([categories.setdefault(value, len(categories)) for value in values],
+                                          dtype=np.uint32)
+        arrays[name], none_mask = _encode_text(list(categories))
+        if none_mask is not None:
+            arrays[f'{name}_none'] = none_mask
+    return arrays
+
+def write_snapshot(path, node_id, revision, log_last_id, tables):
+    """
+    Writes a snapshot atomically (a reader sees the old or the new file, never a partial one).
+    :param path: Snapshot file path
+    :param node_id: Node id of the database the state came from (see db.get_node_id)
+    :param revision: Database revision the tables correspond to
+    :param log_last_id: Newest log entry seen, or None
+    :param tables: Dict table_type -> rows from capture()
+    :raises ValueError: If a text value cannot be stored
+    """
+    arrays = []
+    entries = {}
+    offset = 0
+    for table_type in TABLE_TYPES:
+        rows = tables[table_type]
+        entries[table_type] = {'count': len(rows), 'arrays': {}}
+        for name, array in _encode_table(rows).items():
+            entries[table_type]['arrays'][name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+            arrays.append((offset, array))
+            offset += _aligned(array.nbytes)
+    header = json.dumps({'format': FORMAT_VERSION, 'node_id': node_id, 'revision': revision,
+                         'log_last_id': log_last_id, 'tables': entries}).encode('utf-8')
+    # The data starts aligned after magic, header length and header
+    data_start = _aligned(len(MAGIC) + 4 + len(header))
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        for array_offset, array in arrays:
+            file.seek(data_start + array_offset)
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+def _decode_text(buffer, entry, count, none_entry=None):
+    values = bytes(buffer[entry['offset']:entry['offset'] + entry['length']]).decode('utf-8').split(SEPARATOR)
+    if count == 0:
+        return []
+    if none_entry is not None:
+        none_mask = _array(buffer, none_entry)
+        values = [None if is_none else value for value, is_none in zip(values, none_mask.tolist())]
+    return values
+
+def _array(buffer, entry):
+    return np.frombuffer(buffer, dtype=np.dtype(entry['dtype']), count=entry['length'], offset=entry['offset'])
+
+def _decode_table(buffer, table):
+    count = table['count']
+    entries = table['arrays']
+    ids = _array(buffer, entries['id']).tolist()
+    versions = _array(buffer, entries['version']).tolist()
+    flags = _array(buffer, entries['flags'])
+    present = (flags & _PRESENT).astype(bool).tolist()
+    evacuated = (flags & _EVACUATED).astype(bool).tolist()
+    ages = _array(buffer, entries['age']).tolist()
+    if 'age_kind' in entries:
+        kinds = _array(buffer, entries['age_kind'])
+        texts = iter(_decode_text(buffer, entries['age_text'], int((kinds == _AGE_TEXT).sum()))
+                     if 'age_text' in entries else ())
+        ages = [age if kind == _AGE_INT else None if kind == _AGE_NONE else next(texts)
+                for age, kind in zip(ages, kinds.tolist())]
+    texts = [_decode_text(buffer, entries[name], count, entries.get(f'{name}_none')) for name in TEXT_COLUMNS]
+    for name in CATEGORY_COLUMNS:
+        codes = _array(buffer, entries[f'{name}_code'])
+        categories = _decode_text(buffer, entries[name], int(codes.max()) + 1 if count else 0, entries.get(f'{name}_none'))
+        categories = [sys.intern(value) if value is not None else None for value in categories]
+        texts.append(list(map(categories.__getitem__, codes.tolist())))
+    individuals = []
+    # Individual.__init__ would convert and intern again and draw a temporary id; the values
+    # are already in their final form, so the slots are filled directly
+    for (ind_id, version, anwesend, evakuiert, alter, name, vorname, notiz, ticket, reisegruppe,
+         geschlecht) in zip(ids, versions, present, evacuated, ages, *texts):
+        ind = Individual.__new__(Individual)
+        ind.id = ind_id
+        ind.name = name
+        ind.vorname = vorname
+        ind.reisegruppe = reisegruppe
+        ind.alter = alter
+        ind.geschlecht = geschlecht
+        ind.anwesend = anwesend
+        ind.evakuiert = evakuiert
+        ind.notiz = notiz
+        ind.version = version
+        ind.ticket = ticket
+        individuals.append(ind)
+    return individuals
+
+def read_snapshot(path):
+    """
+    Reads a snapshot by mapping the file.
+    :param path: Snapshot file path
+    :return: Snapshot, or None if there is no usable snapshot (missing, damaged or another format)
+    """
+    try:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(MAGIC)] != MAGIC:
+                return None
+            (header_length,) = struct.unpack_from('<I', mapped, len(MAGIC))
+            header_end = len(MAGIC) + 4 + header_length
+            header = json.loads(mapped[len(MAGIC) + 4:header_end])
+            if header.get('format') != FORMAT_VERSION:
+                return None
+            data_start = _aligned(header_end)
+            buffer = memoryview(mapped)[data_start:]
+            # Hundreds of thousands of new objects would trigger collections over and over, which
+            # find nothing to free here; pausing the collector makes reading 2-3 times faster
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                tables = {table_type: _decode_table(buffer, header['tables'][table_type]) for table_type in TABLE_TYPES}
+            finally:
+                if gc_enabled:
+                    gc.enable()
+                buffer.release()
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    return Snapshot(header['node_id'], header['revision'], header['log_last_id'], tables)
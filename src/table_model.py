@@ -0,0 +1,300 @@
+# table_model.py
+# Model/view classes for the guest and team tables.
+# The model reads directly from the in-memory list of backend.Individual objects, so the
+# view only asks for the cells that are actually visible. Presence and evacuation toggles
+# are painted by a delegate instead of one QPushButton widget per row.
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+HEADERS = ["Name", "Vorname", "Reisegruppe", "Alter", "Geschlecht", "Anwesend", "Evakuiert", "Notiz"]
+PRESENT_COLUMN = 5
+EVACUATED_COLUMN = 6
+NOTE_COLUMN = 7
+
+# Attributes shown in the table; a delta row equal in all of them needs no repaint
+_FIELDS = ('name', 'vorname', 'reisegruppe', 'alter', 'geschlecht', 'anwesend', 'evakuiert', 'notiz')
+
+def _unchanged(old, new):
+    return all(getattr(old, field) == getattr(new, field) for field in _FIELDS)
+
+def _text_key(field):
+    return lambda ind: str(getattr(ind, field)).lower()
+
+def _age_key(ind):
+    # Numbers sort before anything that is not a number
+    try:
+        return (0, int(ind.alter), '')
+    except (TypeError, ValueError):
+        return (1, 0, str(ind.alter))
+
+# Sort key per column; sorting runs on the Python list instead of calling data() per comparison
+_SORT_KEYS = [_text_key('name'), _text_key('vorname'), _text_key('reisegruppe'), _age_key, _text_key('geschlecht'),
+              lambda ind: bool(ind.anwesend), lambda ind: bool(ind.evakuiert), _text_key('notiz')]
+
+class IndividualTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model backed by the individuals of a CheckInOutManager.
+    Status toggles and note edits go through the manager (keeping its indexes current) and are
+    reported through signals, so the owner can persist them.
+    """
+    presence_toggled = QtCore.pyqtSignal(object, bool)  # (individual, anwesend)
+    evacuation_toggled = QtCore.pyqtSignal(object, bool)  # (individual, evakuiert)
+    note_edited = QtCore.pyqtSignal(object)  # (individual)
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self._sort_column = None
+        self._sort_order = QtCore.Qt.SortOrder.AscendingOrder
+
+    @property
+    def individuals(self):
+        return self.manager.individuals
+
+    def set_individuals(self, individuals):
+        """
+        Replaces all rows of the model.
+        :param individuals: New list of individuals (kept by reference)
+        """
+        self.beginResetModel()
+        self.manager.set_individuals(individuals)
+        self._sort_rows()
+        self.endResetModel()
+
+    def append_individuals(self, individuals):
+        """
+        Appends new individuals at the end of the model.
+        :param individuals: List of individuals to add
+        """
+        if not individuals:
+            return
+        first = len(self.individuals)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(individuals) - 1)
+        for ind in individuals:
+            self.manager.add_individual(ind)
+        self.endInsertRows()
+        if self._sort_column is not None:
+            # Move the new rows to their sorted place
+            self.sort(self._sort_column, self._sort_order)
+
+    def apply_changes(self, changed, deleted_ids):
+        """
+        Merges a delta from the database: changed rows are replaced in place, unknown ones
+        are appended and deleted ones are removed.
+        :param changed: List of changed or new individuals
+        :param deleted_ids: Ids of deleted individuals
+        """
+        deleted_ids = set(deleted_ids)
+        if any(self.manager.get_by_id(ind_id) is not None for ind_id in deleted_ids):
+            # Deletions are rare (bulk saves, clear), a reset is simpler than many row removals
+            self.beginResetModel()
+            self.manager.remove_by_ids(deleted_ids)
+            self.endResetModel()
+        new_individuals = []
+        for ind in changed:
+            if ind.id in deleted_ids:
+                continue
+            existing = self.manager.get_by_id(ind.id)
+            if existing is None:
+                new_individuals.append(ind)
+            elif not _unchanged(existing, ind):
+                self.manager.replace_individual(ind)
+                self._emit_row_changed(self.manager.get_position(ind.id))
+            elif existing.ticket != ind.ticket:
+                # Not shown in the table, but the manager's ticket index must follow
+                self.manager.replace_individual(ind)
+            else:
+                # Echo of this desk's own write: nothing to repaint, only the row version moved
+                existing.version = ind.version
+        self.append_individuals(new_individuals)
+
+    def set_status_for_ids(self, individual_ids, anwesend=None, evakuiert=None):
+        """
+        Sets the status of several individuals (a group or selection) through the manager and
+        repaints their status cells with one dataChanged.
+        :return: List of the individuals whose status actually changed
+        """
+        changed = self.manager.set_status_by_ids(individual_ids, anwesend, evakuiert)
+        rows = [self.manager.get_position(ind.id) for ind in changed]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), PRESENT_COLUMN), self.index(max(rows), EVACUATED_COLUMN))
+        return changed
+
+    def row_changed(self, individual_id):
+        """
+        Notifies views that a single individual changed, so only its row is repainted.
+        :param individual_id: Id of the changed individual
+        """
+        row = self.manager.get_position(individual_id)
+        if row is not None:
+            self._emit_row_changed(row)
+
+    def sort(self, column, order=QtCore.Qt.SortOrder.AscendingOrder):
+        """
+        Sorts the rows by a column. Rows keep their place when their data changes later,
+        so toggling a status never moves the row under the user's cursor.
+        """
+        self._sort_column = column
+        self._sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        # Persistent indexes (selection, current cell, open editors) follow their individual
+        old_indexes = self.persistentIndexList()
+        old_ids = [self.individuals[index.row()].id for index in old_indexes]
+        self._sort_rows()
+        new_indexes = [self.index(self.manager.get_position(ind_id), index.column())
+                       for ind_id, index in zip(old_ids, old_indexes)]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def _sort_rows(self):
+        if self._sort_column is not None:
+            self.manager.sort_individuals(_SORT_KEYS[self._sort_column],
+                                          reverse=self._sort_order == QtCore.Qt.SortOrder.DescendingOrder)
+
+    def _emit_row_changed(self, row, first_column=0, last_column=len(HEADERS) - 1):
+        self.dataChanged.emit(self.index(row, first_column), self.index(row, last_column))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.individuals)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        individual = self.individuals[index.row()]
+        column = index.column()
+        if role in (QtCore.Qt.ItemDataRole.DisplayRole, QtCore.Qt.ItemDataRole.EditRole):
+            if column == 0:
+                return individual.name
+            if column == 1:
+                return individual.vorname
+            if column == 2:
+                return individual.reisegruppe
+            if column == 3:
+                return str(individual.alter)
+            if column == 4:
+                return individual.geschlecht
+            if column == PRESENT_COLUMN:
+                return "Yes" if individual.anwesend else "No"
+            if column == EVACUATED_COLUMN:
+                # Evacuation can only be set for present individuals
+                if not individual.anwesend:
+                    return ""
+                return "Yes" if individual.evakuiert else "No"
+            if column == NOTE_COLUMN:
+                return individual.notiz
+        elif role == QtCore.Qt.ItemDataRole.UserRole:
+            # Raw boolean state, used by the status delegate
+            if column == PRESENT_COLUMN:
+                return individual.anwesend
+            if column == EVACUATED_COLUMN:
+                return individual.evakuiert if individual.anwesend else None
+        elif role == QtCore.Qt.ItemDataRole.TextAlignmentRole and column == NOTE_COLUMN:
+            return QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.ItemFlag.NoItemFlags
+        flags = QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable
+        if index.column() == NOTE_COLUMN:
+            flags |= QtCore.Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=QtCore.Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != QtCore.Qt.ItemDataRole.EditRole:
+            return False
+        individual = self.individuals[index.row()]
+        column = index.column()
+        if column == PRESENT_COLUMN:
+            self.manager.set_presence_by_id(individual.id, bool(value))
+            if not individual.anwesend:
+                # Leaving also clears the evacuation status
+                self.manager.set_evacuated_by_id(individual.id, False)
+            self._emit_row_changed(index.row(), PRESENT_COLUMN, EVACUATED_COLUMN)
+            self.presence_toggled.emit(individual, individual.anwesend)
+            return True
+        if column == EVACUATED_COLUMN:
+            if not individual.anwesend:
+                return False
+            self.manager.set_evacuated_by_id(individual.id, bool(value))
+            self._emit_row_changed(index.row(), EVACUATED_COLUMN, EVACUATED_COLUMN)
+            self.evacuation_toggled.emit(individual, individual.evakuiert)
+            return True
+        if column == NOTE_COLUMN:
+            if individual.notiz == value:
+                return False
+            self.manager.update_note_by_id(individual.id, value)
+            self._emit_row_changed(index.row(), NOTE_COLUMN, NOTE_COLUMN)
+            self.note_edited.emit(individual)
+            return True
+        return False
+
+class SearchFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """
+    Proxy that hides rows whose individual id is not in the current search result.
+    The matching is done by the manager's search index, so filtering never reads cell text.
+    Sorting is delegated to the source model, which sorts its list with key functions.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._matching_ids = None  # None means no search active
+
+    def set_matching_ids(self, ids):
+        """
+        Shows only the given individuals.
+        :param ids: Set of matching ids, or None to show all rows
+        """
+        self._matching_ids = ids
+        self.invalidateFilter()
+
+    def sort(self, column, order=QtCore.Qt.SortOrder.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._matching_ids is None:
+            return True
+        return self.sourceModel().individuals[source_row].id in self._matching_ids
+
+class StatusButtonDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints a Yes/No toggle button for a boolean status column and toggles it on click
+    (or space key), without creating a widget per row.
+    """
+    ON_COLOR = QtGui.QColor("lightgreen")
+    OFF_COLOR = QtGui.QColor("lightcoral")
+
+    def paint(self, painter, option, index):
+        state = index.data(QtCore.Qt.ItemDataRole.UserRole)
+        if state is None:
+            # No button for this cell (e.g. evacuation of an absent individual)
+            super().paint(painter, option, index)
+            return
+        painter.save()
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        painter.setPen(option.palette.color(QtGui.QPalette.ColorRole.Mid))
+        painter.setBrush(self.ON_COLOR if state else self.OFF_COLOR)
+        painter.drawRoundedRect(QtCore.QRectF(rect), 3, 3)
+        painter.setPen(QtGui.QColor("black"))
+        painter.drawText(rect, QtCore.Qt.AlignmentFlag.AlignCenter, "Yes" if state else "No")
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        state = index.data(QtCore.Qt.ItemDataRole.UserRole)
+        if state is None:
+            return False
+        event_type = event.type()
+        if event_type == QtCore.QEvent.Type.MouseButtonRelease:
+            if event.button() == QtCore.Qt.MouseButton.LeftButton and option.rect.contains(event.position().toPoint()):
+                return model.setData(index, not state, QtCore.Qt.ItemDataRole.EditRole)
+        elif event_type == QtCore.QEvent.Type.KeyPress and event.key() in (QtCore.Qt.Key.Key_Space, QtCore.Qt.Key.Key_Select):
+            return model.setData(index, not state, QtCore.Qt.ItemDataRole.EditRole)
+        return False
@@ -0,0 +1,172 @@
+# timeline.py
+# Occupancy over time: how many individuals were present (and evacuated) at any point of the
+# event, overall, per reisegruppe and per table_type, computed from the status events (db.load_events).
+# An OccupancyTimeline reads each event once: new events are turned into +1/-1 changes with pandas
+# and added to per-minute totals, so a refresh costs only the events recorded since the last one.
+# A series is then a cumulative sum over those totals, sampled with one searchsorted call.
+#
+# Counts follow the events: an individual counts for the group and table_type its events were
+# recorded with. Events from replication peers can be older than events already read; they are
+# added to their minute all the same, so the counts are right once every event has arrived.
+
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+MINUTE_MS = 60000
+MAX_POINTS = 2000  # Points per series, larger requests are refused
+# Default steps in minutes, the smallest that keeps a series under DEFAULT_POINTS is used
+DEFAULT_STEPS = (1, 5, 15, 30, 60, 120, 360, 720, 1440)
+DEFAULT_POINTS = 300
+EVENT_BATCH = 50000  # Events per read while catching up
+FIELDS = ('anwesend', 'evakuiert')
+_KEYS = ['minute', 'table_type', 'reisegruppe']
+_PRESENCE_DELTAS = {'arrived': 1, 'left': -1}
+_EVACUATION_DELTAS = {'evacuated': 1, 'evacuation_cleared': -1}
+
+class OccupancyTimeline:
+    """
+    Presence over time built from a database backend's status events, kept up to date incrementally.
+    Safe to use from several threads.
+    :param db: Backend with load_events(after_id=..., limit=...), i.e. the db module or a NetworkDB
+    """
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.last_event_id = None  # Newest event read
+        self._first_event_id = None  # Oldest event read, gone once the events were cleared
+        self._state = pd.DataFrame(columns=list(FIELDS), dtype=np.int64)  # Status per individual id
+        index = pd.MultiIndex.from_arrays([[], [], []], names=_KEYS)
+        # Changes per (minute, table_type, reisegruppe)
+        self._deltas = pd.DataFrame({field: pd.Series([], dtype=np.int64) for field in FIELDS}, index=index)
+
+    def refresh(self):
+        """
+        Reads the events recorded since the last refresh. Starts over if the events were cleared.
+        :return: Number of events read
+        """
+        with self._lock:
+            if self._first_event_id is not None:
+                first = self.db.load_events(after_id=self._first_event_id - 1, limit=1)
+                if not first or first[0][0] != self._first_event_id:
+                    self._reset()
+            read = 0
+            while True:
+                events = self.db.load_events(after_id=self.last_event_id or 0, limit=EVENT_BATCH)
+                if events:
+                    self._add_events(events)
+                    read += len(events)
+                if len(events) < EVENT_BATCH:
+                    return read
+
+    def _add_events(self, events):
+        frame = pd.DataFrame.from_records(events, columns=['id', 'ts', 'individual_id', 'table_type',
+                                                           'reisegruppe', 'event_type'])
+        if self._first_event_id is None:
+            self._first_event_id = int(frame['id'].iat[0])
+        self.last_event_id = int(frame['id'].iat[-1])
+        individual = frame['individual_id']
+        deltas = pd.DataFrame({
+            'anwesend': frame['event_type'].map(_PRESENCE_DELTAS).fillna(0).astype(np.int64),
+            'evakuiert': frame['event_type'].map(_EVACUATION_DELTAS).fillna(0).astype(np.int64),
+        })
+        # A removed individual stops counting with whatever status it had at that moment: its
+        # state before this batch plus its changes in the batch up to the removal
+        removed = (frame['event_type'] == 'removed').to_numpy()
+        if removed.any():
+            initial = self._state.reindex(individual).fillna(0).to_numpy(dtype=np.int64)
+            status = deltas.groupby(individual.to_numpy()).cumsum().to_numpy() + initial
+            deltas.loc[removed, list(FIELDS)] = -status[removed]
+        changes = deltas.groupby(individual.to_numpy()).sum()
+        state = self._state.add(changes, fill_value=0).astype(np.int64)
+        self._state = state.drop(frame.loc[removed, 'individual_id'].unique(), errors='ignore')
+        # An event counts from the first full minute at or after it, so a point on a minute shows
+        # everything that happened up to that instant
+        deltas['minute'] = -(-frame['ts'] // MINUTE_MS) * MINUTE_MS
+        deltas['table_type'] = frame['table_type'].fillna('')
+        deltas['reisegruppe'] = frame['reisegruppe'].fillna('')
+        per_minute = deltas.groupby(_KEYS).sum()
+        self._deltas = self._deltas.add(per_minute, fill_value=0).astype(np.int64)
+
+    def series(self, start=None, end=None, step=None):
+        """
+        Present and evacuated counts at evenly spaced points in time, after reading new events.
+        :param start: First point in epoch milliseconds, rounded down to a minute (default: the first event)
+        :param end: Epoch milliseconds the series reaches, its last point is the first at or after it (default: now)
+        :param step: Milliseconds between points, a positive multiple of a minute (default: one of DEFAULT_STEPS)
+        :return: {'times': [ms, ...], 'total': {'anwesend': [...], 'evakuiert': [...]},
+                  'by_group': {reisegruppe: {...}}, 'by_table': {table_type: {...}}}
+        :raises ValueError: For a step that is not a multiple of a minute, or more than MAX_POINTS points
+        """
+        self.refresh()
+        with self._lock:
+            deltas = self._deltas
+        minutes = deltas.index.get_level_values('minute')
+        now = int(time.time() * 1000)
+        default_start = start is None
+        if default_start:
+            start = int(minutes.min()) if len(deltas) else now
+        if end is None:
+            end = max(now, start)
+        if step is None:
+            span = max(end - start, 0)
+            day = DEFAULT_STEPS[-1] * MINUTE_MS
+            step = next((step_minutes * MINUTE_MS for step_minutes in DEFAULT_STEPS
+                         if span // (step_minutes * MINUTE_MS) < DEFAULT_POINTS), -(-span // (DEFAULT_POINTS * day)) * day)
+            if default_start:
+                start -= start % step  # Points on full steps, e.g. every full quarter of an hour
+        start -= start % MINUTE_MS  # The totals are per minute, points in between would miss events
+        if step <= 0 or step % MINUTE_MS:
+            raise ValueError(f'step must be a positive multiple of {MINUTE_MS} ms')
+        points = -(-(end - start) // step) + 1
+        if end < start or points > MAX_POINTS:
+            raise ValueError(f'A timeline has 1 to {MAX_POINTS} points')
+        times = start + step * np.arange(points, dtype=np.int64)
+        total = self._sample(deltas.groupby(level='minute').sum(), times)
+        return {
+            'times': times.tolist(),
+            'total': {field: values for (field,), values in total.items()} if total else
+                     {field: [0] * len(times) for field in FIELDS},
+            'by_group': self._sample_by(deltas, 'reisegruppe', times),
+            'by_table': self._sample_by(deltas, 'table_type', times),
+        }
+
+    @staticmethod
+    def _sample(per_minute, times):
+        # Counts of every column at each point: the running total of the last minute at or before it
+        # per_minute: frame indexed by minute; returns {column key: list of counts}
+        if per_minute.empty:
+            return {}
+        per_minute = per_minute.sort_index()
+        totals = per_minute.to_numpy().cumsum(axis=0)
+        positions = np.searchsorted(per_minute.index.to_numpy(), times, side='right') - 1
+        sampled = np.where((positions >= 0)[:, None], totals[positions.clip(0)], 0)
+        keys = [column if isinstance(column, tuple) else (column,) for column in per_minute.columns]
+        return dict(zip(keys, sampled.T.tolist()))
+
+    @classmethod
+    def _sample_by(cls, deltas, level, times):
+        # One column per field and key, so all series are summed up and sampled at once
+        wide = deltas.groupby(level=['minute', level]).sum().unstack(level, fill_value=0)
+        series = {}
+        for (field, key), values in cls._sample(wide, times).items():
+            series.setdefault(key, {})[field] = values
+        return series
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared():
+    """
+    Returns this process's timeline of the local database (see db.load_timeline).
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            import db
+            _shared = OccupancyTimeline(db)
+        return _shared
@@ -0,0 +1,159 @@
+# timeline_chart.py
+# Chart of present and evacuated individuals over time (see timeline.py and db.load_timeline).
+# Painted with QPainter, so it needs nothing beyond PyQt6; hovering shows the counts at that time.
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+REFRESH_MS = 60000  # Reload interval while the window is open
+SERIES = (("anwesend", "Anwesend", QtGui.QColor("seagreen")),
+          ("evakuiert", "Evakuiert", QtGui.QColor("orangered")))
+TABLE_LABELS = {'guest': "Gäste", 'team': "Team"}
+
+class OccupancyChart(QtWidgets.QWidget):
+    """
+    Step chart of one timeline scope: a line per series, time on the x axis.
+    """
+    MARGINS = QtCore.QMargins(48, 12, 16, 28)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.times = []
+        self.values = {}  # Field -> list of counts, aligned with times
+        self.setMinimumSize(480, 240)
+        self.setMouseTracking(True)
+
+    def set_series(self, times, values):
+        """
+        :param times: Points in epoch milliseconds
+        :param values: Dict field ('anwesend', 'evakuiert') -> counts at those points
+        """
+        self.times = times
+        self.values = values
+        self.update()
+
+    def _plot_rect(self):
+        return QtCore.QRectF(self.rect().marginsRemoved(self.MARGINS))
+
+    def _maximum(self):
+        return max([max(values, default=0) for values in self.values.values()] + [1])
+
+    def _x(self, rect, index):
+        return rect.left() + rect.width() * index / max(len(self.times) - 1, 1)
+
+    @staticmethod
+    def _time_text(ms, with_date=False):
+        time = QtCore.QDateTime.fromMSecsSinceEpoch(ms)
+        return time.toString("dd.MM. HH:mm" if with_date else "HH:mm")
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        rect = self._plot_rect()
+        text_color = self.palette().color(QtGui.QPalette.ColorRole.Text)
+        painter.setPen(self.palette().color(QtGui.QPalette.ColorRole.Mid))
+        painter.drawRect(rect)
+        if not self.times:
+            painter.setPen(text_color)
+            painter.drawText(rect, QtCore.Qt.AlignmentFlag.AlignCenter, "Noch keine Statusänderungen")
+            return
+        maximum = self._maximum()
+        painter.setPen(text_color)
+        for fraction in (0, 0.5, 1):
+            y = rect.bottom() - rect.height() * fraction
+            painter.drawText(QtCore.QRectF(0, y - 8, self.MARGINS.left() - 6, 16),
+                             QtCore.Qt.AlignmentFlag.AlignRight | QtCore.Qt.AlignmentFlag.AlignVCenter,
+                             str(round(maximum * fraction)))
+        # Dates only when the range spans more than one day
+        with_date = self.times[-1] - self.times[0] > 86400000
+        label_width = 90 if with_date else 50
+        label_count = max(int(rect.width() // label_width), 1)
+        previous_right = None
+        for index in sorted({round(i * (len(self.times) - 1) / label_count) for i in range(label_count + 1)}):
+            left = min(max(self._x(rect, index) - label_width / 2, 0), self.width() - label_width)
+            if previous_right is not None and left < previous_right:
+                continue  # Would overlap the previous label
+            previous_right = left + label_width
+            painter.drawText(QtCore.QRectF(left, rect.bottom() + 4, label_width, 16),
+                             QtCore.Qt.AlignmentFlag.AlignCenter, self._time_text(self.times[index], with_date))
+        for field, _, color in SERIES:
+            values = self.values.get(field, [])
+            path = QtGui.QPainterPath()
+            for index, value in enumerate(values):
+                point = QtCore.QPointF(self._x(rect, index), rect.bottom() - rect.height() * value / maximum)
+                if index == 0:
+                    path.moveTo(point)
+                else:
+                    # Counts change at the events, hold each value until the next point
+                    path.lineTo(point.x(), path.currentPosition().y())
+                    path.lineTo(point)
+            if len(values) == 1:
+                path.lineTo(rect.right(), path.currentPosition().y())
+            painter.setPen(QtGui.QPen(color, 2))
+            painter.drawPath(path)
+
+    def mouseMoveEvent(self, event):
+        rect = self._plot_rect()
+        if not self.times or not rect.contains(event.position()):
+            QtWidgets.QToolTip.hideText()
+            return
+        index = round((event.position().x() - rect.left()) / rect.width() * (len(self.times) - 1))
+        lines = [self._time_text(self.times[index], True)]
+        lines += [f"{label}: {self.values.get(field, [0] * len(self.times))[index]}" for field, label, _ in SERIES]
+        QtWidgets.QToolTip.showText(event.globalPosition().toPoint(), "\n".join(lines), self)
+
+class TimelineDialog(QtWidgets.QDialog):
+    """
+    Window with the occupancy chart and a choice of scope: everybody, a table or a reisegruppe.
+    :param load: Callable load(callback) that fetches db.load_timeline() in the background
+                 and passes the result to callback on the GUI thread
+    """
+    def __init__(self, load, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Belegung im Zeitverlauf")
+        self.load = load
+        self.timeline = None
+        self.scope = QtWidgets.QComboBox(self)
+        self.scope.currentIndexChanged.connect(self.show_scope)
+        self.chart = OccupancyChart(self)
+        legend = QtWidgets.QLabel(" ".join(f'<span style="color:{color.name()}">&#9632;</span> {label}'
+                                           for _, label, color in SERIES), self)
+        header = QtWidgets.QHBoxLayout()
+        header.addWidget(self.scope)
+        header.addStretch()
+        header.addWidget(legend)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(header)
+        layout.addWidget(self.chart)
+        self.resize(760, 380)
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(lambda: self.isVisible() and self.refresh())
+        self.refresh_timer.start(REFRESH_MS)
+        self.refresh()
+
+    def refresh(self):
+        self.load(self.timeline_loaded)
+
+    def timeline_loaded(self, timeline):
+        self.timeline = timeline
+        scopes = [("Alle", ('total', None))]
+        scopes += [(TABLE_LABELS.get(table_type, table_type), ('by_table', table_type))
+                   for table_type in sorted(timeline['by_table'])]
+        scopes += [(f"Gruppe {group}", ('by_group', group)) for group in sorted(timeline['by_group'])]
+        current = self.scope.currentText()
+        self.scope.blockSignals(True)
+        self.scope.clear()
+        for label, data in scopes:
+            self.scope.addItem(label, data)
+        self.scope.setCurrentIndex(max(self.scope.findText(current), 0))
+        self.scope.blockSignals(False)
+        self.show_scope()
+
+    def show_scope(self):
+        if self.timeline is None or self.scope.currentData() is None:
+            return
+        if not self.timeline['by_table']:
+            self.chart.set_series([], {})  # No events yet
+            return
+        section, key = self.scope.currentData()
+        values = self.timeline[section] if key is None else self.timeline[section][key]
+        self.chart.set_series(self.timeline['times'], values)
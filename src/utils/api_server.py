@@ -2,51 +2,437 @@
 # Flask REST API for networked database access (local network testing)
 # Run this server, then point your clients to it in network mode.
 
-from flask import Flask, request, jsonify
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
 import db
-from backend import Individual
+import metrics
+import replication
+from backend import Individual, normalize_ticket
 
 app = Flask(__name__)
 
+TABLE_TYPES = ('guest', 'team')
+PATCHABLE_FIELDS = ('anwesend', 'evakuiert', 'notiz')  # Fields PATCH /individuals/<id> changes
+EVENT_LOG_LIMIT = 500  # Log entries per change event; a client that is further behind reloads its log view
+EVENT_KEEPALIVE_SECONDS = 15  # Comment line sent on idle event streams so clients can detect drops
+REVISION_WATCH_SECONDS = 0.5  # How often the watcher looks for writes made outside this process
+GZIP_MIN_BYTES = 1024  # Responses at least this large are gzipped for clients that accept it
+RESPONSE_CACHE_ENTRIES = 256  # Cached GET bodies per revision (one per path and query string)
+REPLICATION_MAX_BATCH = 5000  # Upper limit for ?limit on /replication/changes
+TIMELINE_END_ROUNDING_MS = 60000  # A timeline without ?end reaches the current minute (see get_stats_timeline)
+
+# Production serving defaults (see serve())
+DEFAULT_WORKERS = 64  # Request threads; every connected desk's event stream occupies one
+RESERVED_WORKERS = 8  # Threads never handed to event streams, so regular requests always get through
+REQUEST_TIMEOUT_SECONDS = 10  # Socket timeout while reading a request or sending a response
+KEEPALIVE_TIMEOUT_SECONDS = 2  # How long an idle keep-alive connection may hold a thread
+
+class GzipRequestMiddleware:
+    """
+    WSGI middleware that inflates request bodies sent with Content-Encoding: gzip, so the Flask
+    routes read plain JSON no matter how the client sent it.
+    """
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get('HTTP_CONTENT_ENCODING', '').lower() == 'gzip':
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            try:
+                body = gzip.decompress(environ['wsgi.input'].read(length))
+            except (OSError, EOFError):
+                start_response('400 Bad Request', [('Content-Type', 'text/plain')])
+                return [b'Invalid gzip request body']
+            environ['wsgi.input'] = io.BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
+
+class ChangeNotifier:
+    """
+    Wakes up /events streams when the database revision changes.
+    Writes through this server notify immediately; a single watcher thread also polls the revision,
+    so writes by other processes (e.g. a local desk on the same database file) are noticed too.
+    Idle cost is one revision lookup per interval in total, independent of the number of streams.
+    It also counts the open streams (at most max_streams, None for no limit) and ends them all
+    when the server shuts down.
+    """
+    def __init__(self, interval=REVISION_WATCH_SECONDS, max_streams=None):
+        self.interval = interval
+        self.max_streams = max_streams
+        self.revision = None
+        self.streams = 0
+        self.closed = False
+        self._condition = threading.Condition()
+        self._watcher = None
+
+    def _ensure_watcher(self):
+        with self._condition:
+            if self._watcher is None:
+                self.revision = db.get_revision()
+                self._watcher = threading.Thread(target=self._watch, name='revision-watcher', daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        while not self.closed:
+            time.sleep(self.interval)
+            self.notify()
+
+    def notify(self):
+        revision = db.get_revision()
+        with self._condition:
+            if revision != self.revision:
+                self.revision = revision
+                self._condition.notify_all()
+
+    def wait_for_change(self, known_revision, timeout):
+        """
+        Blocks until the revision differs from known_revision or the timeout expires.
+        :return: The current revision
+        """
+        self._ensure_watcher()
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or self.revision != known_revision, timeout)
+            return self.revision
+
+    def open_stream(self):
+        """
+        Reserves a slot for a new event stream.
+        :return: False if the limit is reached or the server is shutting down
+        """
+        with self._condition:
+            if self.closed or (self.max_streams is not None and self.streams >= self.max_streams):
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._condition:
+            self.streams -= 1
+
+    def close(self):
+        # Wake up and end all event streams
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+notifier = ChangeNotifier()
+
+class ResponseCache:
+    """
+    Pre-serialized JSON bodies of GET responses, each with a strong ETag and a gzipped copy.
+    Every write bumps the database revision, so all entries belong to the revision they were built
+    at and are dropped as soon as it moves (also for writes made by other processes). A request
+    that hits the cache costs one revision lookup instead of a query plus serialization.
+    """
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.revision = None
+        self._entries = {}  # key -> (etag, body, gzipped body or None)
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Returns the cached entry for key, building it with build() if needed.
+        :param key: Cache key, e.g. the request's full path
+        :param build: Callable returning the JSON-serializable response data
+        :return: (etag, body, gzipped body or None)
+        """
+        # The revision is read first, so data built concurrently with a write is rebuilt next time
+        revision = db.get_revision()
+        with self._lock:
+            if revision != self.revision:
+                self._entries.clear()
+                self.revision = revision
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+        body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+        gzipped = gzip.compress(body, compresslevel=5) if len(body) >= GZIP_MIN_BYTES else None
+        entry = (etag, body, gzipped)
+        with self._lock:
+            if self.revision == revision and len(self._entries) < self.max_entries:
+                self._entries[key] = entry
+        return entry
+
+response_cache = ResponseCache()
+
+def cached_json_response(build, key=None):
+    # Serve GET data from the response cache; a client whose If-None-Match still matches gets
+    # 304 Not Modified without a body
+    # key: cache key, the request's full path unless the data also depends on something else
+    etag, body, gzipped = response_cache.get(key or request.full_path, build)
+    use_gzip = gzipped is not None and 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    if use_gzip:
+        # The gzipped bytes are a different representation, so they get their own strong ETag
+        etag += '-gzip'
+        body = gzipped
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+HTTP_REQUEST_SECONDS = metrics.REGISTRY.histogram('checkin_http_request_seconds',
+                                                  'Time from receiving a request to its response (without streaming)',
+                                                  ('method', 'endpoint', 'status'))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+# Registered before the other after_request hooks, so it runs last and includes compression
+@app.after_request
+def record_request_latency(response):
+    # Labelled with the URL rule rather than the path, so ids do not create a series each
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint,
+                                     status=str(response.status_code))
+    return response
+
+@app.after_request
+def notify_writes(response):
+    # Any successful write may have changed the revision, wake up event streams right away
+    if request.method != 'GET' and response.status_code < 400:
+        notifier.notify()
+    return response
+
+@app.after_request
+def compress_response(response):
+    # Gzip larger JSON bodies (full table loads, log pages); event streams are left alone
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.teardown_request
+def release_db_connection(exc):
+    # Request threads are short-lived, park their SQLite connection for the next request
+    db.release_connection()
+
+def individual_to_dict(ind):
+    # JSON representation of an Individual, including its persistent row id
+    return {
+        'id': ind.id,
+        'name': ind.name,
+        'vorname': ind.vorname,
+        'reisegruppe': ind.reisegruppe,
+        'alter': ind.alter,
+        'geschlecht': ind.geschlecht,
+        'anwesend': ind.anwesend,
+        'evakuiert': ind.evakuiert,
+        'notiz': ind.notiz,
+        'version': ind.version,
+        'ticket': ind.ticket
+    }
+
 @app.route('/individuals/<table_type>', methods=['GET'])
 def get_individuals(table_type):
-    # Return all individuals for a table_type
-    individuals = db.load_individuals(table_type)
-    return jsonify([
-        {
-            'name': ind.name,
-            'vorname': ind.vorname,
-            'reisegruppe': ind.reisegruppe,
-            'alter': ind.alter,
-            'geschlecht': ind.geschlecht,
-            'anwesend': ind.anwesend,
-            'evakuiert': ind.evakuiert,
-            'notiz': ind.notiz
-        } for ind in individuals
-    ])
+    # Return all individuals for a table_type (cached until the next write, see ResponseCache)
+    return cached_json_response(lambda: [individual_to_dict(ind) for ind in db.load_individuals(table_type)])
+
+@app.route('/individuals/<table_type>/changes', methods=['GET'])
+def get_changes(table_type):
+    # Return only the individuals changed or deleted after revision ?since=N
+    since = request.args.get('since', 0, type=int)
+    revision, changed, deleted_ids = db.load_changes(table_type, since)
+    return jsonify({
+        'revision': revision,
+        'individuals': [individual_to_dict(ind) for ind in changed],
+        'deleted': deleted_ids
+    })
+
+@app.route('/revision', methods=['GET'])
+def get_revision():
+    # Return the current global revision, used by clients to skip quiet polls, and the node id
+    # identifying the database (a desk restarting from a snapshot checks it is the same one)
+    return jsonify({'revision': db.get_revision(), 'node_id': db.get_node_id()})
+
+def individual_from_dict(d):
+    # Build an Individual from its JSON representation; the id is kept when the client knows it
+    ind = Individual(d['name'], d['vorname'], d['reisegruppe'], d['alter'], d['geschlecht'])
+    if d.get('id') is not None:
+        ind.id = d['id']
+    ind.anwesend = d['anwesend']
+    ind.evakuiert = d['evakuiert']
+    ind.notiz = d['notiz']
+    ind.version = d.get('version', 0)
+    ind.ticket = normalize_ticket(d.get('ticket'))
+    return ind
 
 @app.route('/individuals/<table_type>', methods=['POST'])
 def save_individuals(table_type):
-    # Overwrite all individuals for a table_type
-    data = request.json
-    individuals = []
-    for d in data:
-        ind = Individual(d['name'], d['vorname'], d['reisegruppe'], d['alter'], d['geschlecht'])
-        ind.anwesend = d['anwesend']
-        ind.evakuiert = d['evakuiert']
-        ind.notiz = d['notiz']
-        individuals.append(ind)
+    # Overwrite all individuals for a table_type (bulk save, rows matched by id)
+    individuals = [individual_from_dict(d) for d in request.json]
     db.save_individuals(table_type, individuals)
-    return '', 204
+    # Hand the row ids and ticket codes back so the client can keep its objects in sync
+    return jsonify({'ids': [ind.id for ind in individuals], 'tickets': [ind.ticket for ind in individuals]})
+
+@app.route('/individuals/<table_type>/add', methods=['POST'])
+def add_individuals(table_type):
+    # Insert new individuals for a table_type
+    # With ?skip_taken=1 individuals whose ticket code is already taken are left out (id null in
+    # the answer) instead of failing the request
+    individuals = [individual_from_dict(d) for d in request.json]
+    inserted = db.add_individuals(table_type, individuals, skip_taken=request.args.get('skip_taken', 0, type=int) == 1)
+    inserted_ids = {id(ind) for ind in inserted}
+    return jsonify({'ids': [ind.id if id(ind) in inserted_ids else None for ind in individuals],
+                    'tickets': [ind.ticket for ind in individuals]})
+
+@app.route('/tickets/<code>', methods=['GET'])
+def get_ticket(code):
+    # Look up an individual by the ticket code on its badge, e.g. for a scanner station
+    found = db.find_by_ticket(code)
+    if found is None:
+        return jsonify({'error': 'unknown ticket'}), 404
+    table_type, ind = found
+    return jsonify({'table_type': table_type, 'individual': individual_to_dict(ind)})
+
+@app.route('/individuals/<int:individual_id>', methods=['PATCH'])
+def patch_individual(individual_id):
+    # Update anwesend, evakuiert and/or notiz of a single individual, e.g. {'anwesend': true, 'version': 3}
+    # With 'version' the write only succeeds while the row still has that version; otherwise the
+    # answer is 409 Conflict with the current row. Returns the row's new version
+    # 400 for a body without a field to change or with unknown keys, 404 for an unknown id
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object is required'}), 400
+    unknown = sorted(set(data) - {*PATCHABLE_FIELDS, 'version'})
+    fields = {field: data[field] for field in PATCHABLE_FIELDS if data.get(field) is not None}
+    if unknown or not fields:
+        return jsonify({'error': f"Expected one or more of {', '.join(PATCHABLE_FIELDS)} and optionally version"
+                                 + (f", got unknown {', '.join(unknown)}" if unknown else '')}), 400
+    try:
+        version = db.patch_individual(individual_id, fields, version=data.get('version'))
+    except db.VersionConflict as e:
+        return jsonify(individual_to_dict(e.current)), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if version is None:
+        return jsonify({'error': 'unknown individual'}), 404
+    return jsonify({'id': individual_id, 'version': version})
+
+@app.route('/batch', methods=['POST'])
+def apply_batch():
+    # Apply several writes (status changes, notes, log entries) in one request and one transaction
+    # Body: {'operations': [{'op': 'update_status', ...}, {'op': 'add_log_entry', ...}, ...]}, see db.apply_batch
+    # Writes with a stale 'version' are skipped and their current rows returned under 'conflicts'
+    try:
+        versions, conflicts = db.apply_batch(request.json['operations'])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'versions': [{'id': individual_id, 'version': version} for individual_id, version in versions.items()],
+        'conflicts': [individual_to_dict(ind) for ind in conflicts]
+    })
+
+@app.route('/status/bulk', methods=['POST'])
+def set_status_bulk():
+    # Set anwesend and/or evakuiert for many individuals in one transaction, with one log record
+    # Body: {'ids': [...]} or {'table_type': 'guest', 'reisegruppe': 'X'}, plus 'anwesend', 'evakuiert'
+    # and optionally 'log': {'fullname': ..., 'reisegruppe': ..., 'status': ...}
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object is required'}), 400
+    try:
+        log = data.get('log')
+        log_entry = (log['fullname'], log['reisegruppe'], log['status']) if log else None
+        if 'ids' in data:
+            if not isinstance(data['ids'], list):
+                raise TypeError("'ids' must be a list")
+            versions = db.set_status_bulk(data['ids'], data.get('anwesend'), data.get('evakuiert'), log_entry)
+        elif 'table_type' in data and 'reisegruppe' in data:
+            versions = db.set_group_status(data['table_type'], data['reisegruppe'],
+                                           data.get('anwesend'), data.get('evakuiert'), log_entry)
+        else:
+            return jsonify({'error': "Either 'ids' or 'table_type' and 'reisegruppe' are required"}), 400
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'versions': [{'id': individual_id, 'version': version} for individual_id, version in versions.items()]})
+
+def format_event(event, data):
+    # One Server-Sent Event: named event with a single JSON data line
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    # Server-Sent Events stream of changes after revision ?since=N and log entries after ?log_after=N
+    # Each 'change' event holds the new revision, the changed/deleted individuals per table_type
+    # and the new log entries, so subscribed desks never need to poll
+    # Every stream holds a request thread; when no slot is left the desk keeps polling and retries
+    since = request.args.get('since', 0, type=int)
+    log_after = request.args.get('log_after', 0, type=int)
+    if not notifier.open_stream():
+        return jsonify({'error': 'Too many event streams'}), 503, {'Retry-After': '30'}
+
+    def generate():
+        nonlocal since, log_after
+        yield ': connected\n\n'
+        while True:
+            revision = notifier.wait_for_change(since, EVENT_KEEPALIVE_SECONDS)
+            if notifier.closed:
+                return
+            if revision == since:
+                yield ': keepalive\n\n'
+                continue
+            data = {'revision': revision}
+            for table_type in TABLE_TYPES:
+                _, changed, deleted_ids = db.load_changes(table_type, since)
+                data[table_type] = {'individuals': [individual_to_dict(ind) for ind in changed], 'deleted': deleted_ids}
+            log = db.load_log(after_id=log_after, limit=EVENT_LOG_LIMIT)
+            data['log'] = [
+                {'id': log_id, 'timestamp': ts, 'fullname': fullname, 'reisegruppe': reisegruppe, 'status': status}
+                for log_id, ts, fullname, reisegruppe, status in log
+            ]
+            if log:
+                log_after = log[-1][0]
+            since = revision
+            yield format_event('change', data)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(notifier.close_stream)
+    return response
 
 @app.route('/log', methods=['GET'])
 def get_log():
-    # Return all log entries
-    log = db.load_log()
-    return jsonify([
-        {'timestamp': ts, 'fullname': fullname, 'reisegruppe': reisegruppe, 'status': status}
-        for ts, fullname, reisegruppe, status in log
-    ])
+    # Return log entries; ?after_id=N tails new entries, ?before_id=N pages back, ?limit=N caps the page
+    # Cached per query string until the next write, see ResponseCache
+    def build():
+        log = db.load_log(after_id=request.args.get('after_id', type=int),
+                          before_id=request.args.get('before_id', type=int),
+                          limit=request.args.get('limit', type=int))
+        return [
+            {'id': log_id, 'timestamp': ts, 'fullname': fullname, 'reisegruppe': reisegruppe, 'status': status}
+            for log_id, ts, fullname, reisegruppe, status in log
+        ]
+    return cached_json_response(build)
 
 @app.route('/log', methods=['POST'])
 def add_log():
@@ -55,11 +441,187 @@ def add_log():
     db.add_log_entry(data['fullname'], data['reisegruppe'], data['status'])
     return '', 204
 
+@app.route('/status/events', methods=['GET'])
+def get_status_events():
+    # Return status events: ?individual_id=N for one person's history, ?start=MS&end=MS for a time
+    # window (epoch milliseconds, end exclusive), ?table_type=guest|team, ?limit=N for the newest N,
+    # ?after_id=N for the events recorded after N in id order
+    # Cached per query string until the next write, see ResponseCache
+    def build():
+        events = db.load_events(individual_id=request.args.get('individual_id', type=int),
+                                start=request.args.get('start', type=int),
+                                end=request.args.get('end', type=int),
+                                table_type=request.args.get('table_type'),
+                                limit=request.args.get('limit', type=int),
+                                after_id=request.args.get('after_id', type=int))
+        return [
+            {'id': event_id, 'ts': ts, 'individual_id': individual_id, 'table_type': table_type,
+             'reisegruppe': reisegruppe, 'event_type': event_type}
+            for event_id, ts, individual_id, table_type, reisegruppe, event_type in events
+        ]
+    return cached_json_response(build)
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    # Return present/evacuated counts overall, per reisegruppe and per table_type
+    # Recomputed only when the database revision changed, see ResponseCache
+    return cached_json_response(lambda: db.load_stats().to_dict())
+
+@app.route('/stats/timeline', methods=['GET'])
+def get_stats_timeline():
+    # Present and evacuated counts over time, overall, per reisegruppe and per table_type
+    # ?start=MS&end=MS&step=MS (epoch milliseconds, step a multiple of a minute), see timeline.py
+    # New events are added to the timeline incrementally; the response is cached until the next write
+    # Without ?end the series reaches now, which moves without writes: end is then the current
+    # minute rounded up (the points are on full minutes) and part of the cache key, so a desk
+    # refreshing the chart gets a series that keeps up with the clock
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    key = None
+    if end is None:
+        end = -(-int(time.time() * 1000) // TIMELINE_END_ROUNDING_MS) * TIMELINE_END_ROUNDING_MS
+        if start is not None:
+            end = max(end, start)
+        key = f'{request.full_path}#end={end}'
+    try:
+        return cached_json_response(lambda: db.load_timeline(start=start, end=end, step=request.args.get('step', type=int)),
+                                    key)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/clear', methods=['POST'])
 def clear_all():
     db.clear_all()
     return '', 204
 
-if __name__ == '__main__':
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Request latencies and db call timings of this server process, in the Prometheus text format
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/replication/changes', methods=['GET'])
+def get_replication_changes():
+    # Changes for a peer server: ?after=SEQ&limit=N, ?exclude_origin=NODE leaves out the peer's own
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', replication.DEFAULT_BATCH_SIZE, type=int), REPLICATION_MAX_BATCH)
+    last_seq, changes = db.load_replication_changes(after, limit, request.args.get('exclude_origin'))
+    return jsonify({'node_id': db.get_node_id(), 'last_seq': last_seq, 'changes': changes})
+
+@app.route('/replication/status', methods=['GET'])
+def get_replication_status():
+    # This node's id and newest change, and how far each peer has been pulled
+    return jsonify(db.load_replication_status())
+
+class PooledRequestHandler(WSGIRequestHandler):
+    """
+    HTTP/1.1 request handler with timeouts: idle keep-alive connections are closed after
+    keepalive_timeout seconds, so they do not hold a pool thread for long; reading a request
+    and sending the response may take up to timeout seconds.
+    """
+    protocol_version = 'HTTP/1.1'  # Lets clients keep their connection open across requests
+    timeout = REQUEST_TIMEOUT_SECONDS
+    keepalive_timeout = KEEPALIVE_TIMEOUT_SECONDS
+
+    def handle_one_request(self):
+        if getattr(self, 'raw_requestline', None) is not None:
+            # Not the first request on this connection: wait briefly for the next one
+            self.connection.settimeout(self.keepalive_timeout)
+        super().handle_one_request()
+
+    def parse_request(self):
+        # The request line arrived, the rest of the request gets the full timeout
+        self.connection.settimeout(self.timeout)
+        return super().parse_request()
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server handling each connection on a fixed pool of worker threads, instead of the dev
+    server's one new thread per connection. Connections beyond the pool size wait for a free
+    worker rather than piling up threads.
+    """
+    def __init__(self, host, port, wsgi_app, workers=DEFAULT_WORKERS, handler=PooledRequestHandler):
+        super().__init__(host, port, wsgi_app, handler=handler)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-worker')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def serve(host='0.0.0.0', port=5000, workers=DEFAULT_WORKERS, request_timeout=REQUEST_TIMEOUT_SECONDS,
+          keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS, access_log=False, node_id=None, peers=(),
+          replication_interval=replication.DEFAULT_INTERVAL_SECONDS):
+    """
+    Runs the API in production mode until SIGINT or SIGTERM, then shuts down gracefully: no new
+    connections are accepted, event streams are ended and requests in progress are completed.
+    It is one process with a thread pool on purpose: SQLite allows one writer at a time anyway
+    (db serializes this process's writes, readers run concurrently in WAL mode), and the
+    response cache and change notifier are shared by all threads.
+    :param workers: Number of request threads
+    :param request_timeout: Seconds a client may take to send a request or receive the response
+    :param keepalive_timeout: Seconds an idle keep-alive connection is kept open
+    :param access_log: Log every request (off by default, it costs throughput)
+    :param node_id: Name of this server in replication, e.g. the venue (kept in the database)
+    :param peers: Base URLs of peer servers to replicate from, see replication.py
+    :param replication_interval: Seconds between pulls from the peers
+    """
     db.init_db()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if node_id:
+        db.set_node_id(node_id)
+    replicator = None
+    if peers:
+        replicator = replication.Replicator(peers, interval=replication_interval, on_applied=notifier.notify)
+    if not access_log:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    notifier.max_streams = max(1, workers - RESERVED_WORKERS)
+    handler = type('RequestHandler', (PooledRequestHandler,),
+                   {'timeout': request_timeout, 'keepalive_timeout': keepalive_timeout})
+    server = PooledWSGIServer(host, port, app, workers=workers, handler=handler)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it must not run in the serving thread
+        threading.Thread(target=server.shutdown, name='shutdown').start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f'Serving on http://{host}:{port} with {workers} workers', flush=True)
+    if replicator is not None:
+        replicator.start()
+        print(f'Replicating as {db.get_node_id()} from {", ".join(replicator.peers)}', flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        if replicator is not None:
+            replicator.stop()
+        notifier.close()
+        server.executor.shutdown(wait=True)
+        server.server_close()
+        print('Server stopped', flush=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Kirchentag-App REST API server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='request threads (production mode)')
+    parser.add_argument('--request-timeout', type=float, default=REQUEST_TIMEOUT_SECONDS)
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT_SECONDS)
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    parser.add_argument('--node-id', help='name of this server in replication, e.g. the venue')
+    parser.add_argument('--peer', action='append', default=[], help='base URL of a peer server to replicate from (repeatable)')
+    parser.add_argument('--replication-interval', type=float, default=replication.DEFAULT_INTERVAL_SECONDS,
+                        help='seconds between pulls from the peers')
+    parser.add_argument('--debug', action='store_true', help='run the Flask development server with reloader and debugger instead')
+    args = parser.parse_args()
+    if args.debug:
+        db.init_db()
+        WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        serve(args.host, args.port, args.workers, args.request_timeout, args.keepalive_timeout, args.access_log,
+              args.node_id, args.peer, args.replication_interval)
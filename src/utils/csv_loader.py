@@ -27,6 +27,40 @@ def load_csv(file_path):
         logging.error(f"Error reading CSV file: {e}")
     return []
 
+def count_csv_rows(file_path):
+    """
+    Counts the data rows of a CSV file (excluding the header), e.g. for progress reporting.
+
+    :param file_path: Path to the CSV file
+    :return: Number of data rows
+    """
+    with open(file_path, mode='r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip the header row
+        return sum(1 for _ in reader)
+
+def iter_csv_chunks(file_path, chunk_size=5000):
+    """
+    Streams a CSV file in chunks instead of reading it into memory at once.
+    Each chunk is a list of up to chunk_size rows, excluding the header.
+
+    :param file_path: Path to the CSV file
+    :param chunk_size: Maximum number of rows per chunk
+    :return: Generator of lists of rows
+    """
+    with open(file_path, mode='r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip the header row
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    logging.info(f"Successfully streamed CSV file: {file_path}")
+
 def save_csv(file_path, data, headers=None):
     """
     Writes data to a CSV file.